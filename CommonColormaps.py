@@ -0,0 +1,115 @@
+# CommonColormaps.py
+#
+# Color lookups for the plots: colormaps (lookup tables of hex colors) built
+# from HLS gradients (colorsys + rgb2hex) or from the colors list in
+# CommonFunctions.py, mapping of arrays of values (e.g., every measured
+# temperature) to colors in one vectorized call, and a registry of the
+# per-metric line/marker colors (g_color_*_line and g_color_*_marker in
+# CommonFunctions.py), so that plots look them up in a dict instead of
+# building variable names for globals().
+#
+# Lookup tables are built once per set of arguments and cached.
+#
+# Usage:
+# from CommonColormaps import *
+#
+# lut        = hls_colormap(hue_start=0.66, hue_end=0.0)
+# marker_hex = values2colors(df['Snow_Celsius'], lut, value_min=-10, value_max=10)
+# style      = metric_style('Snow_Celsius 28-030497940a6a', sensor=1)
+
+# Necessary libraries
+import colorsys
+import functools
+import zlib
+
+import CommonFunctions
+from CommonFunctions import colors, np, rgb2hex
+
+# Variables
+# sensor_lightness_step is the lightness (0-1) between the colors of the
+# sensors of a metric
+colormap_size         = 256
+colormap_nan          = '#cccccc'
+sensor_lightness_step = 0.37
+
+# Function: hls_colormap()
+# size hex colors from hue_start to hue_end (0-1; e.g., 0.66 (blue) to 0.0
+# (red)), at constant lightness and saturation
+@functools.lru_cache(maxsize=None)
+def hls_colormap(hue_start=0.66, hue_end=0.0, lightness=0.5, saturation=1.0, size=colormap_size):
+  hues = np.linspace(hue_start, hue_end, size)
+
+  return np.array([rgb2hex(*colorsys.hls_to_rgb(hue, lightness, saturation)) for hue in hues])
+
+# Function: named_colormap()
+# The colors list (names), as a colormap
+@functools.lru_cache(maxsize=None)
+def named_colormap(names=tuple(colors)):
+  return np.array(names)
+
+# Function: values2colors()
+# Color of every value: values between value_min and value_max (by default,
+# the range of values) are spread linearly over the colormap (lut); values
+# outside are clipped and missing values get nan_color
+def values2colors(values, lut, value_min=None, value_max=None, nan_color=colormap_nan):
+  values = np.asarray(values, dtype=np.float64)
+  valid  = np.isfinite(values)
+  if not valid.any():
+    return np.full(values.shape, nan_color)
+
+  if value_min is None:
+    value_min = values[valid].min()
+  if value_max is None:
+    value_max = values[valid].max()
+  scale = (len(lut) - 1) / (value_max - value_min) if value_max > value_min else 0.0
+
+  index  = np.clip(np.rint((np.where(valid, values, value_min) - value_min) * scale), 0, len(lut) - 1).astype(np.intp)
+  result = lut[index]
+  if not valid.all():
+    result = result.astype('U%d' % max(result.dtype.itemsize // 4, len(nan_color)))
+    result[~valid] = nan_color
+
+  return result
+
+# Registry of the line and marker colors of every metric, from the
+# g_color_METRIC_line and g_color_METRIC_marker variables in
+# CommonFunctions.py (e.g., 'snow_celsius')
+metric_styles = dict(
+                      (name[len('g_color_'):-len('_line')], {
+                        'line'   : getattr(CommonFunctions, name),
+                        'marker' : getattr(CommonFunctions, 'g_color_' + name[len('g_color_'):-len('_line')] + '_marker'),
+                      })
+                      for name in dir(CommonFunctions) if name.startswith('g_color_') and name.endswith('_line')
+                    )
+
+# Function: sensor_color()
+# Color of the sensor-th sensor (from 0) of a metric of color: the color
+# itself for the first one, and steps of lightness of it (HLS; wrapping
+# between 0.2 and 0.8) for the others. A named color (from the colors list)
+# is followed by the next names instead
+@functools.lru_cache(maxsize=None)
+def sensor_color(color, sensor=0):
+  if sensor == 0:
+    return color
+  if not color.startswith('#'):
+    return colors[(colors.index(color) + sensor) % len(colors)] if color in colors else color
+
+  hue, lightness, saturation = colorsys.rgb_to_hls(*(int(color[index:index + 2], 16) / 255 for index in (1, 3, 5)))
+  lightness = 0.2 + (lightness - 0.2 + sensor_lightness_step * sensor) % 0.6
+
+  return rgb2hex(*colorsys.hls_to_rgb(hue, lightness, saturation))
+
+# Function: metric_style()
+# Line and marker colors of a metric (e.g., 'Snow_Celsius', or
+# 'Snow_Celsius 28-030497940a6a' with multiple sensors). A metric without
+# g_color_* variables gets a color from the colors list (the same one every
+# time). With multiple sensors, sensor (from 0) tells them apart (see
+# sensor_color()). The colors are returned in a new dict
+def metric_style(metric, sensor=0):
+  name = metric.split(' ')[0].lower()
+  if name not in metric_styles:
+    color = colors[zlib.crc32(name.encode('utf-8')) % len(colors)]
+    metric_styles[name] = {'line': color, 'marker': color}
+
+  # A copy: the registry is shared by every plot
+  return dict((key, sensor_color(color, sensor)) for key, color in metric_styles[name].items())
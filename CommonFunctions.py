@@ -2,29 +2,60 @@
 #
 # Commonly used entities by various python scripts.
 #
+# The heavy libraries (BeautifulSoup, lxml, NumPy, pandas, plotly and
+# urllib.request) are imported lazily: the names below are bound right away,
+# but each library is loaded only when one of its attributes is first used
+# (BeautifulSoup, when it is first called). So, scripts that only need, e.g.,
+# seconds2hhmmss() or rgb2hex() start in milliseconds instead of seconds.
+# CommonFunctions_ImportTime.py measures the cost of every library.
+#
 # Usage:
 # from CommonFunctions import *
 
 # Necessary libraries
-from bs4  import BeautifulSoup
-from lxml import html
 from re   import search
 import colorsys
 import datetime
 import glob
+import importlib.util
 import math
-import numpy as np
 import os
-import pandas as pd
-import plotly.express as px
-import plotly.figure_factory as ff
-import plotly.graph_objects as go
 import random
 import re
 import subprocess
 import sys
 import time
-import urllib.request as request
+
+# Function: lazy_import()
+# Module that is loaded on first attribute access. Once loaded, it is the
+# same module object as a regular import would return (and other modules
+# importing it get the same one)
+def lazy_import(name):
+  if name in sys.modules:
+    return sys.modules[name]
+
+  spec   = importlib.util.find_spec(name)
+  loader = importlib.util.LazyLoader(spec.loader)
+  spec.loader = loader
+  module = importlib.util.module_from_spec(spec)
+  sys.modules[name] = module
+  loader.exec_module(module)
+
+  return module
+
+html    = lazy_import('lxml.html')
+np      = lazy_import('numpy')
+pd      = lazy_import('pandas')
+px      = lazy_import('plotly.express')
+ff      = lazy_import('plotly.figure_factory')
+go      = lazy_import('plotly.graph_objects')
+request = lazy_import('urllib.request')
+
+# Function: BeautifulSoup()
+# Same as bs4.BeautifulSoup(), imported on first call
+def BeautifulSoup(*args, **kwargs):
+  from bs4 import BeautifulSoup
+  return BeautifulSoup(*args, **kwargs)
 
 # https://gist.github.com/bobspace/2712980
 # Customized
@@ -151,7 +182,7 @@ colors = [
 
 # Function: seconds2hhmmss()
 def seconds2hhmmss(seconds):
-  m, s = divmod(seconds, 60)
+  m, s = divmod(int(seconds), 60)
   h, m = divmod(m, 60)
 
   if seconds >= 3600:
@@ -159,21 +190,176 @@ def seconds2hhmmss(seconds):
   else:
     return f"{m:d}:{s:02d}"
 
-# Function to convert decimal time to h:mm:ss
+# Function to convert decimal time (hours) to h:mm:ss
 def time_decimal2hhmmss(decimal_time):
-  hours   = int(decimal_time)
-  minutes = (decimal_time*60) % 60
-  seconds = (decimal_time*3600) % 60
+  m, s = divmod(int(round(decimal_time * 3600)), 60)
+  h, m = divmod(m, 60)
+
+  return "%d:%02d:%02d" % (h, m, s)
+
+# Function: hhmmss2seconds()
+# Inverse of seconds2hhmmss() (h:mm:ss, m:ss or s)
+def hhmmss2seconds(hhmmss):
+  seconds = 0
+  for field in hhmmss.strip().split(':'):
+    seconds = seconds * 60 + int(field)
+
+  return seconds
+
+# Function: hhmmss2time_decimal()
+# Inverse of time_decimal2hhmmss()
+def hhmmss2time_decimal(hhmmss):
+  return hhmmss2seconds(hhmmss) / 3600
+
+# Array versions of the functions above
+# They take a list, NumPy array or pandas Series and return a NumPy array (a
+# Series with the same index, for a Series) of the same length, without a
+# Python loop over the values: the fields are split with vectorized divmod and
+# the strings are looked up in precomputed tables (of every time shorter than
+# hhmmss_lut_size seconds, as m:ss/h:mm:ss and as h:mm:ss; longer times are
+# the hours followed by the :mm:ss of the remainder). Missing, negative,
+# invalid or too large (hhmmss_max seconds or more, beyond 64-bit integers)
+# values give '' (formatting) or NaN (parsing).
+hhmmss_lut_size = 36000
+hhmmss_max      = 2.0 ** 63
+hhmmss_luts     = None
+
+# Lookup tables, built on first use: m:ss/h:mm:ss, h:mm:ss and :mm:ss
+def hhmmss_lut():
+  global hhmmss_luts
+  if hhmmss_luts is None:
+    hhmmss_luts = (
+                    np.array([seconds2hhmmss(i) for i in range(hhmmss_lut_size)]),
+                    np.array(["%d:%02d:%02d" % (i // 3600, i // 60 % 60, i % 60) for i in range(hhmmss_lut_size)]),
+                    np.array([":%02d:%02d" % (i // 60, i % 60) for i in range(3600)]),
+                  )
+
+  return hhmmss_luts
+
+# Same type as values (a Series with the same index for a Series)
+def hhmmss_like(values, result):
+  if hasattr(values, 'index') and hasattr(values, 'to_numpy'):
+    return pd.Series(result, index=values.index, name=values.name)
+
+  return result
 
-  hhmmss = print("%d:%02d:%02d" % (hours, minutes, seconds))
+# Strings of total seconds (integers); always h:mm:ss if hours, else as
+# seconds2hhmmss()
+def hhmmss_format(total, valid, hours=False):
+  lut_short, lut_hours, lut_mmss = hhmmss_lut()
+  lut  = lut_hours if hours else lut_short
+  long = total >= hhmmss_lut_size
 
-  return hhmmss
+  text = lut[np.where(long, 0, total)]
+  if long.any():
+    # Character codes of the hours (one column per digit) and of :mm:ss, for
+    # the rows with the same number of digits
+    hours      = total // 3600
+    digits_max = len(str(int(hours.max())))
+    text       = text.astype('U%d' % (digits_max + 6))
+    codes      = text.view(np.uint32).reshape(len(text), digits_max + 6)
+    codes_mmss = lut_mmss.view(np.uint32).reshape(3600, 6)
+    for digits in range(1, digits_max + 1):
+      rows = np.flatnonzero(long & (hours >= 10 ** (digits - 1)) & (hours < 10 ** digits))
+      if len(rows) > 0:
+        powers = 10 ** np.arange(digits - 1, -1, -1)
+        codes[rows, :digits + 6] = np.hstack([(hours[rows, None] // powers) % 10 + ord('0'), codes_mmss[total[rows] % 3600]])
+  text[~valid] = ''
+
+  return text
+
+# Function: seconds2hhmmss_array()
+def seconds2hhmmss_array(seconds):
+  values = np.asarray(seconds, dtype=np.float64).ravel()
+  valid  = np.isfinite(values) & (values >= 0) & (values < hhmmss_max)
+  total  = np.where(valid, values, 0).astype(np.int64)
+
+  return hhmmss_like(seconds, hhmmss_format(total, valid))
+
+# Function: time_decimal2hhmmss_array()
+def time_decimal2hhmmss_array(decimal_time):
+  values = np.asarray(decimal_time, dtype=np.float64).ravel()
+  valid  = np.isfinite(values) & (values >= 0) & (np.round(values * 3600) < hhmmss_max)
+  total  = np.round(np.where(valid, values, 0) * 3600).astype(np.int64)
+
+  return hhmmss_like(decimal_time, hhmmss_format(total, valid, hours=True))
+
+# Function: hhmmss2seconds_array()
+# Floats (NaN where a value is not h:mm:ss, m:ss or s). The characters are
+# read as their codes (a view of the strings as 32-bit integers), one column
+# at a time. Spaces are ignored around the fields, as in hhmmss2seconds(),
+# but not between their digits (e.g., '4 26')
+def hhmmss2seconds_array(hhmmss):
+  text  = np.asarray(hhmmss, dtype=str).ravel()
+  width = max(text.dtype.itemsize // 4, 1)
+  codes = text.view(np.uint32).reshape(len(text), width) if text.dtype.itemsize > 0 else np.zeros((len(text), 1), dtype=np.uint32)
+
+  total = np.zeros(len(text), dtype=np.int64)
+  value = np.zeros(len(text), dtype=np.int64)
+  valid = np.ones(len(text), dtype=bool)
+  empty = np.ones(len(text), dtype=bool)
+  ended = np.zeros(len(text), dtype=bool)
+  for column in range(width):
+    code  = codes[:, column].astype(np.int64)
+    digit = (code >= ord('0')) & (code <= ord('9'))
+    colon = code == ord(':')
+    space = code == ord(' ')
+    valid = valid & (digit | colon | (code == 0) | space) & ~(colon & empty) & ~(digit & ended)
+    total = total + colon * (total * 59 + value * 60)
+    value = np.where(digit, value * 10 + code - ord('0'), value * ~colon)
+    ended = (ended | (space & ~empty)) & ~colon
+    empty = (empty | colon) & ~digit
+
+  seconds = (total + value).astype(np.float64)
+  seconds[~valid | empty] = np.nan
+
+  return hhmmss_like(hhmmss, seconds)
+
+# Function: hhmmss2time_decimal_array()
+def hhmmss2time_decimal_array(hhmmss):
+  return hhmmss2seconds_array(hhmmss) / 3600
 
 # Function: rgb2hex()
 # Converter using output from colorsys.hls_to_rgb
 def rgb2hex(red, green, blue):
   return "#{:02x}{:02x}{:02x}".format(int(red * 255), int(green * 255), int(blue * 255))
 
+# Function: lttb()
+# Largest-Triangle-Three-Buckets downsampling of a series (x, y) to n_out
+# points that preserve its visual shape. The first and last points are always
+# kept; every bucket in between contributes the point that forms the largest
+# triangle with the point kept from the previous bucket and the average of the
+# next bucket. Returns the indices of the points to keep.
+# https://skemman.is/handle/1946/15343
+def lttb(x, y, n_out):
+  x = np.asarray(x, dtype=np.float64)
+  y = np.asarray(y, dtype=np.float64)
+  n = len(x)
+
+  if n_out >= n or n_out < 3:
+    return np.arange(n)
+
+  edges   = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+  indices = np.empty(n_out, dtype=np.int64)
+  indices[0]  = 0
+  indices[-1] = n - 1
+
+  a = 0
+  for i in range(n_out - 2):
+    start, end = edges[i], edges[i + 1]
+    if i + 2 < len(edges):
+      next_start, next_end = edges[i + 1], edges[i + 2]
+    else:
+      next_start, next_end = n - 1, n
+    x_next = x[next_start:next_end].mean()
+    y_next = y[next_start:next_end].mean()
+
+    area = np.abs((x[a] - x_next) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (y_next - y[a]))
+    a    = start + int(np.argmax(area))
+    indices[i + 1] = a
+
+  return indices
+
 ## Plotly Parameters
 #
 g_config = {
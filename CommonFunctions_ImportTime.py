@@ -0,0 +1,77 @@
+# CommonFunctions_ImportTime.py
+#
+# Python3 script/workflow to measure the import time of CommonFunctions.py and
+# of every library it uses, so that regressions in the startup time of the
+# scripts are caught. Every import is timed in a fresh python3 process
+# (repeated, and the median is reported), as a short-lived script would pay
+# for it. It exits with status 1 if `from CommonFunctions import *` takes
+# longer than import_budget milliseconds.
+#
+# Usage:
+# python3 CommonFunctions_ImportTime.py [REPEATS]
+
+# Necessary libraries
+import os
+import statistics
+import subprocess
+import sys
+
+# Variables
+# Libraries are imported in the same way CommonFunctions.py does (when used)
+import_budget = 100
+imports       = [
+                  ('from CommonFunctions import *', 'from CommonFunctions import *'),
+                  ('bs4',                           'from bs4 import BeautifulSoup'),
+                  ('lxml.html',                     'from lxml import html'),
+                  ('numpy',                         'import numpy'),
+                  ('pandas',                        'import pandas'),
+                  ('plotly.express',                'import plotly.express'),
+                  ('plotly.figure_factory',         'import plotly.figure_factory'),
+                  ('plotly.graph_objects',          'import plotly.graph_objects'),
+                  ('urllib.request',                'import urllib.request'),
+                  ('All of the above, when used',   'from CommonFunctions import *; html.fromstring, np.ndarray, pd.DataFrame, px.line, ff.create_table, go.Figure, request.urlopen, BeautifulSoup("", "html.parser")'),
+                ]
+timer = """
+import time
+time_start = time.perf_counter()
+%s
+print((time.perf_counter() - time_start) * 1000)
+"""
+
+# Milliseconds to run statement in a fresh python3 process
+def import_time(statement):
+  output = subprocess.run([sys.executable, '-c', timer % (statement)], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+  if output.returncode != 0:
+    return None
+  return float(output.stdout.split()[-1])
+
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) > 2:
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " [REPEATS]")
+    print("   e.g.: python3 " + sys.argv[0] + " 5")
+    print("")
+    sys.exit()
+
+  repeats = int(sys.argv[1]) if len(sys.argv) == 2 else 5
+
+  print("")
+  print("  %-32s %10s" % ('Import', 'Time (ms)'))
+  medians = {}
+  for name, statement in imports:
+    times = [import_time(statement) for repeat in range(repeats)]
+    if None in times:
+      print("  %-32s %10s" % (name, 'failed'))
+      continue
+    medians[name] = statistics.median(times)
+    print("  %-32s %10.1f" % (name, medians[name]))
+  print("")
+
+  name = imports[0][0]
+  if medians.get(name, float('inf')) > import_budget:
+    print("  %s takes longer than %d ms." % (name, import_budget))
+    print("")
+    sys.exit(1)
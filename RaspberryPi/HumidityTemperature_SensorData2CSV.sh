@@ -3,6 +3,12 @@
 # BASH script to extract relevant information from the recorded data (.dat file) and
 # prepare a CSV file for graphing purposes.
 #
+# HumidityTemperature_SensorData_Plot.py reads the .dat file directly (see
+# HumidityTemperature_SensorData_Ingest.py), so this CSV file is optional.
+# HumidityTemperature_SensorData_Ingest.py also prepares the same CSV file, in
+# a fraction of the time for large files:
+# python3 HumidityTemperature_SensorData_Ingest.py LOCATION_TIMESTAMP
+#
 # Usage:
 # HumidityTemperature_SensorData2CSV.sh LOCATION_TIMESTAMP
 
@@ -0,0 +1,143 @@
+# HumidityTemperature_SensorData_Aggregate.py
+#
+# Python module to summarize the measurements while recording, in downsampled
+# tiers (e.g., every 1 minute, 15 minutes and 1 hour). For every sensor and
+# tier, the number of measurements, mean, standard deviation, minimum, maximum
+# and last value (in Celsius) of the current interval are updated with each
+# measurement in constant time and memory (Welford's algorithm for the mean and
+# the variance). When an interval ends, its summary is appended to the tier's
+# file (e.g., LOCATION_TIMESTAMP_HumidityTemperature_SensorData_1min.dat).
+# Plots and the remote server can then read the small tier files instead of
+# summarizing millions of measurements again.
+#
+# Usage:
+# from HumidityTemperature_SensorData_Aggregate import *
+#
+# aggregator = TierAggregator(file_name_base)
+# aggregator.add(date_time, readings)
+# aggregator.close()
+
+# Necessary libraries
+# This module runs on a Raspberry Pi with minimal resources
+# So, import only what's absolutely necessary
+import datetime
+import math
+import os
+
+# Variables
+# tiers maps the name of a tier (used in the file name) to its interval in
+# seconds
+tiers = {
+          '1min'  : 60,
+          '15min' : 900,
+          '1hour' : 3600,
+        }
+
+# Mean, variance, minimum, maximum and last value of a stream of values, in
+# constant memory (Welford's algorithm)
+class RunningStats:
+
+  def __init__(self):
+    self.count = 0
+    self.mean  = 0.0
+    self.m2    = 0.0
+    self.min   = math.inf
+    self.max   = -math.inf
+    self.last  = None
+
+  def add(self, value):
+    self.count = self.count + 1
+    delta      = value - self.mean
+    self.mean  = self.mean + delta / self.count
+    self.m2    = self.m2 + delta * (value - self.mean)
+    self.min   = min(self.min, value)
+    self.max   = max(self.max, value)
+    self.last  = value
+
+  # Sample variance (0 for fewer than 2 values)
+  def variance(self):
+    if self.count < 2:
+      return 0.0
+    return self.m2 / (self.count - 1)
+
+  def std(self):
+    return math.sqrt(self.variance())
+
+# Summaries of one tier for every sensor, written to the tier's file at the
+# end of every interval
+class Tier:
+
+  def __init__(self, name, seconds, file_name, header_lines=()):
+    self.name      = name
+    self.seconds   = seconds
+    self.file_name = file_name
+    self.interval  = None
+    self.stats     = {}
+
+    # Append, so that a resumed (interrupted) run continues the same file
+    new_file         = not os.path.exists(file_name) or os.path.getsize(file_name) == 0
+    self.file_handle = open(file_name, 'a')
+    if new_file:
+      self.file_handle.write("#\n")
+      self.file_handle.write("# Filename  : %s\n" % (file_name))
+      for header_line in header_lines:
+        self.file_handle.write("%s\n" % (header_line))
+      self.file_handle.write("# Interval  : %s (%d seconds)\n" % (name, seconds))
+      self.file_handle.write("# Format    : Sensor ID, Time Stamp (start of the interval), Count, Mean, Standard Deviation, Minimum, Maximum, Last\n")
+      self.file_handle.write("#             Temperatures are in Celsius. Fields are separated by the | character\n")
+      self.file_handle.write("#\n")
+      self.file_handle.flush()
+
+  # Write the summaries of the current interval
+  def write(self):
+    if self.interval is None:
+      return
+
+    date_time = datetime.datetime.fromtimestamp(self.interval * self.seconds)
+    date_time = date_time.strftime("%Y-%m-%d %H:%M:%S")
+    for sensor_id, stats in self.stats.items():
+      self.file_handle.write("%s|%19s|%d|%07.3f|%06.3f|%07.3f|%07.3f|%07.3f\n" % (
+                               sensor_id, date_time, stats.count, stats.mean,
+                               stats.std(), stats.min, stats.max, stats.last))
+    self.file_handle.flush()
+
+  def add(self, epoch, readings):
+    interval = int(epoch // self.seconds)
+    if interval != self.interval:
+      self.write()
+      self.interval = interval
+      self.stats    = {}
+
+    for sensor_id, celsius, fahrenheit in readings:
+      if sensor_id not in self.stats:
+        self.stats[sensor_id] = RunningStats()
+      self.stats[sensor_id].add(celsius)
+
+  def close(self):
+    if self.file_handle.closed:
+      return
+
+    self.write()
+    self.interval = None
+    self.file_handle.close()
+
+# Summaries of every tier
+class TierAggregator:
+
+  def __init__(self, file_name_base, header_lines=(), tiers=tiers):
+    self.tiers      = [Tier(name, seconds, '%s_%s.dat' % (file_name_base, name), header_lines)
+                       for name, seconds in tiers.items()]
+    self.file_names = [tier.file_name for tier in self.tiers]
+
+  # Add one measurement. readings is a list of (sensor_id, celsius,
+  # fahrenheit) tuples sharing date_time (a datetime)
+  def add(self, date_time, readings):
+    epoch = date_time.timestamp()
+    for tier in self.tiers:
+      tier.add(epoch, readings)
+
+  # Write the summaries of the current (incomplete) intervals and close the
+  # files
+  def close(self):
+    for tier in self.tiers:
+      tier.close()
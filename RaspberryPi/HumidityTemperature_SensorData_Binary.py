@@ -0,0 +1,200 @@
+# HumidityTemperature_SensorData_Binary.py
+#
+# Python module to record the measurements in a compact, fixed-width, binary
+# and append-only format (LOCATION_TIMESTAMP_HumidityTemperature_SensorData.bin)
+# instead of the text format (.dat), to read such a file back by memory-mapping
+# it into NumPy arrays (without copying), and to convert it to the text format
+# for compatibility with the rest of the workflow.
+#
+# Layout of the file
+#
+#   Bytes 0-3 : Magic string HTSD
+#   Bytes 4-7 : Length of the header in bytes (unsigned 32-bit integer, little
+#               endian), including these 8 bytes
+#   Bytes 8-  : Header as UTF-8 encoded JSON: format version, NumPy description
+#               of a record, scale of Celsius, sensor IDs (a record refers to
+#               a sensor by its index in this list) and the comment lines of
+#               the text format
+#   Remaining : Records, one per sensor per measurement, 10 bytes each
+#
+#               epoch   : Time stamp, seconds since the epoch (uint32)
+#               counter : Counter of the measurement, modulo 65536 (uint16)
+#               sensor  : Index of the sensor in sensor_ids (uint16)
+#               celsius : Temperature, in sixteenths of a degree Celsius
+#                         (int16, i.e., the header's scale)
+#
+# The sensor ID and time stamp are not repeated as text in every record, and
+# Fahrenheit is computed from Celsius when needed. The counter is restored
+# from its last 16 bits (it only grows, by less than 65536 between two
+# records), so measurements taken within the same second (e.g., catching up
+# with the schedule, or intervals shorter than a second) keep their own
+# counter. A record is 10 bytes, less than a fifth of the size of a line in
+# the text format (57 bytes). DS18B20 reports temperature in multiples of
+# 1/16 Celsius and the text format has a time stamp to the second, so nothing
+# is lost; a float32 Celsius (as in version 1) would take 2 more bytes for no
+# more precision.
+#
+# Files of version 1 (14-byte records: float64 epoch, uint16 sensor, float32
+# Celsius) and 2 (8-byte records: version 3 without the counter) are still
+# read; the header describes the records of any version. Their counter is
+# recovered by counting the distinct time stamps
+#
+# Usage:
+# from HumidityTemperature_SensorData_Binary import *
+#
+# python3 HumidityTemperature_SensorData_Binary.py FILE_NAME_BIN FILE_NAME_DAT
+
+# Necessary libraries
+# This module runs on a Raspberry Pi with minimal resources
+# So, import only what's absolutely necessary
+import datetime
+import json
+import os
+import struct
+import sys
+
+# Variables
+binary_magic    = b'HTSD'
+binary_version  = 3
+binary_versions = (1, 2, 3)
+binary_record   = [['epoch', '<u4'], ['counter', '<u2'], ['sensor', '<u2'], ['celsius', '<i2']]
+binary_scale    = 16
+binary_counter  = 2 ** 16
+binary_prefix   = struct.Struct('<4sI')
+
+# Format characters of the struct module for the NumPy types of the records
+struct_codes    = {'<f8': 'd', '<f4': 'f', '<u4': 'I', '<u2': 'H', '<i2': 'h'}
+
+# Prepare the header (magic string, length and JSON) of a binary file
+def binary_header(sensor_ids, header_lines):
+  header = {
+             'version'      : binary_version,
+             'record'       : binary_record,
+             'scale'        : binary_scale,
+             'sensor_ids'   : list(sensor_ids),
+             'header_lines' : list(header_lines),
+           }
+  header_json = json.dumps(header).encode('utf-8')
+
+  return binary_prefix.pack(binary_magic, binary_prefix.size + len(header_json)) + header_json
+
+# Read the header of a binary file. Return the header (dict) and its length in
+# bytes, i.e., the offset of the first record
+def read_binary_header(file_handle):
+  prefix = file_handle.read(binary_prefix.size)
+  if len(prefix) != binary_prefix.size:
+    raise ValueError("%s is too short to be a binary sensor data file" % file_handle.name)
+
+  magic, header_length = binary_prefix.unpack(prefix)
+  if magic != binary_magic:
+    raise ValueError("%s is not a binary sensor data file" % file_handle.name)
+
+  header = json.loads(file_handle.read(header_length - binary_prefix.size).decode('utf-8'))
+  if header['version'] not in binary_versions:
+    raise ValueError("%s has unsupported format version %s" % (file_handle.name, header['version']))
+
+  return header, header_length
+
+# Encode and decode the records of a binary file, as described by its header
+# (so that an interrupted run of an earlier version resumes in its own format)
+class BinaryRecords:
+
+  def __init__(self, header):
+    self.names   = [name for name, typestr in header['record']]
+    self.struct  = struct.Struct('<' + ''.join(struct_codes[typestr] for name, typestr in header['record']))
+    self.size    = self.struct.size
+    self.scale   = header.get('scale', 1)
+    self.exact   = self.scale == 1
+    self.counted = 'counter' in self.names
+
+  # One record. epoch is in seconds since the epoch (truncated to the second,
+  # as in the text format), counter is stored modulo binary_counter and
+  # celsius is rounded to 1/scale of a degree
+  def pack(self, epoch, counter, sensor, celsius):
+    if self.exact:
+      return self.struct.pack(epoch, sensor, celsius)
+    if not self.counted:
+      return self.struct.pack(int(epoch), sensor, int(round(celsius * self.scale)))
+    return self.struct.pack(int(epoch), counter % binary_counter, sensor, int(round(celsius * self.scale)))
+
+  # Time stamp, stored counter (None if the records have none), sensor index
+  # and Celsius of the record at offset in data
+  def unpack_from(self, data, offset=0):
+    record = dict(zip(self.names, self.struct.unpack_from(data, offset)))
+    return record['epoch'], record.get('counter'), record['sensor'], record['celsius'] / self.scale
+
+# Counter of a record, from the counter and the time stamp of the record
+# before it and its own time stamp and stored counter (see BinaryRecords)
+def binary_counter_next(counter_previous, epoch_previous, epoch, counter_stored):
+  if counter_stored is None:
+    return counter_previous + (epoch != epoch_previous)
+  return counter_previous + (counter_stored - counter_previous) % binary_counter
+
+# Memory-map a binary file into a NumPy structured array (no data is copied
+# or parsed; columns such as records['celsius'] are views into the file).
+# A partially written record at the end of the file (e.g., after a power
+# outage) is ignored. Return the header (dict) and the records
+def read_binary(file_name):
+  import numpy as np
+
+  with open(file_name, 'rb') as file_handle:
+    header, header_length = read_binary_header(file_handle)
+
+  dtype   = np.dtype([(name, typestr) for name, typestr in header['record']])
+  records = (os.path.getsize(file_name) - header_length) // dtype.itemsize
+
+  if records == 0:
+    return header, np.empty(0, dtype=dtype)
+
+  return header, np.memmap(file_name, dtype=dtype, mode='r', offset=header_length, shape=(records,))
+
+# Convert a binary file to the text format (.dat) of
+# HumidityTemperature_SensorData_Record.py, i.e., lines of
+# Counter|Sensor ID|Time Stamp|Celsius|Fahrenheit. The columns are decoded and
+# formatted as whole arrays; only the time stamps are converted one distinct
+# second at a time (to local time)
+def binary2dat(file_name_bin, file_name_dat):
+  import numpy as np
+
+  header, records = read_binary(file_name_bin)
+  sensor_ids      = np.array(header['sensor_ids'] or [''])
+
+  epoch = np.asarray(records['epoch'])
+  if 'counter' in records.dtype.names:
+    counter = np.cumsum(np.diff(np.asarray(records['counter'], dtype=np.int64), prepend=0) % binary_counter)
+  else:
+    # Counter increments whenever the time stamp changes
+    counter = np.cumsum(np.concatenate(([1], epoch[1:] != epoch[:-1]))) if len(epoch) else epoch
+  celsius    = np.asarray(records['celsius'], dtype=np.float64) / header.get('scale', 1)
+  fahrenheit = (celsius * 1.80) + 32.00
+
+  seconds, index = np.unique(epoch, return_inverse=True)
+  date_times     = np.array([datetime.datetime.fromtimestamp(float(second)).strftime("%Y-%m-%d %H:%M:%S")
+                             for second in seconds] or [''])
+
+  columns = [np.char.mod('%04d', counter), sensor_ids[np.asarray(records['sensor'])], date_times[index],
+             np.char.mod('%07.3f', celsius), np.char.mod('%07.3f', fahrenheit)]
+  lines   = columns[0]
+  for column in columns[1:]:
+    lines = np.char.add(np.char.add(lines, '|'), column)
+
+  with open(file_name_dat, 'w') as file_handle:
+    file_handle.write("#\n")
+    for header_line in header['header_lines']:
+      file_handle.write("%s\n" % header_line)
+    file_handle.write("#\n")
+    if len(lines) > 0:
+      file_handle.write("\n".join(lines.tolist()) + "\n")
+
+# Convert a binary file to the text format from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) != 3:
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " FILE_NAME_BIN FILE_NAME_DAT")
+    print("   e.g.: python3 " + sys.argv[0] + " HoughtonMI_202305150543_HumidityTemperature_SensorData.bin HoughtonMI_202305150543_HumidityTemperature_SensorData.dat")
+    print("")
+    sys.exit()
+
+  binary2dat(sys.argv[1], sys.argv[2])
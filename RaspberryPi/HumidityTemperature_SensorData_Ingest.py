@@ -0,0 +1,251 @@
+# HumidityTemperature_SensorData_Ingest.py
+#
+# Python module to read the recorded data (.dat file) directly into typed
+# NumPy/pandas columns, in one vectorized pass (pandas' C parser), i.e.,
+# without the intermediate CSV file prepared by
+# HumidityTemperature_SensorData2CSV.sh and without parsing any text twice.
+# Lines starting with # are ignored, fields are separated by the | character
+# and the time stamps are converted in bulk.
+#
+# When run from the command line, it prepares the same CSV file as
+# HumidityTemperature_SensorData2CSV.sh (for consumers that still need it).
+#
+# A .dat file keeps growing while recording. So, the derived outputs (the CSV
+# file and a pickled DataFrame) are updated incrementally: a checkpoint file
+# next to each output (e.g., FILE_NAME.csv.checkpoint) records the byte offset
+# of the .dat file up to which it was ingested, the last counter and a hash of
+# the first and last blocks before that offset. Only the complete lines
+# appended after the offset are parsed and appended to the output. If the .dat
+# file was truncated or rewritten (the hash or the counter do not match), the
+# output is rebuilt from scratch.
+#
+# Usage:
+# from HumidityTemperature_SensorData_Ingest import *
+#
+# df = read_dat('HoughtonMI_202305150543_HumidityTemperature_SensorData.dat')
+#
+# python3 HumidityTemperature_SensorData_Ingest.py LOCATION_TIMESTAMP
+
+# Necessary libraries
+import hashlib
+import io
+import json
+import numpy as np
+import os
+import pandas as pd
+import sys
+
+# Variables
+dat_columns = ['Counter', 'Sensor_ID', 'Timestamp', 'Celsius', 'Fahrenheit']
+dat_dtypes  = {
+                'Counter'    : np.int64,
+                'Sensor_ID'  : 'category',
+                'Timestamp'  : str,
+                'Celsius'    : np.float64,
+                'Fahrenheit' : np.float64,
+              }
+dat_format  = '%Y-%m-%d %H:%M:%S'
+
+# Size of the blocks (at the beginning and the end of the ingested part of the
+# .dat file) that are hashed to detect truncation or rewrites
+checkpoint_block = 4096
+
+# Names of the files related to a given LOCATION_TIMESTAMP
+def file_names(location_timestamp, file_name='HumidityTemperature_SensorData'):
+  file_name_base = str(location_timestamp) + '_' + str(file_name)
+
+  return dict((extension, file_name_base + '.' + extension) for extension in ('dat', 'csv', 'html', 'pdf'))
+
+# Read a .dat file (or an open file-like object) into a DataFrame with the
+# columns Counter, Sensor_ID, Timestamp, Celsius and Fahrenheit
+def read_dat(file_name):
+  try:
+    df = pd.read_csv(
+                      file_name,
+                      sep              = '|',
+                      comment          = '#',
+                      header           = None,
+                      names            = dat_columns,
+                      dtype            = dat_dtypes,
+                      skip_blank_lines = True,
+                      engine           = 'c',
+                    )
+  except pd.errors.EmptyDataError:
+    df = pd.DataFrame(dict((column, pd.Series(dtype=dtype)) for column, dtype in dat_dtypes.items()))
+
+  df['Timestamp'] = pd.to_datetime(df['Timestamp'], format=dat_format)
+
+  return df
+
+# Reshape a DataFrame from read_dat() into the layout of the CSV file, i.e.,
+# one row per time stamp with the Timestamp, Snow_Celsius and Snow_Fahrenheit
+# columns. The header naming convention is critical: Snow_Celsius (or
+# Snow_Fahrenheit) is used to read the color information stored in a Python
+# variable called g_color_snow_celsius (or g_color_snow_fahrenheit). When
+# multiple sensors were recorded, each sensor gets its own pair of columns
+# (e.g., 'Snow_Celsius 28-030497940a6a')
+def dat2frame(df):
+  columns = {'Celsius': 'Snow_Celsius', 'Fahrenheit': 'Snow_Fahrenheit'}
+  sensors = df['Sensor_ID'].unique()
+
+  if len(sensors) <= 1:
+    return df[['Timestamp', 'Celsius', 'Fahrenheit']].rename(columns=columns).reset_index(drop=True)
+
+  wide = df.pivot_table(index=['Counter', 'Timestamp'], columns='Sensor_ID', values=['Celsius', 'Fahrenheit'], observed=True)
+  wide.columns = ['%s %s' % (columns[metric], sensor_id) for metric, sensor_id in wide.columns]
+
+  return wide.reset_index().drop(columns='Counter')
+
+# Read a .dat file in the layout of the CSV file
+def read_frame(file_name):
+  return dat2frame(read_dat(file_name))
+
+# Lines of the CSV file, exactly as HumidityTemperature_SensorData2CSV.sh writes
+# them, i.e., the time stamp, Celsius and Fahrenheit of every line in the .dat
+# file
+def frame2csv(df):
+  if len(df) == 0:
+    return ""
+
+  timestamp  = df['Timestamp'].dt.strftime(dat_format).to_numpy(dtype=str)
+  celsius    = np.char.mod('%07.3f', df['Celsius'].to_numpy())
+  fahrenheit = np.char.mod('%07.3f', df['Fahrenheit'].to_numpy())
+  lines      = np.char.add(np.char.add(np.char.add(np.char.add(timestamp, ',  '), celsius), ',  '), fahrenheit)
+
+  return "\n".join(lines) + "\n"
+
+# Write the CSV file exactly as HumidityTemperature_SensorData2CSV.sh does
+def dat2csv(file_name_dat, file_name_csv):
+  with open(file_name_csv, 'w') as file_handle:
+    file_handle.write("Timestamp, Snow_Celsius, Snow_Fahrenheit\n")
+    file_handle.write(frame2csv(read_dat(file_name_dat)))
+
+# Hash of the first and the last checkpoint_block bytes before offset
+def prefix_digest(file_handle, offset):
+  digest = hashlib.sha1(str(offset).encode('utf-8'))
+  file_handle.seek(0)
+  digest.update(file_handle.read(min(offset, checkpoint_block)))
+  file_handle.seek(max(offset - checkpoint_block, 0))
+  digest.update(file_handle.read(min(offset, checkpoint_block)))
+
+  return digest.hexdigest()
+
+def read_checkpoint(file_name_checkpoint):
+  try:
+    with open(file_name_checkpoint) as file_handle:
+      return json.load(file_handle)
+  except (OSError, ValueError):
+    return None
+
+def write_checkpoint(file_name_checkpoint, checkpoint):
+  file_name_checkpoint_tmp = file_name_checkpoint + '.tmp'
+  with open(file_name_checkpoint_tmp, 'w') as file_handle:
+    json.dump(checkpoint, file_handle)
+  os.replace(file_name_checkpoint_tmp, file_name_checkpoint)
+
+# Read the complete lines of a .dat file appended since a checkpoint (None to
+# read the whole file). Return the new lines (a DataFrame as from read_dat()),
+# whether the derived output needs to be rebuilt from scratch (in which case
+# the new lines are all the lines) and the checkpoint to save once the output
+# is updated. The checkpoint also counts the lines read (rows), i.e., the new
+# lines start at line rows - len(df) of the .dat file
+def read_dat_since(file_name_dat, checkpoint):
+  with open(file_name_dat, 'rb') as file_handle:
+    size    = os.fstat(file_handle.fileno()).st_size
+    rebuild = (checkpoint is None or 'rows' not in checkpoint or checkpoint['offset'] > size or
+               prefix_digest(file_handle, checkpoint['offset']) != checkpoint['digest'])
+    offset  = 0 if rebuild else checkpoint['offset']
+
+    # Only complete lines; a line still being written is read next time
+    file_handle.seek(offset)
+    data = file_handle.read(size - offset)
+    data = data[:data.rfind(b'\n') + 1]
+
+    df = read_dat(io.BytesIO(data))
+
+    # The counter never decreases in a .dat file, unless it was rewritten
+    if not rebuild and len(df) > 0 and df['Counter'].iloc[0] < checkpoint['counter']:
+      return read_dat_since(file_name_dat, None)
+
+    counter = checkpoint['counter'] if not rebuild else 0
+    rows    = checkpoint['rows'] if not rebuild else 0
+    if len(df) > 0:
+      counter = int(df['Counter'].iloc[-1])
+
+    offset     = offset + len(data)
+    checkpoint = {
+                   'offset'  : offset,
+                   'counter' : counter,
+                   'rows'    : rows + len(df),
+                   'digest'  : prefix_digest(file_handle, offset),
+                 }
+
+  return df, rebuild, checkpoint
+
+# Checkpoint of a derived output; None if the output (or its checkpoint) is
+# missing
+def output_checkpoint(file_name_output):
+  if not os.path.exists(file_name_output):
+    return None
+  return read_checkpoint(file_name_output + '.checkpoint')
+
+# Update the CSV file with the lines appended to the .dat file since the last
+# update (or rebuild it, if need be). The measurements flagged by the quality
+# check of the run (if it was checked; see HumidityTemperature_SensorData_QC.py)
+# are left out, and the CSV file is rebuilt when the run is checked again
+def update_csv(file_name_dat, file_name_csv):
+  # Imported here: HumidityTemperature_SensorData_QC.py imports this module
+  from HumidityTemperature_SensorData_QC import drop_qc, qc_version, read_qc
+
+  checkpoint = output_checkpoint(file_name_csv)
+  version    = qc_version(file_name_dat)
+  if checkpoint is not None and checkpoint.get('qc') != version:
+    checkpoint = None
+
+  df, rebuild, checkpoint = read_dat_since(file_name_dat, checkpoint)
+  df = drop_qc(df, read_qc(file_name_dat), first=checkpoint['rows'] - len(df))
+  checkpoint['qc'] = version
+
+  with open(file_name_csv, 'w' if rebuild else 'a') as file_handle:
+    if rebuild:
+      file_handle.write("Timestamp, Snow_Celsius, Snow_Fahrenheit\n")
+    file_handle.write(frame2csv(df))
+
+  write_checkpoint(file_name_csv + '.checkpoint', checkpoint)
+
+# Read a .dat file (as read_dat() does), parsing only the lines appended since
+# the last call; the lines parsed earlier are kept in a pickled DataFrame
+# (FILE_NAME.dat.pkl)
+def update_dat(file_name_dat):
+  file_name_pkl = file_name_dat + '.pkl'
+  df, rebuild, checkpoint = read_dat_since(file_name_dat, output_checkpoint(file_name_pkl))
+
+  if not rebuild:
+    df = pd.concat([pd.read_pickle(file_name_pkl), df], ignore_index=True)
+    df['Sensor_ID'] = df['Sensor_ID'].astype('category')
+
+  df.to_pickle(file_name_pkl)
+  write_checkpoint(file_name_pkl + '.checkpoint', checkpoint)
+
+  return df
+
+# Prepare the CSV file from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) != 2:
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " LOCATION_TIMESTAMP")
+    print("   e.g.: python3 " + sys.argv[0] + " HoughtonMI_202305150543")
+    print("")
+    sys.exit()
+
+  files = file_names(sys.argv[1])
+  if not os.path.exists(files['dat']) or os.path.getsize(files['dat']) == 0:
+    print("")
+    print("  %s does not exist or is empty." % files['dat'])
+    print("  Exiting the script/workflow.")
+    print("")
+    sys.exit(66)
+
+  update_csv(files['dat'], files['csv'])
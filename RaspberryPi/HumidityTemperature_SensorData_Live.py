@@ -0,0 +1,179 @@
+# HumidityTemperature_SensorData_Live.py
+#
+# Python module to keep the most recent measurements of every sensor in memory
+# and serve them over HTTP on the Raspberry Pi itself (localhost only), without
+# reading the recorded file(s) again. Dashboards and alerting scripts can poll
+# it as often as needed. The last live_samples measurements of every sensor are
+# kept in a fixed-size ring buffer (backed by arrays of C doubles), so memory
+# use does not grow with the length of the recording.
+#
+# Endpoints (JSON responses; Celsius)
+#
+#   /sensors                       : Sensor IDs
+#   /latest                        : Latest measurement of every sensor
+#   /last?sensor=SENSOR_ID&k=K     : Last K measurements of a sensor
+#   /stats?sensor=SENSOR_ID&k=K    : Count, mean, standard deviation, minimum
+#                                    and maximum of the last K measurements
+#                                    (all measurements in memory if K is
+#                                    omitted) of a sensor
+#
+# Time stamps are in seconds since the epoch.
+#
+# Usage:
+# from HumidityTemperature_SensorData_Live import *
+#
+# live   = LiveReadings(sensor_ids, live_samples=1440)
+# server = LiveServer(live, port=8018)
+# live.add(date_time, readings)
+# server.close()
+#
+# curl http://localhost:8018/latest
+
+# Necessary libraries
+# This module runs on a Raspberry Pi with minimal resources
+# So, import only what's absolutely necessary
+import array
+import http.server
+import json
+import math
+import threading
+import urllib.parse
+
+# Fixed-size buffer of (epoch, value) pairs; the oldest pair is overwritten
+# once the buffer is full
+class RingBuffer:
+
+  def __init__(self, capacity):
+    if capacity <= 0:
+      raise ValueError("capacity must be positive: %r" % (capacity,))
+
+    self.capacity = capacity
+    self.epoch    = array.array('d', bytes(8 * capacity))
+    self.value    = array.array('d', bytes(8 * capacity))
+    self.count    = 0
+    self.next     = 0
+
+  def append(self, epoch, value):
+    self.epoch[self.next] = epoch
+    self.value[self.next] = value
+    self.next             = (self.next + 1) % self.capacity
+    self.count            = min(self.count + 1, self.capacity)
+
+  # Last k pairs (all of them if k is None), oldest first
+  def last(self, k=None):
+    if k is None or k > self.count:
+      k = self.count
+    start = (self.next - k) % self.capacity
+
+    return [(self.epoch[(start + i) % self.capacity], self.value[(start + i) % self.capacity])
+            for i in range(k)]
+
+  def latest(self):
+    if self.count == 0:
+      return None
+    return self.last(1)[0]
+
+# Ring buffers of every sensor, shared by the recording loop and the server
+class LiveReadings:
+
+  def __init__(self, sensor_ids, live_samples=1440):
+    self.lock    = threading.Lock()
+    self.buffers = dict((sensor_id, RingBuffer(live_samples)) for sensor_id in sensor_ids)
+
+  # Add one measurement. readings is a list of (sensor_id, celsius,
+  # fahrenheit) tuples sharing date_time (a datetime)
+  def add(self, date_time, readings):
+    epoch = date_time.timestamp()
+    with self.lock:
+      for sensor_id, celsius, fahrenheit in readings:
+        if sensor_id in self.buffers:
+          self.buffers[sensor_id].append(epoch, celsius)
+
+  def sensors(self):
+    return list(self.buffers)
+
+  def latest(self):
+    with self.lock:
+      latest = dict((sensor_id, buffer.latest()) for sensor_id, buffer in self.buffers.items())
+
+    return dict((sensor_id, {'epoch': pair[0], 'celsius': pair[1]})
+                for sensor_id, pair in latest.items() if pair is not None)
+
+  def last(self, sensor_id, k=None):
+    with self.lock:
+      pairs = self.buffers[sensor_id].last(k)
+
+    return [{'epoch': epoch, 'celsius': celsius} for epoch, celsius in pairs]
+
+  def stats(self, sensor_id, k=None):
+    with self.lock:
+      values = [celsius for epoch, celsius in self.buffers[sensor_id].last(k)]
+
+    count = len(values)
+    if count == 0:
+      return {'count': 0}
+
+    mean     = sum(values) / count
+    variance = sum((value - mean) ** 2 for value in values) / (count - 1) if count > 1 else 0.0
+
+    return {
+             'count' : count,
+             'mean'  : mean,
+             'std'   : math.sqrt(variance),
+             'min'   : min(values),
+             'max'   : max(values),
+           }
+
+# Handle the requests to the endpoints above
+class LiveRequestHandler(http.server.BaseHTTPRequestHandler):
+
+  def reply(self, status, body):
+    body = json.dumps(body).encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    live  = self.server.live
+    url   = urllib.parse.urlparse(self.path)
+    query = dict((key, values[-1]) for key, values in urllib.parse.parse_qs(url.query).items())
+
+    try:
+      k = int(query['k']) if 'k' in query else None
+    except ValueError:
+      return self.reply(400, {'error': 'k must be an integer'})
+
+    if url.path == '/sensors':
+      return self.reply(200, live.sensors())
+    if url.path == '/latest':
+      return self.reply(200, live.latest())
+    if url.path in ('/last', '/stats'):
+      sensor_id = query.get('sensor')
+      if sensor_id not in live.buffers:
+        return self.reply(404, {'error': 'unknown sensor %s' % sensor_id})
+      if url.path == '/last':
+        return self.reply(200, live.last(sensor_id, k))
+      return self.reply(200, live.stats(sensor_id, k))
+
+    return self.reply(404, {'error': 'unknown endpoint %s' % url.path})
+
+  # Do not print every request (it would interleave with the measurements)
+  def log_message(self, format, *args):
+    pass
+
+# Serve the endpoints from a background thread
+class LiveServer:
+
+  def __init__(self, live, host='127.0.0.1', port=8018):
+    self.server                = http.server.ThreadingHTTPServer((host, port), LiveRequestHandler)
+    self.server.live           = live
+    self.server.daemon_threads = True
+    self.port                  = self.server.server_address[1]
+    self.thread                = threading.Thread(target=self.server.serve_forever, name='live', daemon=True)
+    self.thread.start()
+
+  def close(self):
+    self.server.shutdown()
+    self.server.server_close()
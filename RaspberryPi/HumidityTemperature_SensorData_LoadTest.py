@@ -0,0 +1,127 @@
+# HumidityTemperature_SensorData_LoadTest.py
+#
+# Python3 script/workflow to measure the throughput and tail latency of the
+# recording loop (as in HumidityTemperature_SensorData_Record.py) without the
+# hardware and as fast as possible: no pause between measurements, any number
+# of sensors on a simulated 1-Wire bus (see
+# HumidityTemperature_SensorData_Simulator.py; no conversion latency unless
+# given in DEVICE_LOCATION). Every measurement goes through the same steps as
+# when recording (reading every sensor, writing to the file with group
+# commits, updating the summaries, the most recent measurements and the
+# Terminal display, sent to /dev/null here), which are timed separately. The
+# files are written to a temporary folder, removed at the end.
+#
+# Usage:
+# python3 HumidityTemperature_SensorData_LoadTest.py SENSORS MEASUREMENTS [DEVICE_LOCATION]
+
+# Necessary libraries
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from HumidityTemperature_SensorData_Aggregate import TierAggregator
+from HumidityTemperature_SensorData_Live import LiveReadings
+from HumidityTemperature_SensorData_Sensors import SensorPoller, detect_sensors
+from HumidityTemperature_SensorData_Writer import DurableRecordWriter
+
+# Variables (as in HumidityTemperature_SensorData_Record.py)
+record_format  = 'dat'
+commit_records = 5
+commit_seconds = 300
+commit_fsync   = True
+live_samples   = 1440
+steps          = ('poll', 'write', 'aggregate', 'live', 'display', 'total')
+
+# Percentile (0-100) of sorted values
+def percentile(values, percent):
+  if len(values) == 0:
+    return float('nan')
+  return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+# Run counter_max measurements; return the time (seconds) of every step of
+# every measurement, the number of readings and the number of failed reads
+def load_test(device_location, counter_max, folder):
+  sensor_ids = detect_sensors(device_location)
+  file_name  = os.path.join(folder, 'LoadTest_000000000000_HumidityTemperature_SensorData')
+  writer     = DurableRecordWriter(file_name + '.' + record_format, record_format, sensor_ids,
+                                   commit_records = commit_records,
+                                   commit_seconds = commit_seconds,
+                                   fsync          = commit_fsync)
+  aggregator = TierAggregator(file_name)
+  live       = LiveReadings(sensor_ids, live_samples)
+  display    = open(os.devnull, 'w')
+
+  times    = dict((step, []) for step in steps)
+  count    = 0
+  failures = 0
+  with SensorPoller(sensor_ids, device_location) as poller:
+    for counter in range(1, counter_max + 1):
+      time_start = time.perf_counter()
+      date_time, readings = poller.poll()
+      failures = failures + sum(1 for reading in readings if reading[1] is None)
+      readings = [reading for reading in readings if reading[1] is not None]
+      time_poll = time.perf_counter()
+
+      writer.write(date_time, counter, readings)
+      time_write = time.perf_counter()
+
+      aggregator.add(date_time, readings)
+      time_aggregate = time.perf_counter()
+
+      live.add(date_time, readings)
+      time_live = time.perf_counter()
+
+      date_time = date_time.strftime("%Y-%m-%d %H:%M:%S")
+      for sensor_id, celsius, fahrenheit in readings:
+        print("%04d|%s|%19s|%07.3f|%07.3f" % (counter, sensor_id, date_time, celsius, fahrenheit), file=display)
+      time_display = time.perf_counter()
+
+      count = count + len(readings)
+      for step, duration in zip(steps, (time_poll - time_start, time_write - time_poll,
+                                        time_aggregate - time_write, time_live - time_aggregate,
+                                        time_display - time_live, time_display - time_start)):
+        times[step].append(duration)
+
+  writer.close()
+  aggregator.close()
+  display.close()
+
+  return times, count, failures
+
+# Run the load test from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) not in (3, 4):
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " SENSORS MEASUREMENTS [DEVICE_LOCATION]")
+    print("   e.g.: python3 " + sys.argv[0] + " 300 1000")
+    print("         python3 " + sys.argv[0] + " 300 100 'sim:?sensors=300&latency=0.75&crc_failure=0.01'")
+    print("")
+    sys.exit()
+
+  sensors         = int(sys.argv[1])
+  counter_max     = int(sys.argv[2])
+  device_location = sys.argv[3] if len(sys.argv) == 4 else 'sim:?sensors=%d&latency=0&pattern=walk' % (sensors)
+
+  folder = tempfile.mkdtemp(prefix='HumidityTemperature_SensorData_LoadTest_')
+  try:
+    time_start = time.perf_counter()
+    times, count, failures = load_test(device_location, counter_max, folder)
+    elapsed = time.perf_counter() - time_start
+  finally:
+    shutil.rmtree(folder, ignore_errors=True)
+
+  print("")
+  print("  Device location : %s" % (device_location))
+  print("  Measurements    : %d in %.2f s (%.1f per second)" % (counter_max, elapsed, counter_max / elapsed))
+  print("  Readings        : %d (%.1f per second), %d failed" % (count, count / elapsed, failures))
+  print("")
+  print("  %-10s %10s %10s %10s %10s" % ('Step (ms)', 'mean', 'p50', 'p99', 'max'))
+  for step in steps:
+    values = sorted(times[step])
+    print("  %-10s %10.3f %10.3f %10.3f %10.3f" % (step, 1000 * sum(values) / len(values),
+          1000 * percentile(values, 50), 1000 * percentile(values, 99), 1000 * values[-1]))
+  print("")
@@ -0,0 +1,129 @@
+# HumidityTemperature_SensorData_Overlay.py
+#
+# Python3 script/workflow to overlay the recorded data of many runs (e.g.,
+# every HoughtonMI run of a winter, from several locations) on one plot (HTML
+# file). Every run and sensor is drawn as its mean, within a band from its
+# minimum to its maximum, read from the run's pyramid (see
+# HumidityTemperature_SensorData_Pyramid.py) at the coarsest level that fills
+# the view. So, months of data are drawn with a few thousand points per trace.
+#
+# The runs are LOCATION_TIMESTAMPs and/or glob patterns (as in
+# HumidityTemperature_SensorData_Plot.py). The view spans all runs, unless
+# view_start and/or view_end are set.
+#
+# Usage:
+# python3 HumidityTemperature_SensorData_Overlay.py FILE_NAME_HTML LOCATION_TIMESTAMP [LOCATION_TIMESTAMP ...]
+
+# Necessary libraries
+from CommonFunctions import *
+from HumidityTemperature_SensorData_Plot import location_timestamps
+from HumidityTemperature_SensorData_Pyramid import plot_points, pyramid_view
+
+# Variables
+view_start = None
+view_end   = None
+
+# Overlay the runs between start and end
+def plot_overlay(location_timestamps, start=None, end=None, points=plot_points):
+  level, view = pyramid_view(location_timestamps, start, end, points)
+
+  fig = go.Figure()
+  for index, ((location_timestamp, sensor_id), series) in enumerate(sorted(view.items())):
+    name  = '%s %s' % (location_timestamp, sensor_id)
+    color = colors[index % len(colors)]
+
+    # Band from the minimum to the maximum, then the mean
+    fig.add_trace(go.Scatter(
+                          x           = series['Timestamp'],
+                          y           = series['Max'],
+                          legendgroup = name,
+                          showlegend  = False,
+                          hoverinfo   = 'skip',
+                          mode        = 'lines',
+                          line        = dict(width = 0),
+                        )
+                 )
+    fig.add_trace(go.Scatter(
+                          x           = series['Timestamp'],
+                          y           = series['Min'],
+                          legendgroup = name,
+                          showlegend  = False,
+                          hoverinfo   = 'skip',
+                          mode        = 'lines',
+                          line        = dict(width = 0),
+                          fill        = 'tonexty',
+                          fillcolor   = color,
+                          opacity     = 0.25,
+                        )
+                 )
+    fig.add_trace(go.Scatter(
+                          x           = series['Timestamp'],
+                          y           = series['Mean'],
+                          name        = name,
+                          legendgroup = name,
+                          opacity     = 0.95,
+                          mode        = 'lines',
+                          line        = dict(
+                                          color = color,
+                                          width = g_line_width_single,
+                                        ),
+                        )
+                 )
+
+  fig.update_layout(
+                     title_text       = 'Celsius (mean, minimum and maximum every %s)' % (level),
+                     title_x          = g_title_x,
+                     title_font_color = g_title_font_color,
+                     title_font_size  = g_title_font_size,
+                     xaxis_tickangle  = g_xaxis_tickangle,
+                     xaxis            = dict(
+                                          title          = 'Time',
+                                          titlefont_size = g_xaxis_titlefont_size,
+                                          tickfont_size  = g_xaxis_tickfont_size,
+                                        ),
+                     yaxis            = dict(
+                                          title          = 'Temperature',
+                                          titlefont_size = g_yaxis_titlefont_size,
+                                          tickfont_size  = g_yaxis_tickfont_size,
+                                        ),
+                     hovermode        = g_hovermode,
+                     plot_bgcolor     = g_plot_bgcolor,
+                   )
+
+  fig.update_xaxes(
+                    showline  = True,
+                    linewidth = g_xaxes_linewidth,
+                    linecolor = g_xaxes_linecolor
+                  )
+
+  fig.update_yaxes(
+                    showline   = True,
+                    linewidth  = g_yaxes_linewidth,
+                    linecolor  = g_yaxes_linecolor,
+                    gridwidth  = g_yaxes_gridwidth,
+                    gridcolor  = g_yaxes_gridcolor
+                  )
+
+  return fig
+
+# Overlay the runs from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) < 3:
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " FILE_NAME_HTML LOCATION_TIMESTAMP [LOCATION_TIMESTAMP ...]")
+    print("   e.g.: python3 " + sys.argv[0] + " HoughtonMI_Winter.html 'HoughtonMI_2023*'")
+    print("")
+    sys.exit()
+
+  runs = location_timestamps(sys.argv[2:])
+  if len(runs) == 0:
+    print("")
+    print("  No runs match %s." % (' '.join(sys.argv[2:])))
+    print("  Exiting the script/workflow.")
+    print("")
+    sys.exit(66)
+
+  fig = plot_overlay(runs, view_start, view_end)
+  fig.write_html(sys.argv[1], full_html=True, include_plotlyjs = 'cdn', config = dict(g_config))
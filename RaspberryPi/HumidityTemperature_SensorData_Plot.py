@@ -1,116 +1,429 @@
 # HumidityTemperature_SensorData_Plot.py
 #
-# Python3 script/workflow to plot the histogram of finish times.
+# Python3 script/workflow to plot the recorded data (HTML and PDF files).
+#
+# Any number of runs may be plotted at once, as LOCATION_TIMESTAMPs and/or
+# glob patterns (e.g., 'HoughtonMI_2023*', matched against the .dat and .csv
+# files in the current folder). Multiple runs are plotted in parallel, by up
+# to plot_workers processes. Each process imports the libraries and starts the
+# image export engine (kaleido) once, and reuses them for every run it plots.
+#
+# Rendered files are cached (in plot_cache, up to plot_cache_size bytes; the
+# least recently used entries are evicted first), keyed on a hash of the
+# recorded data, the plot settings (g_* variables from CommonFunctions.py and
+# the plot_* variables below), this script, the modules it renders with
+# (renderer_modules) and the versions of plotly and kaleido. A run whose key
+# is in the cache is not plotted again; its files are copied from the cache.
 #
 # Usage:
-# python3 HumidityTemperature_SensorData_Plot.py LOCATION_TIMESTAMP
+# python3 HumidityTemperature_SensorData_Plot.py LOCATION_TIMESTAMP [LOCATION_TIMESTAMP ...]
 
 # Necessary libraries
 # from functions import *
 from CommonFunctions import *
-
-# Argument check
-if len(sys.argv) != 2:
-  print("")
-  print("  Usage: python3 " + sys.argv[0] + " LOCATION_TIMESTAMP")
-  print("   e.g.: python3 " + sys.argv[0] + " HoughtonMI_202305150543")
-  print("")
-  sys.exit()
+from CommonColormaps import hls_colormap, metric_style, values2colors
+from HumidityTemperature_SensorData_Ingest import dat2frame, update_dat
+from HumidityTemperature_SensorData_QC import apply_qc, file_name_qc, read_qc
+import concurrent.futures
+import hashlib
+import importlib.metadata
+import json
+import plotly
+import shutil
 
 # Variables
-# location_timestamp = sys.argv[1]
-location_timestamp = 'HoughtonMI_202305150543'
-file_name          = 'HumidityTemperature_SensorData'
-file_csv           = str(location_timestamp) + '_' + str(file_name) + '.csv'
-file_html          = str(location_timestamp) + '_' + str(file_name) + '.html'
-file_pdf           = str(location_timestamp) + '_' + str(file_name) + '.pdf'
-
-# Read the CSV
-df = pd.read_csv(file_csv)
-
-# DEBUG
-# df.head()
-
-# Overall appearance
-config = g_config
-
-# Create blank figure
-fig = go.Figure()
-
-for metric in df.columns[1:]:
-  metric_lc_line            = 'g_color_' + metric.lower() + '_line'
-  metric_lc_marker          = 'g_color_' + metric.lower() + '_marker'
-  metric_color_line_value   = globals()[metric_lc_line]
-  metric_color_marker_value = globals()[metric_lc_marker]
-
-  fig.add_trace(go.Scatter(
-                        x          = df['Timestamp'],
-                        y          = df[metric],
-                        name       = metric,
-                        opacity    = 0.95,
-                        mode       = 'lines+markers',
-                        line_shape = 'spline',
-                        line       = dict(
-                                       color = metric_color_line_value,
-                                       width = g_line_width_single,
-                                     ),
-                        marker     = dict(
-                                       color = metric_color_marker_value,
-                                       size  = g_marker_size_single,
-                                     ),
-                      )
-               )
-
-# Update layout
-fig.update_layout(
-                   title_text       = '',
-                   title_x          = g_title_x,
-                   title_font_color = g_title_font_color,
-                   title_font_size  = g_title_font_size,
-                   barmode          = 'group', 
-                   bargap           = 0.35, 
-                   bargroupgap      = 0.25, 
-                   xaxis_tickangle  = g_xaxis_tickangle,
-                   xaxis            = dict(
-                                        title          = 'Time (h:mm:ss)',
-                                        titlefont_size = g_xaxis_titlefont_size,
-                                        tickfont_size  = g_xaxis_tickfont_size,
-                                        tickformat     = '%H:%M:%S',
-                                      ),
-                   # https://github.com/plotly/plotly.py/issues/2393
-                   yaxis            = dict(
-                                        title          = 'Temperature and Humidity',
-                                        titlefont_size = g_yaxis_titlefont_size,
-                                        tickfont_size  = g_yaxis_tickfont_size,
-                                      ),
-                   hovermode        = g_hovermode,
-                   plot_bgcolor     = g_plot_bgcolor,
-                   legend           = dict(
-                                        orientation    = 'h',
-                                        xanchor        = 'right',
-                                        yanchor        = 'top',
-                                        x              = 1.00,
-                                        y              = 0.95,
-                                      )
+file_name       = 'HumidityTemperature_SensorData'
+plot_workers    = os.cpu_count()
+plot_cache      = '.HumidityTemperature_SensorData_Plot_Cache'
+plot_cache_size = 512 * 2**20
+
+# Modules whose code shapes the rendered files (styles and colors, reading the
+# data and the quality-control mask), hashed along with this script
+renderer_modules = ('CommonFunctions', 'CommonColormaps', 'HumidityTemperature_SensorData_Ingest',
+                    'HumidityTemperature_SensorData_QC')
+
+# Color every marker by its value (from blue, the minimum of the metric, to
+# red, its maximum) instead of the metric's marker color
+plot_color_by_value = False
+
+# Large recordings
+# Above plot_webgl_threshold rows, every metric is downsampled to plot_points
+# points (Largest-Triangle-Three-Buckets, which preserves the visual shape)
+# and drawn with WebGL (Scattergl), so that the size of the HTML file and the
+# time to render it remain roughly constant as recordings grow. The full
+# resolution data is written to file_json; when the HTML file is served over
+# HTTP (e.g., from remote_website), zooming in replaces the downsampled
+# points in view with the full resolution ones
+plot_webgl_threshold = 5000
+plot_points          = 2000
+plot_zoom_script     = '''
+var gd   = document.getElementById('{plot_id}');
+var full = null;
+var base = gd.data.map(function(trace) { return {x: trace.x, y: trace.y}; });
+
+// Index of the first time stamp >= value (time stamps are sorted strings)
+function bisect(x, value) {
+  var lo = 0, hi = x.length;
+  while (lo < hi) {
+    var mid = (lo + hi) >> 1;
+    if (x[mid] < value) { lo = mid + 1; } else { hi = mid; }
+  }
+  return lo;
+}
+
+function show(range) {
+  var xs = [], ys = [];
+  for (var i = 0; i < gd.data.length; i++) {
+    if (range === null) {
+      xs.push(base[i].x);
+      ys.push(base[i].y);
+      continue;
+    }
+    var series = full[gd.data[i].name];
+    var first  = bisect(series.x, String(range[0]));
+    var last   = bisect(series.x, String(range[1]));
+    var step   = Math.max(1, Math.ceil((last - first) / %(plot_points)d));
+    var x = [], y = [];
+    for (var j = first; j < last; j += step) { x.push(series.x[j]); y.push(series.y[j]); }
+    xs.push(x);
+    ys.push(y);
+  }
+  Plotly.restyle(gd, {x: xs, y: ys});
+}
+
+gd.on('plotly_relayout', function(event) {
+  if (event['xaxis.autorange']) { show(null); return; }
+  if (!('xaxis.range[0]' in event)) { return; }
+  var range = [event['xaxis.range[0]'], event['xaxis.range[1]']];
+  if (full !== null) { show(range); return; }
+  fetch('%(file_json)s').then(function(response) { return response.json(); })
+             .then(function(data) { full = data; show(range); })
+             .catch(function() {});
+});
+'''
+
+# LOCATION_TIMESTAMPs of the runs matching the arguments (LOCATION_TIMESTAMPs
+# or glob patterns), in order and without duplicates
+def location_timestamps(arguments):
+  location_timestamps = []
+  for argument in arguments:
+    matches = [argument]
+    if glob.has_magic(argument):
+      files   = glob.glob(argument + '_' + file_name + '.dat') + glob.glob(argument + '_' + file_name + '.csv')
+      matches = sorted(set(f[:-len('_' + file_name + '.dat')] for f in files))
+    for match in matches:
+      if match not in location_timestamps:
+        location_timestamps.append(match)
+
+  return location_timestamps
+
+# Start the image export engine, so that the first run plotted by a process
+# does not pay for it
+def plot_worker_init():
+  go.Figure().to_image(format='pdf')
+
+# Versions of the libraries that render the files, and a hash of this script
+# and of renderer_modules
+def renderer_version():
+  try:
+    kaleido_version = importlib.metadata.version('kaleido')
+  except importlib.metadata.PackageNotFoundError:
+    kaleido_version = None
+
+  digest = hashlib.sha1()
+  for file_name_source in [__file__] + [sys.modules[name].__file__ for name in renderer_modules]:
+    with open(file_name_source, 'rb') as file_handle:
+      digest.update(file_handle.read())
+  script_digest = digest.hexdigest()
+
+  return 'plotly %s, kaleido %s, %s' % (plotly.__version__, kaleido_version, script_digest)
+
+# Cache key of a run: hash of the recorded data (file_inputs), the plot
+# settings and the renderer version
+def plot_cache_key(location_timestamp, file_inputs):
+  settings = sorted((name, repr(value)) for name, value in globals().items()
+                    if name.startswith('g_') or name in ('plot_webgl_threshold', 'plot_points', 'plot_color_by_value'))
+
+  digest = hashlib.sha1()
+  digest.update(repr((str(location_timestamp), [os.path.basename(file_input) for file_input in file_inputs],
+                       settings, renderer_version())).encode('utf-8'))
+  for file_input in file_inputs:
+    with open(file_input, 'rb') as file_handle:
+      for block in iter(lambda: file_handle.read(2**20), b''):
+        digest.update(block)
+
+  return digest.hexdigest()
+
+# Copy the files of a run from the cache; False if the key is not cached
+def plot_cache_get(key, file_outputs):
+  entry = os.path.join(plot_cache, key)
+  if not os.path.isdir(entry):
+    return False
+
+  try:
+    for file_output in file_outputs:
+      file_cached = os.path.join(entry, os.path.basename(file_output))
+      if os.path.exists(file_cached):
+        shutil.copyfile(file_cached, file_output)
+      elif os.path.exists(file_output):
+        os.remove(file_output)
+    os.utime(entry)
+  except OSError:
+    return False
+
+  return True
+
+# Store the files of a run in the cache, then evict the least recently used
+# entries beyond plot_cache_size bytes
+def plot_cache_put(key, file_outputs):
+  entry     = os.path.join(plot_cache, key)
+  entry_tmp = '%s.%d.tmp' % (entry, os.getpid())
+  os.makedirs(entry_tmp, exist_ok=True)
+  for file_output in file_outputs:
+    if os.path.exists(file_output):
+      shutil.copyfile(file_output, os.path.join(entry_tmp, os.path.basename(file_output)))
+
+  # Another process may have stored the same key meanwhile
+  try:
+    os.rename(entry_tmp, entry)
+  except OSError:
+    shutil.rmtree(entry_tmp, ignore_errors=True)
+
+  plot_cache_evict()
+
+def plot_cache_evict(size_max=None):
+  if size_max is None:
+    size_max = plot_cache_size
+
+  entries = []
+  for entry in os.scandir(plot_cache):
+    if entry.is_dir() and not entry.name.endswith('.tmp'):
+      try:
+        size = sum(item.stat().st_size for item in os.scandir(entry.path))
+        entries.append((entry.stat().st_mtime, size, entry.path))
+      except OSError:
+        pass
+
+  size = sum(entry[1] for entry in entries)
+  for mtime, entry_size, path in sorted(entries):
+    if size <= size_max:
+      break
+    shutil.rmtree(path, ignore_errors=True)
+    size = size - entry_size
+
+# Plot one run (HTML and PDF files), unless its files are cached. Return
+# 'cached' or 'plotted'
+def plot_run(location_timestamp):
+  file_dat  = str(location_timestamp) + '_' + str(file_name) + '.dat'
+  file_csv  = str(location_timestamp) + '_' + str(file_name) + '.csv'
+  file_html = str(location_timestamp) + '_' + str(file_name) + '.html'
+  file_pdf  = str(location_timestamp) + '_' + str(file_name) + '.pdf'
+  file_json = str(location_timestamp) + '_' + str(file_name) + '.json'
+
+  file_inputs  = [file_dat, file_name_qc(file_dat)] if os.path.exists(file_dat) else [file_csv]
+  file_inputs  = [file_input for file_input in file_inputs if os.path.exists(file_input)]
+  file_outputs = [file_html, file_pdf, file_json]
+  key          = plot_cache_key(location_timestamp, file_inputs)
+  if plot_cache_get(key, file_outputs):
+    return 'cached'
+
+  # Read the recorded data directly (parsing only the lines appended since the
+  # previous run) or, if only the CSV file is available, the CSV. If the run
+  # was checked (HumidityTemperature_SensorData_QC.py), the unusable
+  # measurements are left out
+  if os.path.exists(file_dat):
+    df   = update_dat(file_dat)
+    mask = read_qc(file_dat)
+    if mask is not None:
+      df = apply_qc(df, mask)
+    df = dat2frame(df)
+  else:
+    df = pd.read_csv(file_csv, skipinitialspace=True)
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+
+  # Large recordings are downsampled and drawn with WebGL
+  plot_large = len(df) > plot_webgl_threshold
+  plot_full  = {}
+
+  # DEBUG
+  # df.head()
+
+  # Overall appearance (a copy; write_html() adds to it, which would change
+  # the cache key of the runs plotted next by this process)
+  config = dict(g_config)
+
+  # Create blank figure
+  fig = go.Figure()
+
+  # With multiple sensors, the metric is followed by the sensor ID (e.g.,
+  # 'Snow_Celsius 28-030497940a6a'); every sensor gets its own shade of the
+  # color of the metric
+  sensors = {}
+  for metric in df.columns[1:]:
+    sensor = sensors.setdefault(metric.split(' ')[0], [])
+    sensor.append(metric)
+    metric_color_line_value   = metric_style(metric, len(sensor) - 1)['line']
+    metric_color_marker_value = metric_style(metric, len(sensor) - 1)['marker']
+    if plot_color_by_value:
+      metric_color_marker_value = values2colors(df[metric], hls_colormap())
+
+    if plot_large:
+      series  = df[['Timestamp', metric]].dropna()
+      indices = lttb(series['Timestamp'].astype('int64'), series[metric], plot_points)
+      plot_full[metric] = {
+                            'x' : series['Timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+                            'y' : series[metric].tolist(),
+                          }
+
+      fig.add_trace(go.Scattergl(
+                            x          = series['Timestamp'].iloc[indices],
+                            y          = series[metric].iloc[indices],
+                            name       = metric,
+                            opacity    = 0.95,
+                            mode       = 'lines',
+                            line       = dict(
+                                           color = metric_color_line_value,
+                                           width = g_line_width_single,
+                                         ),
+                          )
+                   )
+      continue
+
+    fig.add_trace(go.Scatter(
+                          x          = df['Timestamp'],
+                          y          = df[metric],
+                          name       = metric,
+                          opacity    = 0.95,
+                          mode       = 'lines+markers',
+                          line_shape = 'spline',
+                          line       = dict(
+                                         color = metric_color_line_value,
+                                         width = g_line_width_single,
+                                       ),
+                          marker     = dict(
+                                         color = metric_color_marker_value,
+                                         size  = g_marker_size_single,
+                                       ),
+                        )
                  )
 
-fig.update_xaxes(
-                  showline  = True,
-                  linewidth = g_xaxes_linewidth,
-                  linecolor = g_xaxes_linecolor
-                )
-
-fig.update_yaxes(
-                  showline   = True,
-                  linewidth  = g_yaxes_linewidth,
-                  linecolor  = g_yaxes_linecolor,
-                  gridwidth  = g_yaxes_gridwidth,
-                  gridcolor  = g_yaxes_gridcolor
-                )
-
-# Show the graph (opens a browser when run locally)
-# fig.show()
-
-# Write to HTML and PDF
-fig.write_html(file_html, full_html=True, include_plotlyjs = 'cdn', config = config)
-fig.write_image(file_pdf)
+  # Update layout
+  fig.update_layout(
+                     title_text       = '',
+                     title_x          = g_title_x,
+                     title_font_color = g_title_font_color,
+                     title_font_size  = g_title_font_size,
+                     barmode          = 'group', 
+                     bargap           = 0.35, 
+                     bargroupgap      = 0.25, 
+                     xaxis_tickangle  = g_xaxis_tickangle,
+                     xaxis            = dict(
+                                          title          = 'Time (h:mm:ss)',
+                                          titlefont_size = g_xaxis_titlefont_size,
+                                          tickfont_size  = g_xaxis_tickfont_size,
+                                          tickformat     = '%H:%M:%S',
+                                        ),
+                     # https://github.com/plotly/plotly.py/issues/2393
+                     yaxis            = dict(
+                                          title          = 'Temperature and Humidity',
+                                          titlefont_size = g_yaxis_titlefont_size,
+                                          tickfont_size  = g_yaxis_tickfont_size,
+                                        ),
+                     hovermode        = g_hovermode,
+                     plot_bgcolor     = g_plot_bgcolor,
+                     legend           = dict(
+                                          orientation    = 'h',
+                                          xanchor        = 'right',
+                                          yanchor        = 'top',
+                                          x              = 1.00,
+                                          y              = 0.95,
+                                        )
+                   )
+
+  fig.update_xaxes(
+                    showline  = True,
+                    linewidth = g_xaxes_linewidth,
+                    linecolor = g_xaxes_linecolor
+                  )
+
+  fig.update_yaxes(
+                    showline   = True,
+                    linewidth  = g_yaxes_linewidth,
+                    linecolor  = g_yaxes_linecolor,
+                    gridwidth  = g_yaxes_gridwidth,
+                    gridcolor  = g_yaxes_gridcolor
+                  )
+
+  # Show the graph (opens a browser when run locally)
+  # fig.show()
+
+  # Write to HTML and PDF (and, for large recordings, the full resolution data)
+  if plot_large:
+    with open(file_json, 'w') as file_handle:
+      json.dump(plot_full, file_handle)
+    fig.write_html(file_html, full_html=True, include_plotlyjs = 'cdn', config = config, post_script = plot_zoom_script % {'plot_points': plot_points, 'file_json': os.path.basename(file_json)})
+  else:
+    fig.write_html(file_html, full_html=True, include_plotlyjs = 'cdn', config = config)
+  fig.write_image(file_pdf)
+
+  # Small recordings have no full resolution data; an earlier one would be
+  # stale
+  if not plot_large and os.path.exists(file_json):
+    os.remove(file_json)
+
+  plot_cache_put(key, file_outputs)
+
+  return 'plotted'
+
+# Plot one run, in a worker process. Return the run, the time taken, whether
+# it was cached or plotted and the error (None if successful)
+def plot_run_timed(location_timestamp):
+  time_start = time.time()
+  try:
+    status = plot_run(location_timestamp)
+    error  = None
+  except Exception as exception:
+    status = 'failed'
+    error  = "%s: %s" % (type(exception).__name__, exception)
+
+  return location_timestamp, time.time() - time_start, status, error
+
+# Plot the runs from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) < 2:
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " LOCATION_TIMESTAMP [LOCATION_TIMESTAMP ...]")
+    print("   e.g.: python3 " + sys.argv[0] + " HoughtonMI_202305150543")
+    print("         python3 " + sys.argv[0] + " 'HoughtonMI_2023*'")
+    print("")
+    sys.exit()
+
+  runs = location_timestamps(sys.argv[1:])
+  if len(runs) == 0:
+    print("")
+    print("  No runs match %s." % (' '.join(sys.argv[1:])))
+    print("  Exiting the script/workflow.")
+    print("")
+    sys.exit(66)
+
+  # One run is plotted in this process; multiple runs, in parallel
+  time_start = time.time()
+  if len(runs) == 1:
+    results = [plot_run_timed(runs[0])]
+  else:
+    workers = min(plot_workers, len(runs))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=plot_worker_init) as executor:
+      results = []
+      for result in executor.map(plot_run_timed, runs):
+        results.append(result)
+        print("  %-40s %8.2f s  %s" % (result[0], result[1], result[2]))
+    cached = len([result for result in results if result[2] == 'cached'])
+    print("  %d runs (%d cached) in %.2f s (%d processes)" % (len(runs), cached, time.time() - time_start, workers))
+
+  failed = [result for result in results if result[3] is not None]
+  for location_timestamp, seconds, status, error in failed:
+    print("  %s failed: %s" % (location_timestamp, error))
+  if len(failed) > 0:
+    sys.exit(1)
@@ -0,0 +1,153 @@
+# HumidityTemperature_SensorData_Pyramid.py
+#
+# Python module to summarize the recorded data of a run (.dat file) at several
+# time resolutions (pyramid_levels: every minute, 15 minutes, hour, 6 hours
+# and day), so that many runs and locations spanning months can be compared on
+# one plot without reading millions of measurements. For every level, sensor
+# and interval, the number of measurements, sum, minimum and maximum (in
+# Celsius) are kept; the mean is their ratio.
+#
+# The pyramid of a run is stored next to its other outputs (e.g.,
+# LOCATION_TIMESTAMP_HumidityTemperature_SensorData_Pyramid.pkl) and built
+# incrementally: like the outputs of HumidityTemperature_SensorData_Ingest.py,
+# it has a checkpoint and only the lines appended to the .dat file since are
+# summarized and merged into the last intervals.
+#
+# pyramid_view() returns the summaries of any number of runs within a time
+# range, at the coarsest level that still has about plot_points intervals in
+# that range (i.e., that fills the view), within a factor of pyramid_factor.
+# A pyramid without one of the levels (e.g., built before it was added) is
+# built again.
+#
+# Usage:
+# from HumidityTemperature_SensorData_Pyramid import *
+#
+# pyramid     = update_pyramid('HoughtonMI_202305150543_HumidityTemperature_SensorData.dat')
+# level, view = pyramid_view(['HoughtonMI_202305150543'], start='2023-05-15', end='2023-05-16')
+
+# Necessary libraries
+import os
+import pandas as pd
+
+# Incremental reading of .dat files
+from HumidityTemperature_SensorData_Ingest import output_checkpoint, read_dat_since, write_checkpoint
+
+# Variables
+# pyramid_levels maps the name of a level to its interval in seconds (finest
+# first); the intervals are at most 15 times longer than those of the level
+# before. A level is coarse enough if it has at least plot_points /
+# pyramid_factor intervals in the view
+file_name       = 'HumidityTemperature_SensorData'
+pyramid_levels  = {
+                    'minute'    : 60,
+                    '15minutes' : 900,
+                    'hour'      : 3600,
+                    '6hours'    : 21600,
+                    'day'       : 86400,
+                  }
+pyramid_columns = ['Sensor_ID', 'Timestamp', 'Count', 'Sum', 'Min', 'Max']
+pyramid_factor  = 4
+plot_points     = 2000
+
+def file_name_pyramid(file_name_dat):
+  return os.path.splitext(file_name_dat)[0] + '_Pyramid.pkl'
+
+# Summaries of the measurements in a DataFrame (as from read_dat()) at one
+# level
+def summarize(df, seconds):
+  if len(df) == 0:
+    return pd.DataFrame(dict((column, []) for column in pyramid_columns))
+
+  interval = df['Timestamp'].dt.floor('%ds' % seconds)
+  summary  = df.groupby([df['Sensor_ID'].astype(str), interval])['Celsius'].agg(['count', 'sum', 'min', 'max'])
+  summary  = summary.reset_index()
+  summary.columns = pyramid_columns
+
+  return summary
+
+# Merge the summaries of newly appended measurements into those of the earlier
+# ones; only the intervals from the first new one onwards are combined
+def merge(summary_old, summary_new):
+  if len(summary_new) == 0:
+    return summary_old
+  if len(summary_old) == 0:
+    return summary_new
+
+  first    = summary_new['Timestamp'].min()
+  keep     = summary_old[summary_old['Timestamp'] < first]
+  combined = pd.concat([summary_old[summary_old['Timestamp'] >= first], summary_new])
+  combined = combined.groupby(['Sensor_ID', 'Timestamp']).agg({'Count': 'sum', 'Sum': 'sum', 'Min': 'min', 'Max': 'max'})
+
+  return pd.concat([keep, combined.reset_index()], ignore_index=True).sort_values(['Sensor_ID', 'Timestamp'], ignore_index=True)
+
+# Update the pyramid of a run with the lines appended to its .dat file since
+# the last update (or build it from scratch, if need be). Return a dict
+# mapping the name of every level to its summaries (a DataFrame with the
+# columns Sensor_ID, Timestamp (start of the interval), Count, Sum, Min and
+# Max)
+def update_pyramid(file_name_dat):
+  file_name_pkl = file_name_pyramid(file_name_dat)
+  df, rebuild, checkpoint = read_dat_since(file_name_dat, output_checkpoint(file_name_pkl))
+
+  pyramid = {}
+  if not rebuild:
+    pyramid = pd.read_pickle(file_name_pkl)
+    if set(pyramid) != set(pyramid_levels):
+      df, rebuild, checkpoint = read_dat_since(file_name_dat, None)
+      pyramid = {}
+
+  for level, seconds in pyramid_levels.items():
+    summary = summarize(df, seconds)
+    if level in pyramid:
+      summary = merge(pyramid[level], summary)
+    pyramid[level] = summary
+
+  pd.to_pickle(pyramid, file_name_pkl)
+  write_checkpoint(file_name_pkl + '.checkpoint', checkpoint)
+
+  return pyramid
+
+# Coarsest level with at least points / pyramid_factor intervals between start
+# and end (the finest level if none has), e.g., 15 minutes for a week and 6
+# hours for a year with 2000 points
+def pyramid_level(start, end, points=plot_points):
+  span   = (pd.Timestamp(end) - pd.Timestamp(start)).total_seconds()
+  levels = sorted(pyramid_levels.items(), key=lambda item: item[1], reverse=True)
+  for level, seconds in levels:
+    if span / seconds >= points / pyramid_factor:
+      return level
+
+  return levels[-1][0]
+
+# Summaries of the runs (LOCATION_TIMESTAMPs) between start and end (None for
+# the first/last measurement of all runs) at the level chosen by
+# pyramid_level(). Return the level and a dict mapping (LOCATION_TIMESTAMP,
+# Sensor ID) to a DataFrame with the columns Timestamp, Count, Mean, Min and
+# Max
+def pyramid_view(location_timestamps, start=None, end=None, points=plot_points):
+  pyramids = dict((location_timestamp, update_pyramid(str(location_timestamp) + '_' + file_name + '.dat'))
+                  for location_timestamp in location_timestamps)
+
+  # The coarsest level is enough to find the extent of the runs
+  coarsest = max(pyramid_levels, key=pyramid_levels.get)
+  extents  = [pyramid[coarsest]['Timestamp'] for pyramid in pyramids.values() if len(pyramid[coarsest]) > 0]
+  if len(extents) == 0:
+    return coarsest, {}
+  start = pd.Timestamp(start) if start is not None else min(extent.min() for extent in extents)
+  end   = pd.Timestamp(end) if end is not None else max(extent.max() for extent in extents) + pd.Timedelta(seconds=pyramid_levels[coarsest])
+
+  level = pyramid_level(start, end, points)
+  view  = {}
+  for location_timestamp, pyramid in pyramids.items():
+    summary = pyramid[level]
+    summary = summary[(summary['Timestamp'] >= start) & (summary['Timestamp'] < end)]
+    for sensor_id, series in summary.groupby('Sensor_ID'):
+      view[(location_timestamp, sensor_id)] = pd.DataFrame({
+                                                             'Timestamp' : series['Timestamp'].to_numpy(),
+                                                             'Count'     : series['Count'].to_numpy(),
+                                                             'Mean'      : (series['Sum'] / series['Count']).to_numpy(),
+                                                             'Min'       : series['Min'].to_numpy(),
+                                                             'Max'       : series['Max'].to_numpy(),
+                                                           })
+
+  return level, view
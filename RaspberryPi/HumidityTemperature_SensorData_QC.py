@@ -0,0 +1,252 @@
+# HumidityTemperature_SensorData_QC.py
+#
+# Python module to check the quality of the recorded data of a run (.dat
+# file), for every sensor, with vectorized (NumPy) passes over the whole run:
+#
+#   QC_RANGE    : Outside the range of the DS18B20 (-55 to 125 Celsius)
+#   QC_POWER_ON : 85 Celsius, the DS18B20's power-on value (read before a
+#                 conversion completed)
+#   QC_SPIKE    : Changed faster than qc_rate_max Celsius per minute since the
+#                 previous measurement (e.g., a jump that then decays slowly).
+#                 The return leg of a spike (as fast, in the opposite
+#                 direction, right after it) is not flagged: the measurement
+#                 after a one-sample spike is a good one
+#   QC_STUCK    : Same value for qc_stuck_samples or more consecutive
+#                 measurements
+#   QC_GAP      : More than qc_gap_factor times the typical (median) interval
+#                 since the previous measurement
+#
+# The result is a mask: one byte per measurement (in the order of the lines of
+# the .dat file), the sum of the flags above. It is saved next to the run's
+# outputs (e.g., LOCATION_TIMESTAMP_HumidityTemperature_SensorData_QC.npy), so
+# that the plots (apply_qc()) and the CSV/SQL outputs (drop_qc()) can annotate
+# or drop flagged measurements without checking the run again. The outputs
+# that drop them keep the version of the mask (qc_version()) in their
+# checkpoint, and are rebuilt when the run is checked again.
+#
+# Usage:
+# from HumidityTemperature_SensorData_QC import *
+#
+# mask = qc_mask(read_dat(file_name_dat))
+# df   = apply_qc(df, mask)
+#
+# python3 HumidityTemperature_SensorData_QC.py LOCATION_TIMESTAMP
+# python3 HumidityTemperature_SensorData_QC.py --check
+
+# Necessary libraries
+import numpy as np
+import os
+import pandas as pd
+import sys
+
+from HumidityTemperature_SensorData_Ingest import file_names, read_dat
+
+# Variables
+QC_RANGE         = 1
+QC_POWER_ON      = 2
+QC_SPIKE         = 4
+QC_STUCK         = 8
+QC_GAP           = 16
+qc_names         = {
+                     QC_RANGE    : 'Out of range',
+                     QC_POWER_ON : 'Power-on value (85 C)',
+                     QC_SPIKE    : 'Spike',
+                     QC_STUCK    : 'Stuck',
+                     QC_GAP      : 'Gap',
+                   }
+qc_range         = (-55.0, 125.0)
+qc_power_on      = 85.0
+qc_rate_max      = 10.0
+qc_stuck_samples = 30
+qc_gap_factor    = 3.0
+
+# Flags that make a measurement unusable (dropped by apply_qc() by default);
+# QC_STUCK and QC_GAP are annotations
+qc_drop = QC_RANGE | QC_POWER_ON | QC_SPIKE
+
+def file_name_qc(file_name_dat):
+  return os.path.splitext(file_name_dat)[0] + '_QC.npy'
+
+# Mask of a DataFrame (as from read_dat()), one value per row
+def qc_mask(df):
+  count = len(df)
+  mask  = np.zeros(count, dtype=np.uint8)
+  if count == 0:
+    return mask
+
+  celsius = df['Celsius'].to_numpy(dtype=np.float64)
+  epoch   = df['Timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+  sensor  = df['Sensor_ID'].astype('category').cat.codes.to_numpy()
+
+  mask[(celsius < qc_range[0]) | (celsius > qc_range[1]) | ~np.isfinite(celsius)] |= QC_RANGE
+  mask[celsius == qc_power_on] |= QC_POWER_ON
+
+  # The checks below compare every measurement to the previous one of the
+  # same sensor: sort by sensor, then time (stable, i.e., file order for ties)
+  order   = np.lexsort((epoch, sensor))
+  celsius = celsius[order]
+  epoch   = epoch[order]
+  first   = np.ones(count, dtype=bool)
+  first[1:] = sensor[order][1:] != sensor[order][:-1]
+
+  interval = np.diff(epoch, prepend=np.nan)
+  change   = np.diff(celsius, prepend=np.nan)
+  interval[first] = np.nan
+  change[first]   = np.nan
+
+  # Spikes: rate of change (per minute) from the previous measurement too
+  # fast. Out of range and power-on values are left out (they are not the
+  # neighbours of a spike)
+  flags   = np.zeros(count, dtype=np.uint8)
+  valid   = np.flatnonzero((mask[order] & (QC_RANGE | QC_POWER_ON)) == 0)
+  sensors = sensor[order][valid]
+  starts  = np.ones(len(valid), dtype=bool)
+  starts[1:] = sensors[1:] != sensors[:-1]
+  with np.errstate(divide='ignore', invalid='ignore'):
+    rate = np.diff(celsius[valid], prepend=np.nan) / (np.diff(epoch[valid], prepend=np.nan) / 60)
+  rate[starts] = np.nan
+  jump = np.abs(rate) > qc_rate_max
+
+  # A jump right after a jump in the opposite direction continues a run of
+  # jumps; every other jump of a run (the 2nd, 4th, ...) is a return leg
+  turn         = np.zeros(len(valid), dtype=bool)
+  turn[1:]     = jump[1:] & jump[:-1] & (np.sign(rate[1:]) != np.sign(rate[:-1]))
+  position     = np.arange(len(valid))
+  run_start    = np.maximum.accumulate(np.where(jump & ~turn, position, 0))
+  return_leg   = turn & ((position - run_start) % 2 == 1)
+  flags[valid[jump & ~return_leg]] = QC_SPIKE
+
+  # Stuck values: runs of equal consecutive values
+  run        = np.cumsum(first | (change != 0))
+  run_length = np.bincount(run)[run]
+  flags[run_length >= qc_stuck_samples] |= QC_STUCK
+
+  # Gaps, relative to the median interval of every sensor
+  typical = pd.Series(interval).groupby(np.cumsum(first)).transform('median').to_numpy()
+  flags[interval > qc_gap_factor * typical] |= QC_GAP
+
+  mask[order] |= flags
+
+  return mask
+
+# Number of measurements with every flag
+def qc_summary(mask):
+  return dict((name, int(((mask & flag) != 0).sum())) for flag, name in qc_names.items())
+
+# Save the mask of a run
+def write_qc(file_name_dat, mask):
+  file_name = file_name_qc(file_name_dat)
+  with open(file_name + '.tmp', 'wb') as file_handle:
+    np.save(file_handle, mask)
+  os.replace(file_name + '.tmp', file_name)
+
+# Mask of a run (None if it has not been checked)
+def read_qc(file_name_dat):
+  file_name = file_name_qc(file_name_dat)
+  if not os.path.exists(file_name):
+    return None
+  return np.load(file_name)
+
+# Version of the mask of a run (the modification time of its file; None if it
+# has not been checked)
+def qc_version(file_name_dat):
+  try:
+    return os.stat(file_name_qc(file_name_dat)).st_mtime_ns
+  except OSError:
+    return None
+
+# Which rows of a DataFrame (the lines of a .dat file from line first on, as
+# from read_dat()) are flagged with any of flags. The mask may be shorter than
+# the DataFrame (lines appended to the .dat file since it was checked); those
+# lines are kept
+def qc_flagged(df, mask, flags=qc_drop, first=0):
+  drop = np.zeros(len(df), dtype=bool)
+  if mask is not None:
+    part = mask[first:first + len(df)]
+    drop[:len(part)] = (part & flags) != 0
+
+  return drop
+
+# DataFrame (as from read_dat()) without the measurements flagged with any of
+# flags (Celsius and Fahrenheit set to NaN)
+def apply_qc(df, mask, flags=qc_drop, first=0):
+  drop = qc_flagged(df, mask, flags, first)
+
+  df = df.copy()
+  df.loc[drop, ['Celsius', 'Fahrenheit']] = np.nan
+
+  return df
+
+# DataFrame (as from read_dat()) without the rows flagged with any of flags
+def drop_qc(df, mask, flags=qc_drop, first=0):
+  return df[~qc_flagged(df, mask, flags, first)].reset_index(drop=True)
+
+# Check the checks above on known sequences (one measurement per minute of
+# one sensor); return the sequences whose mask differs from the expected one
+qc_cases = [
+             # One-sample spike: only the spike is flagged, not the (good)
+             # measurement after it
+             ([12.0, 12.1, 49.8, 12.2, 12.3], [0, 0, QC_SPIKE, 0, 0]),
+             # Jump that decays slowly (as in HoughtonMI_202305150543): the
+             # jump is flagged
+             ([12.0, 12.375, 49.812, 48.9, 48.1, 47.4], [0, 0, QC_SPIKE, 0, 0, 0]),
+             # Oscillation: every jump away is flagged, not the returns
+             ([12.0, 50.0, 12.1, 50.1, 12.2],  [0, QC_SPIKE, 0, QC_SPIKE, 0]),
+             # Power-on and out of range values are not the neighbours of a
+             # spike (12.1 is not one)
+             ([12.0, 85.0, 12.1, 200.0],      [0, QC_POWER_ON, 0, QC_RANGE]),
+           ]
+
+def qc_check(cases=qc_cases):
+  failures = []
+  for celsius, expected in cases:
+    df   = pd.DataFrame({
+                          'Timestamp'  : pd.date_range('2023-05-15 05:43', periods=len(celsius), freq='min'),
+                          'Sensor_ID'  : '28-000000000001',
+                          'Celsius'    : celsius,
+                          'Fahrenheit' : [value * 1.8 + 32 for value in celsius],
+                        })
+    mask = qc_mask(df)
+    if mask.tolist() != expected:
+      failures.append((celsius, expected, mask.tolist()))
+
+  return failures
+
+# Check a run from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) != 2:
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " LOCATION_TIMESTAMP")
+    print("   e.g.: python3 " + sys.argv[0] + " HoughtonMI_202305150543")
+    print("         python3 " + sys.argv[0] + " --check")
+    print("")
+    sys.exit()
+
+  # Check the checks
+  if sys.argv[1] == '--check':
+    failures = qc_check()
+    print("")
+    for celsius, expected, mask in failures:
+      print("  %s: expected %s, got %s" % (celsius, expected, mask))
+    print("  %d of %d sequence(s) passed" % (len(qc_cases) - len(failures), len(qc_cases)))
+    print("")
+    sys.exit(1 if failures else 0)
+
+  files = file_names(sys.argv[1])
+  if not os.path.exists(files['dat']) or os.path.getsize(files['dat']) == 0:
+    print("")
+    print("  %s does not exist or is empty." % files['dat'])
+    print("  Exiting the script/workflow.")
+    print("")
+    sys.exit(66)
+
+  mask = qc_mask(read_dat(files['dat']))
+  write_qc(files['dat'], mask)
+
+  print("")
+  print("  %-24s %10d" % ('Measurements', len(mask)))
+  for name, count in qc_summary(mask).items():
+    print("  %-24s %10d" % (name, count))
+  print("")
@@ -1,7 +1,8 @@
 # HumidityTemperature_SensorData_Record.py
 #
-# Python script to read from the DS18B20 temperature sensor in Raspberry Pi 3
-# Model B V1.2 (circa 2015). The measurements are saved in a meaningfully named
+# Python script to read from one or more DS18B20 temperature sensors in
+# Raspberry Pi 3 Model B V1.2 (circa 2015). All sensors are read concurrently,
+# once per measurement, and share the same timestamp. The measurements are saved in a meaningfully named
 # file (e.g., LOCATION_TIMESTAMP_HumidityTemperature_SensorData.dat) and
 # transferred to a designated remote server for archival and post-processing
 # purposes. 
@@ -9,9 +10,8 @@
 # TODO:
 # 1. Use sensor_id in the filename, if need be (when multiple sensors are
 #    used), and remove the sensor_id column from the recorded data
-# 2. Incorporate multiple DS18B20 Temperature Sensors
-# 3. Incorporate the SHTC3 Air Temperature and Humidity Sensor
-# 4. Find and incorporate a probe-able snowthermohygrometer that can 'send' its
+# 2. Incorporate the SHTC3 Air Temperature and Humidity Sensor
+# 3. Find and incorporate a probe-able snowthermohygrometer that can 'send' its
 #    data
 #
 # Usage:
@@ -22,14 +22,47 @@
 
 # Variables (edit if/when necessary)
 # sleep_timer represents the number of seconds between successive measurements
-# Raspberry Pi and the sensor take 2-3 additional seconds making the interval
-# between measurements approximately 1 minute
+# Measurements are taken on a fixed grid of the monotonic clock, so the time
+# spent by Raspberry Pi and the sensor(s) is subtracted from the pause and the
+# interval does not drift
+# sleep_policy decides what happens if a measurement is late by one or more
+# intervals: 'skip' drops the missed measurements, 'catchup' takes them
+# back-to-back
+# record_format is either 'dat' (text, one line per sensor per measurement) or
+# 'bin' (compact binary, see HumidityTemperature_SensorData_Binary.py, which
+# also converts it to the text format)
+# commit_records and commit_seconds represent how often (whichever comes first)
+# the measurements are written to the file, and commit_fsync whether they are
+# also forced onto the SD card. Frequent commits lose fewer measurements in case
+# of a power outage; infrequent ones wear the SD card less (see
+# HumidityTemperature_SensorData_Writer.py)
+# record_raw decides whether every measurement is recorded in the file above
+# record_tiers decides whether the 1-minute, 15-minute and 1-hour summaries
+# (count, mean, standard deviation, minimum, maximum and last value) of every
+# sensor are recorded in separate, much smaller, files (see
+# HumidityTemperature_SensorData_Aggregate.py)
+# live_port is the (localhost only) port at which the most recent live_samples
+# measurements of every sensor are served from memory; 0 disables it (see
+# HumidityTemperature_SensorData_Live.py)
+# upload_timer represents the number of seconds between successive transfers
+# of the newly recorded measurements to the remote server, in the background
+# while recording
 # remote_username and remote_server represent the credentials of the designated
 # remote server which will host the recorded data for archival and
 # post-processing purposes. The setup assumes that passwordless data transfer
 # is configured/enabled between the Raspberry Pi and remote server using the 
 # SSH keys
 sleep_timer     = 5
+sleep_policy    = 'skip'
+record_format   = 'dat'
+commit_records  = 5
+commit_seconds  = 300
+commit_fsync    = True
+record_raw      = True
+record_tiers    = True
+live_port       = 8018
+live_samples    = 1440
+upload_timer    = 300
 remote_username = "sgowtham"
 remote_server   = "sgowtham.com"
 remote_folder   = "/var/www/sgowtham/assets/RaspberryPi/"
@@ -55,6 +88,24 @@ import subprocess
 import sys
 import time
 
+# Detection and concurrent reading of DS18B20 sensors
+from HumidityTemperature_SensorData_Sensors import SensorPoller, detect_sensors
+
+# Drift-free scheduling of measurements
+from HumidityTemperature_SensorData_Scheduler import SampleScheduler
+
+# Group-commit writer with recovery of interrupted runs
+from HumidityTemperature_SensorData_Writer import DurableRecordWriter, find_unfinished_run
+
+# Downsampled summaries of the measurements
+from HumidityTemperature_SensorData_Aggregate import TierAggregator
+
+# Most recent measurements served from memory
+from HumidityTemperature_SensorData_Live import LiveReadings, LiveServer
+
+# Background transfer of the recorded measurements to the remote server
+from HumidityTemperature_SensorData_Uploader import ArchiveUploader, RsyncTransport
+
 # Argument check
 if len(sys.argv) != 3:
   print("")
@@ -72,10 +123,13 @@ if len(sys.argv) != 3:
 # location is used in creating a file to store the recordings
 # counter_max represents the number of measurements - taken approximately once
 # every minute
-# device_location is where external sensor data is stored in Raspeberry Pi
+# device_location is where external sensor data is stored in Raspeberry Pi. It
+# may be changed with the W1_DEVICE_LOCATION environment variable, e.g., to a
+# simulated 1-Wire bus (W1_DEVICE_LOCATION='sim:?sensors=300&latency=0.75'; see
+# HumidityTemperature_SensorData_Simulator.py) to run without the hardware
 location        = str(sys.argv[1])
 counter_max     = int(sys.argv[2])
-device_location = '/sys/bus/w1/devices/'
+device_location = os.environ.get('W1_DEVICE_LOCATION', '/sys/bus/w1/devices/')
 
 # Open a uniquely named file for saving the measurements for archival and
 # post-processing purposes
@@ -83,15 +137,31 @@ device_location = '/sys/bus/w1/devices/'
 # measurements. Since it takes at least one second to run this program (even in
 # case of errors), the timestamp used to uniquely identify the file_name for a
 # given LOCATION ignores the seconds
-file_date_time   = datetime.datetime.now()
-file_date_time   = file_date_time.strftime("%Y%m%d%H%M")
+# If the most recent run for the given LOCATION was interrupted (e.g., by a
+# power outage), then recording resumes in the same file
+file_date_time   = find_unfinished_run(location, record_format)
+if file_date_time is None:
+  file_date_time = datetime.datetime.now()
+  file_date_time = file_date_time.strftime("%Y%m%d%H%M")
 file_name_base   = str(location)  + '_' + str(file_date_time)
 file_name_base   = str(file_name_base) + '_HumidityTemperature_SensorData' 
 file_name_csv    = str(file_name_base) + '.csv' 
 file_name_dat    = str(file_name_base) + '.dat' 
 file_name_html   = str(file_name_base) + '.html' 
 file_name_pdf    = str(file_name_base) + '.pdf' 
-file_name_handle = open(file_name_dat, "w")
+file_name_bin    = str(file_name_base) + '.bin'
+
+# The file is opened once the sensors have been detected
+if record_format == 'bin':
+  file_name_record = file_name_bin
+else:
+  file_name_record = file_name_dat
+file_name_handle = None
+aggregator       = None
+
+# Transfers of file_name_record (and of earlier runs whose transfer failed) to
+# a designated remote server for archival and post-processing purposes
+uploader = ArchiveUploader(RsyncTransport(remote_details), upload_timer=upload_timer)
 
 # Function declarations
 
@@ -99,15 +169,14 @@ file_name_handle = open(file_name_dat, "w")
 # following naming format: 28-030497940a6a 
 # '28-' is common to all DS18B20 sensors (when multiple are wired in) and that
 # the '28-*' folder resides under '/sys/bus/w1/devices/' in Raspberry Pi.
-# If no sensor is detected, stop the workflow with a helpful error message
+# Every detected sensor is returned. If no sensor is detected, stop the
+# workflow with a helpful error message
 def detect_sensor():
-  ds18b20_sensors = glob.glob(device_location + '28*')
+  ds18b20_sensors = detect_sensors(device_location)
   if len(ds18b20_sensors) > 0:
-    for sensor in glob.glob(device_location + '28*'):
-      ds18b20 = sensor.split("/")[-1]
-      # Uncomment the line below for debugging purposes only
-      # print(ds18b20)
-    return ds18b20
+    # Uncomment the line below for debugging purposes only
+    # print(ds18b20_sensors)
+    return ds18b20_sensors
   else:
     print("")
     print("")
@@ -121,168 +190,205 @@ def detect_sensor():
     print("")
     sys.exit()
 
-# Read the temperature data from the sensor's 'w1_slave' file and convert it to
-# Celsius and Fahrenheit
-def read_temperature(ds18b20):
-
-  # DS18B20 stores temperature for each sensor in a file called 'w1_slave'
-  # Read the contents of this file and close
-  sensor_id            = str(ds18b20)
-  file_name_sensor     = '/sys/bus/w1/devices/' + str(sensor_id) + '/w1_slave'
-  file_handle_sensor   = open(file_name_sensor)
-  file_contents_sensor = file_handle_sensor.read()
-  file_handle_sensor.close()
-
-  # The releavant information is in the second line of 'w1_slave' file
-  # The 10th field in the second line when separated by space looks like
-  # t=#####. The ##### in t-##### is the temperature data we desire/need. The
-  # ##### is extracted from t-####, converted to a floating-point number for
-  # further processing
-  second_line      = file_contents_sensor.split("\n")[1]
-  temperature_data = second_line.split(" ")[9]
-  temperature      = float(temperature_data[2:])
-
-  # Convert the temperature above to Celsius, and then to Fahrenheit
-  celsius    = temperature / 1000
-  fahrenheit = (celsius * 1.80) + 32.00
-
-  # Return the values of celsius and fahrenheit
-  return celsius, fahrenheit
-
 # Keep looping through every sleep_timer seconds and process the data
-def read_record_rest_repeat(ds18b20):
+# Every sensor in sensor_ids is read exactly once per measurement, concurrently
+def read_record_rest_repeat(sensor_ids):
+
+  # Sensors' IDs
+  sensor_id = ', '.join(sensor_ids)
+  scheduler = SampleScheduler(sleep_timer, policy=sleep_policy)
 
-  # Sensor's ID
-  sensor_id = str(ds18b20)
+  # Header information (entered as comments)
+  header_lines = [
+                   "# Filename  : %s" % (file_name_dat),
+                   "# Sensor    : DS18B20 w/ Raspberry Pi 3 Model B V1.2 (circa 2015)",
+                   "# Sensor ID : %s" % sensor_id,
+                   "# Format    : Counter, Sensor ID, Time Stamp, Celsius, Fahrenheit",
+                   "#             Fields are separated by the | character",
+                   "#",
+                   "# Upon successful completion (of post-processing), the relevant files may be viewed at",
+                   "# %s/%s" % (remote_website, file_name_dat),
+                   "# %s/%s" % (remote_website, file_name_csv),
+                   "# %s/%s" % (remote_website, file_name_html),
+                   "# %s/%s" % (remote_website, file_name_pdf),
+                   "#",
+                   "# The same files are available at the following public GitHub repository under the",
+                   "# RaspberryPi folder",
+                   "# %s" % (github_repo),
+                 ]
 
   # Comment the print statements below to save some resoures, if need be
   print("")
-  print("# Filename  : %s" % (file_name_dat))
-  print("# Sensor    : DS18B20 w/ Raspberry Pi 3 Model B V1.2 (circa 2015)")
-  print("# Sensor ID : %s" % sensor_id)
-  print("# Format    : Counter, Sensor ID, Time Stamp, Celsius, Fahrenheit")
-  print("#             Fields are separated by the | character")
-  print("#")
-  print("# Upon successful completion (of post-processing), the relevant files may be viewed at")
-  print("# %s/%s" % (remote_website, file_name_dat))
-  print("# %s/%s" % (remote_website, file_name_csv))
-  print("# %s/%s" % (remote_website, file_name_html))
-  print("# %s/%s" % (remote_website, file_name_pdf))
-  print("#")
-  print("# The same files are available at the following public GitHub repository under the")
-  print("# RaspberryPi folder")
-  print("# %s" % (github_repo))
+  for header_line in header_lines:
+    print(header_line)
   print("")
   print("")
 
-  # Header information (entered as comments)
-  file_name_handle.write("#\n")
-  file_name_handle.write("# Filename  : %s\n" % (file_name_dat))
-  file_name_handle.write("# Sensor    : DS18B20 w/ Raspberry Pi 3 Model B V1.2 (circa 2015)\n")
-  file_name_handle.write("# Sensor ID : %s\n" % sensor_id)
-  file_name_handle.write("# Format    : Counter, Sensor ID, Time Stamp, Celsius, Fahrenheit\n")
-  file_name_handle.write("#             Fields are separated by the | character\n")
-  file_name_handle.write("#\n")
-  file_name_handle.write("# Upon successful completion (of post-processing), the relevant files may be viewed at\n")
-  file_name_handle.write("# %s/%s\n" % (remote_website, file_name_dat))
-  file_name_handle.write("# %s/%s\n" % (remote_website, file_name_csv))
-  file_name_handle.write("# %s/%s\n" % (remote_website, file_name_html))
-  file_name_handle.write("# %s/%s\n" % (remote_website, file_name_pdf))
-  file_name_handle.write("#\n")
-  file_name_handle.write("# The same files are available at the following public GitHub repository under the\n")
-  file_name_handle.write("# RaspberryPi folder\n")
-  file_name_handle.write("# %s\n" % (github_repo))
-  file_name_handle.write("#\n")
-
-  # Initiate the counter
+  # Open the file (header information is entered as comments) or recover it
+  # if the previous run was interrupted
+  global file_name_handle, aggregator
   counter = 0
-
-  # Run the loop indefinitely (or in other words, until counter_max number of 
-  # measurements have been recorded OR until CTRL+C is pressed)
-  while True:
-    if read_temperature(ds18b20) != None:
-      # Increment the counter
-      counter = counter + 1
-
-      # Set the current timestamp and temperature
-      date_time  = datetime.datetime.now()
-      date_time  = date_time.strftime("%Y-%m-%d %H:%M:%S")
-      celsius    = read_temperature(ds18b20)[0]
-      fahrenheit = read_temperature(ds18b20)[1]
-
-      # Comment the Terminal display to save some resoures, if need be
-      print("%04d|%s|%19s|%07.3f|%07.3f" % (counter, sensor_id, date_time, celsius, fahrenheit))
-
-      # Record the data in the file
-      file_name_handle.write("%04d|%s|%19s|%07.3f|%07.3f\n" % (counter, sensor_id, date_time, celsius, fahrenheit))
-
-      # Once every 5 measurements (i.e., approximately 5 minutes), save the
-      # data to the hard drive to prevent loss of recorded measurements in case
-      # of an accidental power outage (or other such scenario)
-      if counter % 5 == 0:
-        file_name_handle.flush()
-
-      # If counter_max measurements have been made, then stop the program
-      if counter == counter_max:
-
-        # Comment the print statements below to save some resoures, if need be
-        print("")
-        print("# %d measurements have been recorded" % (counter_max))
-        print("# Recording will stopp and the program will terminate after")
-        print("# trasnferring the file to a designated remote server for")
-        print("# archival and post-processing purposes")
+  if record_raw:
+    file_name_handle = DurableRecordWriter(
+                         file_name_record, record_format, sensor_ids, header_lines,
+                         commit_records = commit_records,
+                         commit_seconds = commit_seconds,
+                         fsync          = commit_fsync,
+                       )
+
+    # Initiate the counter (continues from where an interrupted run stopped)
+    counter = file_name_handle.counter
+    if file_name_handle.recovered:
+      print("# Resuming %s after measurement %d" % (file_name_record, counter))
+      print("")
+
+  # Summaries share the Sensor and Sensor ID header lines
+  if record_tiers:
+    aggregator = TierAggregator(file_name_base, header_lines[1:3])
+
+  # The sensor threads, the server and the files are closed however the
+  # recording stops (counter_max measurements, CTRL+C or an error)
+  poller = SensorPoller(sensor_ids, device_location)
+  server = None
+  try:
+    # Serve the most recent measurements from memory. The endpoints are
+    # optional: if the port is taken (e.g., by another recorder), record anyway
+    live = LiveReadings(sensor_ids, live_samples)
+    if live_port:
+      try:
+        server = LiveServer(live, port=live_port)
+      except OSError as e:
+        print("# WARNING: Unable to serve the live measurements at port %d (%s)" % (live_port, e))
+        print("# Recording without them")
         print("")
+        server = None
+
+    # Transfer the measurements to the remote server while recording
+    for file_name in recorded_files():
+      uploader.add(file_name)
+    uploader.start()
+
+    # Run the loop indefinitely (or in other words, until counter_max number of 
+    # measurements have been recorded OR until CTRL+C is pressed)
+    while True:
+      # Wait for the next measurement on the grid
+      scheduler.wait()
+
+      # Read every sensor once; all of them share the same timestamp
+      date_time, readings = poller.poll()
+      readings = [reading for reading in readings if reading[1] is not None]
+
+      if len(readings) > 0:
+        # Increment the counter
+        counter = counter + 1
+
+        # Record the data in the file. It is saved to the SD card as per the
+        # group-commit policy to limit the loss of recorded measurements in case
+        # of an accidental power outage (or other such scenario)
+        if file_name_handle is not None:
+          file_name_handle.write(date_time, counter, readings)
+
+        # Update the summaries and the most recent measurements
+        if aggregator is not None:
+          aggregator.add(date_time, readings)
+        live.add(date_time, readings)
+
+        # Set the current timestamp
+        date_time  = date_time.strftime("%Y-%m-%d %H:%M:%S")
+
+        # Comment the Terminal display to save some resoures, if need be
+        for sensor_id, celsius, fahrenheit in readings:
+          print("%04d|%s|%19s|%07.3f|%07.3f" % (counter, sensor_id, date_time, celsius, fahrenheit))
+
+        # If counter_max measurements have been made, then stop the program
+        if counter >= counter_max:
+
+          # Comment the print statements below to save some resoures, if need be
+          print("")
+          print("# %d measurements have been recorded" % (counter_max))
+          print("# Recording will stopp and the program will terminate after")
+          print("# trasnferring the file to a designated remote server for")
+          print("# archival and post-processing purposes")
+          print("")
+          print_schedule_summary(scheduler)
+          break
+  finally:
+    poller.close()
+    if server is not None:
+      server.close()
+    close_recorded_files()
+
+  # Archive the files to a designated remote server after updating their
+  # timestamp
+  archive_recorded_data(recorded_files(), file_date_time)
+
+  # Terminate the program
+  quit()
+
+# Display how late (in milliseconds) the measurements were with respect to the
+# fixed grid of sleep_timer seconds
+def print_schedule_summary(scheduler):
+  summary = scheduler.summary()
+  if summary['samples'] == 0:
+    return
+
+  print("# Scheduling lateness (ms) : mean %.1f, p50 %.1f, p99 %.1f, max %.1f" % (
+          summary['mean'] * 1000, summary['p50'] * 1000,
+          summary['p99'] * 1000, summary['max'] * 1000))
+  print("# Skipped measurements     : %d" % (summary['skipped']))
+  print("")
 
-        # Close the file
-        file_name_handle.close()
-
-        # Archive the file_name_dat to a designated remote server after updating
-        # its timestamp
-        archive_recorded_data(file_name_dat, file_date_time, remote_details)
+# Files with the recorded measurements and/or their summaries
+def recorded_files():
+  file_names = []
+  if record_raw:
+    file_names.append(file_name_record)
+  if aggregator is not None:
+    file_names.extend(aggregator.file_names)
 
-        # Terminate the program
-        quit()
+  return file_names
 
-      # Pause/Sleep for sleep_timer seconds
-      time.sleep(sleep_timer)
+# Close the files with the recorded measurements and/or their summaries
+def close_recorded_files():
+  if file_name_handle is not None:
+    file_name_handle.close()
+  if aggregator is not None:
+    aggregator.close()
 
-# Transfer the file (with recorded measurements) to the designated remote
+# Transfer the files (with recorded measurements) to the designated remote
 # server for archival and post-processing purposes
-def archive_recorded_data(file_name_dat, file_date_time, remote_details):
+def archive_recorded_data(file_names, file_date_time):
 
-  # Change the file_name_dat's timestamp to file_date_time
-  os.system('touch -t %s %s' % (file_date_time, file_name_dat))
+  for file_name in file_names:
+    # Change the file_name's timestamp to file_date_time
+    os.system('touch -t %s %s' % (file_date_time, file_name))
 
-  # Transfer the file_name_dat to a designated remote server for archival and
-  # post-processing purposes. The second and third rsync commands do not
-  # transfer anything unless the first (or second) rsync command transferred
-  # partial data for some reason (e.g., network issues, etc.)
-  # TODO: Make '-ae' to '-ave' to make the output non-verbose
-  os.system('rsync -ae ssh -hPz %s %s' % (file_name_dat, remote_details))
-  os.system('rsync -ae ssh -hPz %s %s' % (file_name_dat, remote_details))
-  os.system('rsync -ae ssh -hPz %s %s' % (file_name_dat, remote_details))
+    # Transfer the file_name in full (along with any earlier runs whose
+    # transfer failed)
+    uploader.finish(file_name)
 
-  # Sleep for 1 second
-  time.sleep(1)
+  # Stop the background transfers. The transfer is retried only if it fails
+  # (e.g., network issues, etc.)
+  uploader.stop()
 
 # Start the main program
 # Include handling when CTRL+C is pressed to terminate
 if __name__ == '__main__':
 
   try:
-    # Gather the sensor's ID
-    sensor_id = detect_sensor()
+    # Gather the sensors' IDs
+    sensor_ids = detect_sensor()
 
     # Run the loop to gather measurements
-    read_record_rest_repeat(sensor_id)
+    read_record_rest_repeat(sensor_ids)
 
   except KeyboardInterrupt:
-    # Close the file
-    file_name_handle.close()
+    # Close the files
+    close_recorded_files()
 
-    # Archive the file to a designated remote server after updating its
+    # Archive the files to a designated remote server after updating their
     # timestamp
-    archive_recorded_data(file_name_dat, file_date_time, remote_details)
+    archive_recorded_data(recorded_files(), file_date_time)
 
     # Terminate the program
     quit()
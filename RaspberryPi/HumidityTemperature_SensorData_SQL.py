@@ -0,0 +1,183 @@
+# HumidityTemperature_SensorData_SQL.py
+#
+# Python module to store the recorded data of every run (.dat files, from all
+# locations) in one SQLite database, and to query slices of it by time range,
+# location and/or sensor without globbing and parsing the individual files.
+#
+# The .dat files are ingested in bulk (batches of sql_batch lines inserted
+# with one prepared statement, in one transaction per file along with the
+# file's checkpoint) and incrementally: the byte offset of every file
+# ingested so far is stored in the database (see
+# HumidityTemperature_SensorData_Ingest.py), so ingesting a file again only
+# adds the lines appended since. Measurements are indexed on (location,
+# sensor_id, timestamp). Time stamps are stored as seconds since 1970-01-01
+# 00:00:00 of the (local) time recorded in the .dat file. The measurements
+# flagged by the quality check of a run (if it was checked; see
+# HumidityTemperature_SensorData_QC.py) are left out, and the run is ingested
+# again when it is checked again.
+#
+# Usage:
+# from HumidityTemperature_SensorData_SQL import *
+#
+# connection = connect('HumidityTemperature_SensorData.sqlite')
+# ingest_dat(connection, 'HoughtonMI_202305150543_HumidityTemperature_SensorData.dat')
+# data = query(connection, location='HoughtonMI', start='2023-05-15 06:00:00')
+#
+# python3 HumidityTemperature_SensorData_SQL.py DATABASE FILE_NAME_DAT [FILE_NAME_DAT ...]
+
+# Necessary libraries
+import json
+import numpy as np
+import os
+import pandas as pd
+import re
+import sqlite3
+import sys
+
+# Incremental reading of .dat files
+from HumidityTemperature_SensorData_Ingest import read_dat_since
+from HumidityTemperature_SensorData_QC import drop_qc, qc_version, read_qc
+
+# Variables
+sql_batch  = 50000
+run_name   = re.compile(r'^(.+)_(\d{12})_HumidityTemperature_SensorData\.dat$')
+sql_schema = """
+CREATE TABLE IF NOT EXISTS runs (
+  run_id        INTEGER PRIMARY KEY,
+  file_name     TEXT    NOT NULL UNIQUE,
+  location      TEXT    NOT NULL,
+  run_timestamp TEXT    NOT NULL,
+  checkpoint    TEXT
+);
+CREATE TABLE IF NOT EXISTS measurements (
+  run_id     INTEGER NOT NULL REFERENCES runs(run_id),
+  location   TEXT    NOT NULL,
+  sensor_id  TEXT    NOT NULL,
+  timestamp  INTEGER NOT NULL,
+  counter    INTEGER NOT NULL,
+  celsius    REAL    NOT NULL,
+  fahrenheit REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS measurements_location_sensor_timestamp
+  ON measurements (location, sensor_id, timestamp);
+CREATE INDEX IF NOT EXISTS measurements_run
+  ON measurements (run_id);
+"""
+
+# Open (and, if need be, create) the database
+def connect(file_name_sql):
+  connection = sqlite3.connect(file_name_sql)
+  connection.execute("PRAGMA journal_mode = WAL")
+  connection.execute("PRAGMA synchronous = NORMAL")
+  connection.executescript(sql_schema)
+
+  return connection
+
+# Seconds since 1970-01-01 00:00:00 of a time stamp (string, datetime or
+# pandas/NumPy datetime), as stored in the database
+def sql_timestamp(date_time):
+  return int(pd.Timestamp(date_time).value // 10**9)
+
+# Ingest the lines of a .dat file not yet in the database. The location and
+# the run's time stamp are taken from the file name
+# (LOCATION_TIMESTAMP_HumidityTemperature_SensorData.dat). Return the number of
+# lines ingested
+def ingest_dat(connection, file_name_dat):
+  match = run_name.match(os.path.basename(file_name_dat))
+  if match is None:
+    raise ValueError("%s is not named LOCATION_TIMESTAMP_HumidityTemperature_SensorData.dat" % file_name_dat)
+  location, run_timestamp = match.group(1), match.group(2)
+  file_name = os.path.basename(file_name_dat)
+
+  with connection:
+    connection.execute("INSERT OR IGNORE INTO runs (file_name, location, run_timestamp) VALUES (?, ?, ?)",
+                       (file_name, location, run_timestamp))
+  run_id, checkpoint = connection.execute("SELECT run_id, checkpoint FROM runs WHERE file_name = ?",
+                                          (file_name,)).fetchone()
+  checkpoint = json.loads(checkpoint) if checkpoint else None
+  version    = qc_version(file_name_dat)
+  if checkpoint is not None and checkpoint.get('qc') != version:
+    checkpoint = None
+
+  df, rebuild, checkpoint = read_dat_since(file_name_dat, checkpoint)
+  df = drop_qc(df, read_qc(file_name_dat), first=checkpoint['rows'] - len(df))
+  checkpoint['qc'] = version
+
+  # Columns to insert, converted in bulk
+  timestamp = (df['Timestamp'].astype('datetime64[s]').astype(np.int64)).tolist()
+  rows      = zip([run_id] * len(df), [location] * len(df), df['Sensor_ID'].astype(str).tolist(),
+                  timestamp, df['Counter'].tolist(), df['Celsius'].tolist(), df['Fahrenheit'].tolist())
+  statement = "INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+  with connection:
+    if rebuild:
+      connection.execute("DELETE FROM measurements WHERE run_id = ?", (run_id,))
+
+    batch = []
+    for row in rows:
+      batch.append(row)
+      if len(batch) == sql_batch:
+        connection.executemany(statement, batch)
+        batch = []
+    connection.executemany(statement, batch)
+
+    connection.execute("UPDATE runs SET checkpoint = ? WHERE run_id = ?",
+                       (json.dumps(checkpoint), run_id))
+
+  return len(df)
+
+# Measurements matching the location, sensor and time range (start inclusive,
+# end exclusive); None matches all. Return a dict of NumPy arrays: location,
+# sensor_id, timestamp (datetime64[s]), counter, celsius and fahrenheit,
+# ordered by time stamp
+def query(connection, location=None, sensor_id=None, start=None, end=None):
+  conditions = []
+  parameters = []
+  if location is not None:
+    conditions.append("location = ?")
+    parameters.append(location)
+  if sensor_id is not None:
+    conditions.append("sensor_id = ?")
+    parameters.append(sensor_id)
+  if start is not None:
+    conditions.append("timestamp >= ?")
+    parameters.append(sql_timestamp(start))
+  if end is not None:
+    conditions.append("timestamp < ?")
+    parameters.append(sql_timestamp(end))
+
+  statement = "SELECT location, sensor_id, timestamp, counter, celsius, fahrenheit FROM measurements"
+  if len(conditions) > 0:
+    statement = statement + " WHERE " + " AND ".join(conditions)
+  statement = statement + " ORDER BY timestamp"
+
+  rows = connection.execute(statement, parameters).fetchall()
+  if len(rows) == 0:
+    columns = [[], [], [], [], [], []]
+  else:
+    columns = list(zip(*rows))
+
+  return {
+           'location'   : np.array(columns[0], dtype=object),
+           'sensor_id'  : np.array(columns[1], dtype=object),
+           'timestamp'  : np.array(columns[2], dtype=np.int64).astype('datetime64[s]'),
+           'counter'    : np.array(columns[3], dtype=np.int64),
+           'celsius'    : np.array(columns[4], dtype=np.float64),
+           'fahrenheit' : np.array(columns[5], dtype=np.float64),
+         }
+
+# Ingest .dat files from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) < 3:
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " DATABASE FILE_NAME_DAT [FILE_NAME_DAT ...]")
+    print("   e.g.: python3 " + sys.argv[0] + " HumidityTemperature_SensorData.sqlite *_HumidityTemperature_SensorData.dat")
+    print("")
+    sys.exit()
+
+  connection = connect(sys.argv[1])
+  for file_name_dat in sys.argv[2:]:
+    print("  %-70s %8d lines" % (file_name_dat, ingest_dat(connection, file_name_dat)))
+  connection.close()
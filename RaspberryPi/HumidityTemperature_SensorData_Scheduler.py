@@ -0,0 +1,112 @@
+# HumidityTemperature_SensorData_Scheduler.py
+#
+# Python module to fire samples on a fixed grid of the monotonic clock, i.e.,
+# at start, start + interval, start + 2 * interval, and so on. The time spent
+# reading the sensors and writing the data is automatically subtracted from
+# the pause, so the interval between successive samples does not drift (unlike
+# a bare time.sleep(interval) after every sample). The monotonic clock is not
+# affected by NTP or manual changes to the wall clock.
+#
+# If a sample is late by one or more intervals (e.g., a loaded Raspberry Pi or
+# a slow SD card), the missed slots are handled as per the chosen policy
+#
+#   catchup : fire the missed slots back-to-back until the grid is caught up
+#   skip    : drop the missed slots and fire at the most recent slot
+#
+# The lateness of every sample (seconds between the slot and the time it
+# actually fired) is recorded for telemetry purposes: the number, mean and
+# maximum over the whole run, and the percentiles over the most recent
+# lateness_samples samples (so that memory use does not grow with the length
+# of the run, e.g., months of sub-second intervals).
+#
+# Usage:
+# from HumidityTemperature_SensorData_Scheduler import *
+#
+# scheduler = SampleScheduler(5, policy='skip')
+# while True:
+#   lateness = scheduler.wait()
+#   ...
+# print(scheduler.summary())
+
+# Necessary libraries
+# This module runs on a Raspberry Pi with minimal resources
+# So, import only what's absolutely necessary
+import collections
+import time
+
+# Missed slot policies
+policies = ('catchup', 'skip')
+
+# Number of recent samples kept for the percentiles of the lateness
+lateness_samples = 10000
+
+class SampleScheduler:
+
+  def __init__(self, interval, policy='skip', clock=time.monotonic, sleep=time.sleep):
+    if interval <= 0:
+      raise ValueError("interval must be positive: %r" % (interval,))
+    if policy not in policies:
+      raise ValueError("policy must be one of %s: %r" % (', '.join(policies), policy))
+
+    self.interval = float(interval)
+    self.policy   = policy
+    self.clock    = clock
+    self.sleep    = sleep
+    self.start    = None
+    self.slot     = 0
+    self.skipped  = 0
+
+    # Lateness (in seconds): running count, sum and maximum, and the most
+    # recent samples
+    self.lateness       = collections.deque(maxlen=lateness_samples)
+    self.lateness_count = 0
+    self.lateness_sum   = 0.0
+    self.lateness_max   = 0.0
+
+  # Block until the next slot on the grid and return the lateness (in
+  # seconds) of this sample. The first call fires immediately and anchors the
+  # grid
+  def wait(self):
+    if self.start is None:
+      self.start = self.clock()
+
+    target = self.start + self.slot * self.interval
+    now    = self.clock()
+
+    # Early: sleep until the slot (in a loop, since sleep may return early)
+    while now < target:
+      self.sleep(target - now)
+      now = self.clock()
+
+    # Late by one or more intervals: drop the missed slots, if so chosen
+    missed = int((now - target) // self.interval)
+    if missed > 0 and self.policy == 'skip':
+      self.skipped = self.skipped + missed
+      self.slot    = self.slot + missed
+      target       = self.start + self.slot * self.interval
+
+    lateness  = now - target
+    self.slot = self.slot + 1
+    self.lateness.append(lateness)
+    self.lateness_count = self.lateness_count + 1
+    self.lateness_sum   = self.lateness_sum + lateness
+    self.lateness_max   = max(self.lateness_max, lateness)
+
+    return lateness
+
+  # Summary of the scheduling lateness (in seconds); p50 and p99 are of the
+  # most recent lateness_samples samples
+  def summary(self):
+    if self.lateness_count == 0:
+      return {'samples': 0, 'skipped': self.skipped}
+
+    ordered = sorted(self.lateness)
+    count   = len(ordered)
+    return {
+             'samples' : self.lateness_count,
+             'skipped' : self.skipped,
+             'mean'    : self.lateness_sum / self.lateness_count,
+             'p50'     : ordered[int(0.50 * (count - 1))],
+             'p99'     : ordered[int(0.99 * (count - 1))],
+             'max'     : self.lateness_max,
+           }
@@ -0,0 +1,137 @@
+# HumidityTemperature_SensorData_Sensors.py
+#
+# Python module to detect and read one or more DS18B20 temperature sensors
+# wired to the 1-Wire bus of a Raspberry Pi. Every sensor's 'w1_slave' file is
+# read exactly once per sample (tick), and all sensors are read concurrently
+# using a pool of threads. Reading a 'w1_slave' file triggers a temperature
+# conversion that takes approximately 750 ms, and the thread spends nearly all
+# of that time waiting on the kernel. So, one tick with N sensors takes about
+# as long as a single conversion instead of N of them.
+#
+# device_location may also be a simulated 1-Wire bus (a sim: URL, see
+# HumidityTemperature_SensorData_Simulator.py), to run without the hardware.
+#
+# Usage:
+# from HumidityTemperature_SensorData_Sensors import *
+#
+# sensor_ids = detect_sensors('/sys/bus/w1/devices/')
+# poller     = SensorPoller(sensor_ids, '/sys/bus/w1/devices/')
+# date_time, readings = poller.poll()
+# poller.close()
+
+# Necessary libraries
+# This module runs on a Raspberry Pi with minimal resources
+# So, import only what's absolutely necessary
+import concurrent.futures
+import datetime
+import glob
+import os
+
+# Variables (edit if/when necessary)
+# device_location is where external sensor data is stored in Raspberry Pi
+# sensor_prefix is common to all DS18B20 sensors
+# simulator_scheme starts the device_location of a simulated 1-Wire bus
+device_location  = '/sys/bus/w1/devices/'
+sensor_prefix    = '28-'
+simulator_scheme = 'sim:'
+
+# Simulated 1-Wire bus for a sim: device_location (imported only if used)
+def simulated_bus(device_location):
+  from HumidityTemperature_SensorData_Simulator import simulated_bus
+  return simulated_bus(device_location)
+
+# Files related to any given DS18B20 sensor reside in a folder that has the
+# following naming format: 28-030497940a6a
+# '28-' is common to all DS18B20 sensors (when multiple are wired in) and the
+# '28-*' folders reside under device_location. Return every sensor's ID,
+# sorted so that the order (and hence the sensor index) is stable across runs.
+# An empty list is returned if no sensor is detected
+def detect_sensors(device_location=device_location):
+  if device_location.startswith(simulator_scheme):
+    return sorted(simulated_bus(device_location).sensor_ids)
+
+  ds18b20_sensors = glob.glob(os.path.join(device_location, sensor_prefix + '*'))
+  sensor_ids      = [os.path.basename(sensor) for sensor in ds18b20_sensors]
+
+  return sorted(sensor_ids)
+
+# Parse the contents of a sensor's 'w1_slave' file. It looks like
+#
+#   72 01 4b 46 7f ff 0e 10 57 : crc=57 YES
+#   72 01 4b 46 7f ff 0e 10 57 t=23125
+#
+# The first line ends with YES if the CRC check passed (NO otherwise). The
+# ##### in t=##### in the second line is the temperature in 1/1000 of Celsius.
+# Return None if the CRC check failed or the contents are incomplete
+def parse_w1_slave(file_contents_sensor):
+  lines = file_contents_sensor.split("\n")
+  if len(lines) < 2 or not lines[0].strip().endswith("YES"):
+    return None
+
+  position = lines[1].find("t=")
+  if position == -1:
+    return None
+
+  # Convert the temperature above to Celsius, and then to Fahrenheit
+  celsius    = float(lines[1][position + 2:]) / 1000
+  fahrenheit = (celsius * 1.80) + 32.00
+
+  return celsius, fahrenheit
+
+# Read the temperature data from the sensor's 'w1_slave' file (exactly once)
+# and convert it to Celsius and Fahrenheit. Return None if the sensor could not
+# be read (e.g., it was unplugged or the CRC check failed)
+def read_temperature(sensor_id, device_location=device_location):
+  try:
+    if device_location.startswith(simulator_scheme):
+      file_contents_sensor = simulated_bus(device_location).w1_slave(str(sensor_id))
+    else:
+      file_name_sensor = os.path.join(device_location, str(sensor_id), 'w1_slave')
+      with open(file_name_sensor) as file_handle_sensor:
+        file_contents_sensor = file_handle_sensor.read()
+  except OSError:
+    return None
+
+  return parse_w1_slave(file_contents_sensor)
+
+# Read every sensor concurrently, once per call to poll(). The thread pool is
+# created once and reused for every tick so that the threads are not started
+# and stopped once per sample
+class SensorPoller:
+
+  def __init__(self, sensor_ids, device_location=device_location, max_workers=None):
+    self.sensor_ids      = list(sensor_ids)
+    self.device_location = device_location
+    self.max_workers     = max_workers or max(len(self.sensor_ids), 1)
+    self.executor        = concurrent.futures.ThreadPoolExecutor(
+                             max_workers        = self.max_workers,
+                             thread_name_prefix = 'ds18b20',
+                           )
+
+  # Take one sample from every sensor. All sensors share the same timestamp,
+  # taken at the start of the tick. readings is a list of
+  # (sensor_id, celsius, fahrenheit) tuples in the same order as sensor_ids;
+  # celsius and fahrenheit are None for sensors that could not be read
+  def poll(self):
+    date_time = datetime.datetime.now()
+    futures   = [self.executor.submit(read_temperature, sensor_id, self.device_location)
+                 for sensor_id in self.sensor_ids]
+
+    readings = []
+    for sensor_id, future in zip(self.sensor_ids, futures):
+      temperature = future.result()
+      if temperature is None:
+        readings.append((sensor_id, None, None))
+      else:
+        readings.append((sensor_id, temperature[0], temperature[1]))
+
+    return date_time, readings
+
+  def close(self):
+    self.executor.shutdown(wait=True)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
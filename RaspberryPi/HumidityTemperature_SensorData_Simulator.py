@@ -0,0 +1,148 @@
+# HumidityTemperature_SensorData_Simulator.py
+#
+# Python module to simulate the 1-Wire bus of a Raspberry Pi with any number
+# of DS18B20 temperature sensors, so that the recorder can be exercised (and
+# its throughput measured) without the hardware. Every virtual sensor
+# (28-000000000001, 28-000000000002, ...) answers reads of its 'w1_slave' file
+# with exactly the text the kernel driver would produce, after a configurable
+# conversion latency (about 750 ms for a real DS18B20), and fails the CRC check
+# (NO at the end of the first line) with a configurable probability.
+#
+# The simulated bus is used in place of /sys/bus/w1/devices/ by setting the
+# device location to a sim: URL with the following (optional) parameters
+#
+#   sensors     : Number of sensors (default: 4)
+#   latency     : Conversion latency, in seconds (default: 0.75)
+#   jitter      : Random variation of the latency, in seconds (default: 0)
+#   crc_failure : Probability of a failed CRC check (default: 0)
+#   power_on    : Probability of the 85 Celsius power-on value (default: 0)
+#   pattern     : Values over time: constant, sine (a daily cycle), walk
+#                 (random walk), step or spike (default: sine)
+#   seed        : Seed of the random numbers (default: random)
+#
+# e.g., sim:?sensors=300&latency=0.75&crc_failure=0.01&pattern=walk
+#
+# Usage:
+# from HumidityTemperature_SensorData_Simulator import *
+#
+# bus = simulated_bus('sim:?sensors=300&latency=0.75')
+# bus.sensor_ids
+# bus.w1_slave('28-000000000001')
+
+# Necessary libraries
+# This module runs on a Raspberry Pi with minimal resources
+# So, import only what's absolutely necessary
+import math
+import random
+import threading
+import time
+import urllib.parse
+
+# Variables
+simulator_scheme = 'sim:'
+patterns         = ('constant', 'sine', 'walk', 'step', 'spike')
+
+# Virtual DS18B20 sensors on a simulated 1-Wire bus
+class SimulatedBus:
+
+  def __init__(self, sensors=4, latency=0.75, jitter=0.0, crc_failure=0.0, power_on=0.0, pattern='sine', seed=None):
+    if pattern not in patterns:
+      raise ValueError("pattern must be one of %s: %r" % (', '.join(patterns), pattern))
+
+    self.sensor_ids  = ['28-%012x' % (index + 1) for index in range(sensors)]
+    self.latency     = latency
+    self.jitter      = jitter
+    self.crc_failure = crc_failure
+    self.power_on    = power_on
+    self.pattern     = pattern
+    self.random      = random.Random(seed)
+    self.lock        = threading.Lock()
+    self.start       = time.time()
+
+    # Every sensor has its own offset (and random walk)
+    self.offsets     = dict((sensor_id, self.random.uniform(-5.0, 5.0)) for sensor_id in self.sensor_ids)
+    self.walks       = dict((sensor_id, 0.0) for sensor_id in self.sensor_ids)
+
+  # Temperature (Celsius) of a sensor now, following the pattern
+  def temperature(self, sensor_id):
+    elapsed = time.time() - self.start
+    base    = self.offsets[sensor_id]
+
+    if self.pattern == 'constant':
+      return base
+    if self.pattern == 'sine':
+      return base + 8.0 * math.sin(2 * math.pi * elapsed / 86400)
+    if self.pattern == 'walk':
+      with self.lock:
+        self.walks[sensor_id] = self.walks[sensor_id] + self.random.gauss(0.0, 0.1)
+        return base + self.walks[sensor_id]
+    if self.pattern == 'step':
+      return base + (10.0 if int(elapsed // 60) % 2 else 0.0)
+
+    # spike: a 40 Celsius spike about once every 100 reads
+    with self.lock:
+      spike = self.random.random() < 0.01
+    return base + (40.0 if spike else 0.0)
+
+  # Contents of the sensor's 'w1_slave' file, e.g.,
+  #
+  #   72 01 4b 46 7f ff 0e 10 57 : crc=57 YES
+  #   72 01 4b 46 7f ff 0e 10 57 t=23125
+  #
+  # after the conversion latency. The temperature has the DS18B20's resolution
+  # (1/16 Celsius). Raise OSError for an unknown sensor (as if unplugged)
+  def w1_slave(self, sensor_id):
+    if sensor_id not in self.offsets:
+      raise OSError("No such sensor: %s" % sensor_id)
+
+    with self.lock:
+      latency     = max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0.0)
+      crc_failure = self.random.random() < self.crc_failure
+      power_on    = self.random.random() < self.power_on
+    if latency > 0:
+      time.sleep(latency)
+
+    celsius = 85.0 if power_on else self.temperature(sensor_id)
+    raw     = int(round(celsius * 16)) & 0xffff
+    data    = [raw & 0xff, raw >> 8, 0x4b, 0x46, 0x7f, 0xff, 0x0e, 0x10]
+    crc     = crc8(data)
+    if crc_failure:
+      crc = (crc + 1) & 0xff
+    scratch = ' '.join('%02x' % byte for byte in data + [crc8(data)])
+    signed  = raw - 0x10000 if raw & 0x8000 else raw
+
+    return "%s : crc=%02x %s\n%s t=%d\n" % (scratch, crc, 'NO' if crc_failure else 'YES', scratch, int(signed * 1000 / 16))
+
+# Dallas/Maxim CRC-8 (as checked by the kernel driver)
+def crc8(data):
+  crc = 0
+  for byte in data:
+    for bit in range(8):
+      mix  = (crc ^ byte) & 0x01
+      crc  = crc >> 1
+      byte = byte >> 1
+      if mix:
+        crc = crc ^ 0x8c
+
+  return crc
+
+# Simulated buses, one per sim: URL (shared by all threads)
+simulated_buses = {}
+simulated_lock  = threading.Lock()
+
+def simulated_bus(device_location):
+  with simulated_lock:
+    if device_location not in simulated_buses:
+      query = dict((key, values[-1]) for key, values in
+                   urllib.parse.parse_qs(urllib.parse.urlsplit(device_location).query).items())
+      simulated_buses[device_location] = SimulatedBus(
+                                           sensors     = int(query.get('sensors', 4)),
+                                           latency     = float(query.get('latency', 0.75)),
+                                           jitter      = float(query.get('jitter', 0.0)),
+                                           crc_failure = float(query.get('crc_failure', 0.0)),
+                                           power_on    = float(query.get('power_on', 0.0)),
+                                           pattern     = query.get('pattern', 'sine'),
+                                           seed        = int(query['seed']) if 'seed' in query else None,
+                                         )
+
+    return simulated_buses[device_location]
@@ -0,0 +1,214 @@
+# HumidityTemperature_SensorData_Uploader.py
+#
+# Python module to transfer the recorded measurements to a designated remote
+# server in the background, while the recording is still in progress. Every
+# upload_timer seconds, the bytes appended to the file(s) since the previous
+# transfer are sent (the files are append-only). Once a run finishes, its file
+# is sent in full one last time to guarantee that the remote copy is
+# identical. Finished runs whose transfer failed (e.g., the network was down)
+# are remembered in a small state file and batched with the next transfer,
+# even across restarts. A transfer is retried, with exponentially increasing
+# pauses, only if it fails.
+#
+# All transfers happen in a separate thread, so that the recording loop is
+# never stalled by a slow or unavailable network.
+#
+# Two transports are available
+#
+#   RsyncTransport : rsync over SSH (or any other remote shell command, e.g., a
+#                    local stand-in that runs the remote side on the same
+#                    computer) to a destination like user@server:/folder/
+#   LocalTransport : copies to a local (or mounted) folder; useful for
+#                    testing and for USB drives or network file systems
+#
+# Usage:
+# from HumidityTemperature_SensorData_Uploader import *
+#
+# uploader = ArchiveUploader(RsyncTransport('user@server:/folder/'), upload_timer=300)
+# uploader.add(file_name)
+# uploader.start()
+# ...
+# uploader.finish(file_name)
+# uploader.stop()
+
+# Necessary libraries
+# This module runs on a Raspberry Pi with minimal resources
+# So, import only what's absolutely necessary
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+# Variables
+upload_state = 'HumidityTemperature_SensorData_Upload.json'
+
+# Send files with rsync. batch is a list of (file_name, offset, finished)
+# tuples. Files that are still growing are sent with --append-verify, i.e.,
+# only the bytes beyond the size of the remote copy are transferred. Finished
+# files are sent in full (rsync still only transfers the differences) so that
+# a file truncated while recovering from a power outage is also correct
+# remotely. All files of a kind are sent in one rsync command. Return True if
+# every transfer succeeded
+class RsyncTransport:
+
+  def __init__(self, destination, rsh='ssh', rsync='rsync'):
+    self.destination = destination
+    self.rsh         = rsh
+    self.rsync       = rsync
+
+  def run(self, options, file_names):
+    if len(file_names) == 0:
+      return True
+
+    command = [self.rsync, '-az', '--partial'] + options + ['-e', self.rsh] + file_names + [self.destination]
+    try:
+      return subprocess.run(command, stdout=subprocess.DEVNULL).returncode == 0
+    except OSError:
+      return False
+
+  def send(self, batch):
+    growing  = [file_name for file_name, offset, finished in batch if not finished]
+    finished = [file_name for file_name, offset, finished in batch if finished]
+
+    return self.run(['--append-verify'], growing) and self.run([], finished)
+
+# Copy files to a local (or mounted) folder. Only the bytes beyond offset are
+# appended to the copy, unless the copy does not match the offset (e.g., it is
+# missing), in which case the file is copied in full. Return True if every
+# copy succeeded
+class LocalTransport:
+
+  def __init__(self, destination):
+    self.destination = destination
+
+  def send(self, batch):
+    try:
+      os.makedirs(self.destination, exist_ok=True)
+      for file_name, offset, finished in batch:
+        file_name_copy = os.path.join(self.destination, os.path.basename(file_name))
+        size_copy      = os.path.getsize(file_name_copy) if os.path.exists(file_name_copy) else -1
+
+        if finished or offset < 0 or size_copy != offset:
+          shutil.copy2(file_name, file_name_copy)
+          continue
+
+        with open(file_name, 'rb') as file_handle, open(file_name_copy, 'ab') as file_handle_copy:
+          file_handle.seek(offset)
+          shutil.copyfileobj(file_handle, file_handle_copy)
+    except OSError:
+      return False
+
+    return True
+
+# Transfer the tracked files in a background thread
+class ArchiveUploader:
+
+  def __init__(self, transport, upload_timer=300, state_file=upload_state,
+               backoff_initial=5, backoff_max=600, final_attempts=3):
+    self.transport       = transport
+    self.upload_timer    = upload_timer
+    self.state_file      = state_file
+    self.backoff_initial = backoff_initial
+    self.backoff_max     = backoff_max
+    self.final_attempts  = final_attempts
+    self.lock            = threading.Lock()
+    self.stopping        = threading.Event()
+    self.thread          = None
+
+    # file_name: {'offset': bytes sent, 'finished': bool, 'done': bool}
+    self.files = self.load_state()
+
+  def load_state(self):
+    try:
+      with open(self.state_file) as file_handle:
+        return json.load(file_handle)
+    except (OSError, ValueError):
+      return {}
+
+  def save_state(self):
+    state_file_tmp = self.state_file + '.tmp'
+    with open(state_file_tmp, 'w') as file_handle:
+      json.dump(self.files, file_handle)
+    os.replace(state_file_tmp, self.state_file)
+
+  # Start tracking a (growing) file
+  def add(self, file_name):
+    with self.lock:
+      if file_name not in self.files:
+        self.files[file_name] = {'offset': 0, 'finished': False, 'done': False}
+        self.save_state()
+
+  # Mark a file as finished; it is sent in full with the next transfer (or,
+  # if that fails, with a transfer by a later run)
+  def finish(self, file_name):
+    self.add(file_name)
+    with self.lock:
+      self.files[file_name]['finished'] = True
+      self.save_state()
+
+  # Transfer, in one batch, whatever is pending. Return True if there was
+  # nothing to send or the transfer succeeded
+  def sync(self):
+    with self.lock:
+      batch = []
+      for file_name, entry in self.files.items():
+        if entry['done'] or not os.path.exists(file_name):
+          continue
+        size = os.path.getsize(file_name)
+        if entry['finished'] or size != entry['offset']:
+          # A file that shrunk (recovered after a power outage) is sent in full
+          offset = entry['offset'] if size >= entry['offset'] else -1
+          batch.append((file_name, offset, entry['finished'], size))
+
+    if len(batch) == 0:
+      return True
+
+    if not self.transport.send([(file_name, offset, finished) for file_name, offset, finished, size in batch]):
+      return False
+
+    with self.lock:
+      for file_name, offset, finished, size in batch:
+        self.files[file_name]['offset'] = size
+        self.files[file_name]['done']   = finished
+
+      # Forget the files that are no longer needed
+      self.files = dict((file_name, entry) for file_name, entry in self.files.items() if not entry['done'])
+      self.save_state()
+
+    return True
+
+  # Transfer every upload_timer seconds; pause longer (up to backoff_max
+  # seconds) after every failed transfer
+  def run(self):
+    delay    = self.upload_timer
+    failures = 0
+    while not self.stopping.wait(delay):
+      if self.sync():
+        delay    = self.upload_timer
+        failures = 0
+      else:
+        delay    = min(self.backoff_initial * 2 ** failures, self.backoff_max)
+        failures = failures + 1
+
+    # Final transfer when stopping
+    delay = self.backoff_initial
+    for attempt in range(self.final_attempts):
+      if self.sync():
+        break
+      if attempt < self.final_attempts - 1:
+        time.sleep(delay)
+        delay = min(delay * 2, self.backoff_max)
+
+  def start(self):
+    self.thread = threading.Thread(target=self.run, name='uploader', daemon=True)
+    self.thread.start()
+
+  # Stop the background thread after a final transfer of everything pending
+  def stop(self):
+    self.stopping.set()
+    if self.thread is not None:
+      self.thread.join()
+    else:
+      self.run()
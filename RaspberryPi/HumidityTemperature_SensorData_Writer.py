@@ -0,0 +1,238 @@
+# HumidityTemperature_SensorData_Writer.py
+#
+# Python module to durably record the measurements in the text (.dat) or the
+# binary (.bin) format, with a configurable group-commit policy. Measurements
+# are buffered and committed (written, flushed and, optionally, fsync-ed to
+# the SD card) together every commit_records measurements or commit_seconds
+# seconds, whichever comes first. Fewer commits mean less wear on the SD card
+# and less time spent writing; more commits mean fewer measurements lost in
+# case of a power outage.
+#
+# After every commit, a small marker file (FILE_NAME.wal) records the size of
+# the file and the counter up to which the measurements are known to be
+# complete. The marker is removed when recording finishes normally. If it
+# exists when recording starts, the previous run was interrupted: the run's
+# file is recovered by checking only the part written after the last commit,
+# truncating any partially written (torn) measurement at the end, and
+# recording resumes in the same file with the counter continuing from where
+# it stopped. Otherwise, an existing file (e.g., of a run that finished within
+# the same minute) is overwritten.
+#
+# Usage:
+# from HumidityTemperature_SensorData_Writer import *
+#
+# writer = DurableRecordWriter(file_name, 'dat', sensor_ids, header_lines)
+# writer.write(date_time, writer.counter + 1, readings)
+# writer.close()
+
+# Necessary libraries
+# This module runs on a Raspberry Pi with minimal resources
+# So, import only what's absolutely necessary
+import glob
+import json
+import math
+import os
+import re
+import time
+
+# Binary record format
+from HumidityTemperature_SensorData_Binary import BinaryRecords, binary_counter_next, binary_header, read_binary_header
+
+# Variables
+marker_suffix = '.wal'
+dat_line      = re.compile(rb'^\d+\|[^|]+\|\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\|-?[\d.]+\|-?[\d.]+\n$')
+run_name      = re.compile(r'_(\d{12})_HumidityTemperature_SensorData\.(dat|bin)' + re.escape(marker_suffix) + '$')
+
+# Return the timestamp (YYYYMMDDHHMM) of the most recent unfinished run, i.e.,
+# one whose marker file still exists, for a given location and record format.
+# Return None if there is no such run
+def find_unfinished_run(location, record_format, folder='.'):
+  pattern = os.path.join(folder, str(location) + '_*_HumidityTemperature_SensorData.' + record_format + marker_suffix)
+  runs    = []
+  for marker in glob.glob(pattern):
+    match = run_name.search(marker)
+    if match is not None and match.group(2) == record_format:
+      runs.append(match.group(1))
+
+  if len(runs) == 0:
+    return None
+
+  return sorted(runs)[-1]
+
+# Read the marker file. Return None if it does not exist or is unreadable
+def read_marker(file_name_marker):
+  try:
+    with open(file_name_marker) as file_handle:
+      return json.load(file_handle)
+  except (OSError, ValueError):
+    return None
+
+# Check the complete lines in data (bytes following offset in a .dat file) and
+# return the length of the valid part and the counter of its last line
+def recover_dat(data, counter):
+  valid = 0
+  for line in data.splitlines(keepends=True):
+    if line.startswith(b'#'):
+      valid = valid + len(line)
+      continue
+    if not dat_line.match(line):
+      break
+    valid   = valid + len(line)
+    counter = int(line.split(b'|', 1)[0])
+
+  return valid, counter
+
+# Check the complete records in data (bytes following offset in a .bin file)
+# and return the length of the valid part and the counter of its last record.
+# Blocks zero-filled by the file system after a power outage (or any other
+# garbage) are not valid records: the time stamp must lie between the epoch and
+# a day from now, and the sensor index must exist in the header. The counter
+# is restored from the stored one (or, for records without a counter,
+# increments whenever the time stamp changes)
+def recover_bin(data, counter, epoch_previous, sensors, records):
+  valid = 0
+  epoch_max = time.time() + 86400
+  for record in range(len(data) // records.size):
+    epoch, counter_stored, sensor, celsius = records.unpack_from(data, record * records.size)
+    if not (0 < epoch < epoch_max) or sensor >= sensors or not math.isfinite(celsius):
+      break
+    counter        = binary_counter_next(counter, epoch_previous, epoch, counter_stored)
+    epoch_previous = epoch
+    valid          = valid + records.size
+
+  return valid, counter
+
+# Append measurements to a file with group commits, recovering the file first
+# if a previous run was interrupted
+class DurableRecordWriter:
+
+  def __init__(self, file_name, record_format, sensor_ids, header_lines=(),
+               commit_records=5, commit_seconds=300, fsync=True):
+    if record_format not in ('dat', 'bin'):
+      raise ValueError("record_format must be dat or bin: %r" % (record_format,))
+
+    self.file_name        = file_name
+    self.file_name_marker = file_name + marker_suffix
+    self.record_format    = record_format
+    self.commit_records   = commit_records
+    self.commit_seconds   = commit_seconds
+    self.fsync            = fsync
+    self.counter          = 0
+    self.recovered        = False
+
+    # Only an interrupted run (its marker still exists) is resumed; the file
+    # of a finished run is overwritten, as by a new run
+    if (os.path.exists(self.file_name_marker) and os.path.exists(self.file_name) and
+        os.path.getsize(self.file_name) > 0):
+      self.recover()
+    else:
+      with open(self.file_name, 'wb') as file_handle:
+        if record_format == 'bin':
+          file_handle.write(binary_header(sensor_ids, header_lines))
+        else:
+          file_handle.write(("#\n" + "".join("%s\n" % line for line in header_lines) + "#\n").encode('utf-8'))
+
+    if record_format == 'bin':
+      with open(self.file_name, 'rb') as file_handle:
+        header, header_length = read_binary_header(file_handle)
+      self.sensor_index = dict((sensor_id, index) for index, sensor_id in enumerate(header['sensor_ids']))
+      self.records      = BinaryRecords(header)
+
+    self.file_handle          = open(self.file_name, 'ab')
+    self.pending              = []
+    self.pending_measurements = 0
+    self.last_commit          = time.monotonic()
+    self.commit()
+
+  # Truncate any partially written measurement at the end of the file and
+  # restore the counter. Only the part after the last commit recorded in the
+  # marker needs to be checked
+  def recover(self):
+    marker = read_marker(self.file_name_marker) or {}
+    size   = os.path.getsize(self.file_name)
+
+    with open(self.file_name, 'r+b') as file_handle:
+      if self.record_format == 'bin':
+        header, header_length = read_binary_header(file_handle)
+        records = BinaryRecords(header)
+        offset  = marker.get('offset', header_length)
+        counter = marker.get('counter', 0)
+        if offset > size or offset < header_length or (offset - header_length) % records.size:
+          offset, counter = header_length, 0
+
+        # Time stamp of the last committed record (if any)
+        epoch_previous = None
+        if offset > header_length:
+          file_handle.seek(offset - records.size)
+          epoch_previous = records.unpack_from(file_handle.read(records.size))[0]
+
+        file_handle.seek(offset)
+        valid, counter = recover_bin(file_handle.read(), counter, epoch_previous, len(header['sensor_ids']), records)
+      else:
+        offset  = marker.get('offset', 0)
+        counter = marker.get('counter', 0)
+        if offset > size:
+          offset, counter = 0, 0
+
+        file_handle.seek(offset)
+        valid, counter = recover_dat(file_handle.read(), counter)
+
+      # Remove the torn measurement, if any
+      if offset + valid < size:
+        file_handle.truncate(offset + valid)
+
+    self.counter   = counter
+    self.recovered = True
+
+  # Buffer one measurement. readings is a list of (sensor_id, celsius,
+  # fahrenheit) tuples sharing date_time (a datetime). The measurement is
+  # committed as per the group-commit policy
+  def write(self, date_time, counter, readings):
+    if self.record_format == 'bin':
+      epoch = date_time.timestamp()
+      for sensor_id, celsius, fahrenheit in readings:
+        # A sensor wired in after an interrupted run started is not in the
+        # header of the resumed file
+        if sensor_id in self.sensor_index:
+          self.pending.append(self.records.pack(epoch, counter, self.sensor_index[sensor_id], celsius))
+    else:
+      date_time = date_time.strftime("%Y-%m-%d %H:%M:%S")
+      for sensor_id, celsius, fahrenheit in readings:
+        line = "%04d|%s|%19s|%07.3f|%07.3f\n" % (counter, sensor_id, date_time, celsius, fahrenheit)
+        self.pending.append(line.encode('utf-8'))
+
+    self.counter              = counter
+    self.pending_measurements = self.pending_measurements + 1
+
+    if (self.pending_measurements >= self.commit_records or
+        time.monotonic() - self.last_commit >= self.commit_seconds):
+      self.commit()
+
+  # Write the buffered measurements in one go, flush them to the operating
+  # system and (optionally) to the SD card, and then update the marker
+  def commit(self):
+    if len(self.pending) > 0:
+      self.file_handle.write(b''.join(self.pending))
+      self.pending = []
+
+    self.file_handle.flush()
+    if self.fsync:
+      os.fsync(self.file_handle.fileno())
+
+    # Replace the marker atomically so that it is never seen half-written
+    file_name_marker_tmp = self.file_name_marker + '.tmp'
+    with open(file_name_marker_tmp, 'w') as file_handle:
+      json.dump({'offset': self.file_handle.tell(), 'counter': self.counter}, file_handle)
+    os.replace(file_name_marker_tmp, self.file_name_marker)
+
+    self.pending_measurements = 0
+    self.last_commit          = time.monotonic()
+
+  # Commit the remaining measurements and mark the run as finished
+  def close(self):
+    if self.file_handle.closed:
+      return
+
+    self.commit()
+    self.file_handle.close()
+    os.remove(self.file_name_marker)
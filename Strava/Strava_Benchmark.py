@@ -0,0 +1,160 @@
+# Strava_Benchmark.py
+#
+# Python3 script to measure the throughput and latency of the Strava clients
+# against the local stand-in (Strava_MockServer.py, started by this script in
+# a background thread), so that changes to the clients can be compared before
+# they touch the real API. The same ACTIVITIES activities are created
+#
+#   single : one at a time, as Strava_CreateManualActivity.py does (a new
+#            connection per request, no retries)
+#   bulk   : with Strava_CreateManualActivity_Bulk.py (one pooled session,
+#            CONCURRENCY requests in flight, rate limits, retries)
+#
+# and the requests/second, the latency (p50, p99 and max) of the responses,
+# the responses by status and the number of retries are reported. The options
+# of the stand-in (NAME=VALUE, see Strava_MockServer.py) set its latency, rate
+# limits, errors, etc. The token file and the inputs are written to a
+# temporary folder, removed at the end.
+#
+# Usage:
+# python3 Strava_Benchmark.py ACTIVITIES [CONCURRENCY] [NAME=VALUE ...]
+
+# Necessary libraries
+import csv
+import json
+import os
+import requests
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import Strava_CreateManualActivity as strava
+import Strava_CreateManualActivity_Bulk as bulk
+from Strava_MockServer import MockServer, parse_options
+
+# Percentile (0-100) of sorted values
+def percentile(values, percent):
+  if len(values) == 0:
+    return float('nan')
+  return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+# Status and latency (seconds, until the headers arrived) of every response
+class ResponseLog:
+
+  def __init__(self):
+    self.lock      = threading.Lock()
+    self.responses = []
+
+  def hook(self, response, *args, **kwargs):
+    with self.lock:
+      self.responses.append((response.status_code, response.elapsed.total_seconds()))
+
+  def summary(self, elapsed):
+    latencies = sorted(latency for status, latency in self.responses)
+    statuses  = {}
+    for status, latency in self.responses:
+      statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+             'requests'    : len(self.responses),
+             'per_second'  : len(self.responses) / elapsed,
+             'p50'         : percentile(latencies, 50),
+             'p99'         : percentile(latencies, 99),
+             'max'         : latencies[-1] if latencies else float('nan'),
+             'statuses'    : statuses,
+           }
+
+# Point the clients to the stand-in, with an expired token (so that the first
+# request refreshes it) in a new token file
+def use_server(url, folder):
+  strava.strava_url         = url
+  strava.strava_token_url   = url + '/oauth/token'
+  strava.activity_url       = url + '/api/v3/activities'
+  strava.strava_tokens_file = os.path.join(folder, 'Strava_CreateManualActivity.json')
+  with open(strava.strava_tokens_file, 'w') as outfile:
+    json.dump({'token_type': 'Bearer', 'access_token': '', 'refresh_token': 'benchmark', 'expires_at': 0}, outfile)
+  strava.strava_token_store().cached = None
+
+def write_activities(file_name, count):
+  with open(file_name, 'w', newline='') as file_handle:
+    writer = csv.writer(file_handle)
+    writer.writerow(['title', 'start_datetime', 'duration'])
+    for index in range(count):
+      writer.writerow(['Benchmark %d' % (index + 1),
+                       time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(1600000000 + 3600 * index)), 600 + index])
+
+# One activity at a time, as Strava_CreateManualActivity.py
+def run_single(file_name):
+  log      = ResponseLog()
+  counts   = {'created': 0, 'failed': 0, 'retries': 0}
+  for line_number, row in bulk.read_activities(file_name):
+    access_token = strava.strava_tokens_get()['access_token']
+    try:
+      response = strava.create_activity(access_token, strava.activity_payload(**row))
+      log.hook(response)
+      created  = response.ok
+    except requests.ConnectionError:
+      created  = False
+    counts['created' if created else 'failed'] += 1
+
+  return counts, log
+
+# With Strava_CreateManualActivity_Bulk.py
+def run_bulk(file_name, concurrency):
+  log     = ResponseLog()
+  session = requests.Session()
+  session.hooks['response'].append(log.hook)
+  counts  = bulk.create_activities(file_name, concurrency, verbose=False, session=session)
+  session.close()
+
+  return counts, log
+
+# Run the benchmark from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) < 2 or not sys.argv[1].isdigit():
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " ACTIVITIES [CONCURRENCY] [NAME=VALUE ...]")
+    print("   e.g.: python3 " + sys.argv[0] + " 200 8 latency=0.05 limits=100,1000 windows=5,600 errors=0.02")
+    print("")
+    sys.exit()
+
+  count       = int(sys.argv[1])
+  arguments   = sys.argv[2:]
+  concurrency = int(arguments.pop(0)) if arguments and '=' not in arguments[0] else bulk.bulk_concurrency
+  options     = parse_options(arguments)
+
+  server = MockServer(port=0, **options)
+  bulk.rate_windows = server.strava.options['windows']
+  folder = tempfile.mkdtemp(prefix='Strava_Benchmark_')
+  try:
+    file_name = os.path.join(folder, 'Activities.csv')
+    write_activities(file_name, count)
+
+    results = []
+    for mode, run in (('single', lambda: run_single(file_name)),
+                      ('bulk',   lambda: run_bulk(file_name, concurrency))):
+      use_server(server.url, folder)
+      time_start  = time.perf_counter()
+      counts, log = run()
+      elapsed     = time.perf_counter() - time_start
+      results.append((mode, counts, elapsed, log.summary(elapsed)))
+  finally:
+    shutil.rmtree(folder, ignore_errors=True)
+    server.close()
+
+  print("")
+  print("  Stand-in    : %s" % json.dumps(server.strava.options, sort_keys=True))
+  print("  Activities  : %d (bulk: %d in flight)" % (count, concurrency))
+  print("")
+  print("  %-8s %8s %8s %8s %9s %10s %9s %9s %9s  %s" %
+        ('Mode', 'Created', 'Failed', 'Retries', 'Seconds', 'Requests/s', 'p50 ms', 'p99 ms', 'max ms', 'Responses'))
+  for mode, counts, elapsed, summary in results:
+    print("  %-8s %8d %8d %8d %9.2f %10.1f %9.1f %9.1f %9.1f  %s" %
+          (mode, counts['created'], counts['failed'], counts['retries'], elapsed, summary['per_second'],
+           1000 * summary['p50'], 1000 * summary['p99'], 1000 * summary['max'],
+           ' '.join('%d:%d' % item for item in sorted(summary['statuses'].items()))))
+  print("")
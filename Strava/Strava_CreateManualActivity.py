@@ -6,6 +6,10 @@
 # necessary input validations and prevent unintended result or unnecessary
 # frustrations.
 #
+# The functions below (tokens, payload, activity creation) are also used by
+# Strava_CreateManualActivity_Bulk.py to create many activities, and the
+# tokens by Strava_SyncActivities.py.
+#
 # The following resources were found to be very useful in understanding Strava
 # APIs and a Python workflow:
 #
@@ -16,78 +20,87 @@
 # Strava_CreateManualActivity.sh
 
 # Necessary libraries
-import json
-import pandas
+import os
 import requests
 import sys
-import time
+
+from Strava_TokenStore import token_store
 
 # Necessary variables
 # Copy these over from https://www.strava.com/settings/api
+# strava_url may be changed with the STRAVA_URL environment variable, e.g., to
+# a local stand-in (STRAVA_URL='http://127.0.0.1:8023'; see
+# Strava_MockServer.py)
 strava_client_id     = ''
 strava_client_secret = ''
-
-# Save the argument(s) as local variable(s)
-activity_title          = sys.argv[1];
-activity_start_datetime = sys.argv[2];
-activity_duration       = sys.argv[3];
+strava_tokens_file   = 'Strava_CreateManualActivity.json'
+strava_url           = os.environ.get('STRAVA_URL', 'https://www.strava.com')
+strava_token_url     = strava_url + '/oauth/token'
+activity_url         = strava_url + '/api/v3/activities'
 
 # Additional variables necessary to create the manual activity
 activity_description = 'PLACEHOLDER DESCRIPTION - update if necessary.'
-activity_type        = 'workout',
+activity_type        = 'workout'
 activity_distance    = '0.00'
 activity_trainer     = '10'
 activity_commute     = '10'
 
-# Get the tokens from file to connect to Strava
-with open('Strava_CreateManualActivity.json') as json_file:
-  strava_tokens = json.load(json_file)
+# Tokens shared with the other Strava scripts (and processes) running at the
+# same time; see Strava_TokenStore.py
+def strava_token_store():
+  return token_store(strava_tokens_file, strava_client_id, strava_client_secret, strava_token_url)
+
+# Get the tokens from file to connect to Strava. If access_token has expired
+# (or is about to), then use the refresh_token to get the new access_token (and
+# save it). session is an optional requests.Session to reuse its connection
+def strava_tokens_get(session=requests):
+  return strava_token_store().tokens(session)
+
+# Payload of a manual activity; the optional fields default to the variables
+# above
+def activity_payload(title, start_datetime, duration, description=activity_description,
+                     type=activity_type, distance=activity_distance,
+                     trainer=activity_trainer, commute=activity_commute):
+  return {
+           'name'             : title,
+           'description'      : description,
+           'type'             : type,
+           'start_date_local' : start_datetime,
+           'elapsed_time'     : duration,
+           'distance'         : distance,
+           'trainer'          : trainer,
+           'commute'          : commute
+         }
+
+# Create the manual activity; return the response (the new activity is in
+# response.json())
+def create_activity(access_token, payload, session=requests, timeout=None):
+  header = { 'Authorization': 'Bearer ' + access_token }
 
-# If access_token has expired, then use the refresh_token to get the new
-# access_token
-if strava_tokens['expires_at'] < time.time():
-  response = requests.post(
-               url = 'https://www.strava.com/oauth/token',
-               data = {
-                        'client_id'     : strava_client_id,
-                        'client_secret' : strava_client_secret,
-                        'grant_type'    : 'refresh_token',
-                        'refresh_token' : strava_tokens['refresh_token']
-                      }
-             )
+  return session.post(activity_url, headers=header, data=payload, timeout=timeout)
 
-  # Save response as json in new variable
-  new_strava_tokens = response.json()
+# Create one manual activity from the command line
+if __name__ == '__main__':
 
-  # Save new tokens to a file
-  with open('Strava_CreateManualActivity.json', 'w') as outfile:
-    json.dump(new_strava_tokens, outfile)
+  # Save the argument(s) as local variable(s)
+  activity_title          = sys.argv[1];
+  activity_start_datetime = sys.argv[2];
+  activity_duration       = sys.argv[3];
 
-  # Use new Strava tokens
-  strava_tokens = new_strava_tokens
+  # Get the tokens (refreshed if necessary) to connect to Strava
+  strava_tokens = strava_tokens_get()
 
-# Create the manual activity
-access_token = strava_tokens['access_token']
-activity_url = 'https://www.strava.com/api/v3/activities'
-header       = { 'Authorization': 'Bearer ' + access_token }
-payload      = {
-                 'name'             : activity_title,
-                 'description'      : activity_description,
-                 'type'             : activity_type,
-                 'start_date_local' : activity_start_datetime,
-                 'elapsed_time'     : activity_duration,
-                 'distance'         : activity_distance,
-                 'trainer'          : activity_trainer,
-                 'commute'          : activity_commute
-               }
+  # Create the manual activity
+  access_token = strava_tokens['access_token']
+  payload      = activity_payload(activity_title, activity_start_datetime, activity_duration)
 
-try:
-  new_activity = requests.post(activity_url, headers=header, data=payload).json()
+  try:
+    new_activity = create_activity(access_token, payload).json()
 
-  # Uncomment the line below for debugging
-  # print(new_activity)
-except requests.ConnectionError as e:
-  print("  Unable to create the manual activity.")
-  print("  Detailed error message below.\n")
-  print(str(e))
-  print("")
+    # Uncomment the line below for debugging
+    # print(new_activity)
+  except requests.ConnectionError as e:
+    print("  Unable to create the manual activity.")
+    print("  Detailed error message below.\n")
+    print(str(e))
+    print("")
@@ -0,0 +1,293 @@
+# Strava_CreateManualActivity_Bulk.py
+#
+# Python3 script to create many manual activities in Strava (e.g., to backfill
+# workouts), one per row of a CSV file (with a header) or per line of a JSONL
+# file. The columns/keys are the arguments of activity_payload() in
+# Strava_CreateManualActivity.py:
+#
+#   title, start_datetime, duration (required)
+#   description, type, distance, trainer, commute (optional)
+#
+# e.g.,
+#
+#   title,start_datetime,duration
+#   Post-run Stretch,2020-10-17T07:30:00+01:00,900
+#
+# All requests share one requests.Session (i.e., reuse its connections) and at
+# most bulk_concurrency of them are in flight. They are paced to stay inside
+# Strava's rate limits (a number of requests per 15 minutes and per day; the
+# limits and the usage so far are read from the X-RateLimit-Limit and
+# X-RateLimit-Usage headers of every response): when a limit is reached, the
+# requests wait for the window to reset. Connection errors, 429 (rate limit
+# exceeded) and 5xx responses are retried with exponential backoff.
+#
+# Every activity is recorded in a journal (FILE_NAME.journal; one JSON line per
+# activity). Running the script again with the same file skips the activities
+# that were created, i.e., an interrupted backfill resumes where it stopped.
+#
+# Review and run Strava_CreateManualActivity_InitialSetup.py before proceeding
+# ahead.
+#
+# Usage:
+# python3 Strava_CreateManualActivity_Bulk.py FILE_NAME [CONCURRENCY]
+
+# Necessary libraries
+import concurrent.futures
+import csv
+import datetime
+import hashlib
+import json
+import os
+import random
+import requests
+import sys
+import threading
+import time
+
+import Strava_CreateManualActivity as strava
+
+# Necessary variables
+# bulk_concurrency is the number of requests in flight
+# bulk_retries is the number of retries of a request before giving up
+# bulk_backoff is the wait before the first retry (doubled for every retry, up
+# to bulk_backoff_max), in seconds
+# rate_limits are Strava's default (15-minute, daily) limits, used until a
+# response tells otherwise, and rate_windows the lengths of the windows, in
+# seconds (shorter with Strava_MockServer.py)
+bulk_concurrency = 4
+bulk_retries     = 5
+bulk_backoff     = 1.0
+bulk_backoff_max = 300.0
+bulk_timeout     = 30
+rate_limits      = (100, 1000)
+rate_windows     = (900, 86400)
+
+# Strava's rate limits: the 15-minute windows start at 0, 15, 30 and 45
+# minutes past the hour and the daily window at midnight UTC. acquire() blocks
+# until a request fits in both windows (counting the requests in flight) and
+# update() records the limits and the usage reported by Strava
+class RateLimiter:
+
+  def __init__(self, limits=None, lengths=None):
+    self.limits    = list(limits or rate_limits)
+    self.lengths   = lengths or rate_windows
+    self.usage     = [0, 0]
+    self.windows   = [None, None]
+    self.condition = threading.Condition()
+
+  # Ends of the current 15-minute and daily windows (epoch)
+  def window_ends(self, now):
+    return [(now // length + 1) * length for length in self.lengths]
+
+  def roll(self, now):
+    ends = self.window_ends(now)
+    for index in range(2):
+      if self.windows[index] != ends[index]:
+        self.windows[index] = ends[index]
+        self.usage[index]   = 0
+
+  # Wait for (and take) one request of both windows
+  def acquire(self):
+    with self.condition:
+      while True:
+        now = time.time()
+        self.roll(now)
+        full = [index for index in range(2) if self.usage[index] >= self.limits[index]]
+        if not full:
+          self.usage = [usage + 1 for usage in self.usage]
+          return
+        self.condition.wait(max(self.windows[full[-1]] - now, 0) + 1)
+
+  # Limits and usage of a response, e.g., 'X-RateLimit-Limit: 100,1000' and
+  # 'X-RateLimit-Usage: 12,100'. A 429 response fills the 15-minute window
+  def update(self, response):
+    with self.condition:
+      self.roll(time.time())
+      try:
+        if 'X-RateLimit-Limit' in response.headers:
+          self.limits = [int(value) for value in response.headers['X-RateLimit-Limit'].split(',')][:2]
+        if 'X-RateLimit-Usage' in response.headers:
+          usage      = [int(value) for value in response.headers['X-RateLimit-Usage'].split(',')][:2]
+          self.usage = [max(local, remote) for local, remote in zip(self.usage, usage)]
+      except ValueError:
+        pass
+      if response.status_code == 429:
+        self.usage[0] = max(self.usage[0], self.limits[0])
+      self.condition.notify_all()
+
+# Access token shared by the threads (and by other processes using the same
+# token file), refreshed once, ahead of its expiry
+class TokenHolder:
+
+  def __init__(self, session):
+    self.session = session
+    self.store   = strava.strava_token_store()
+    self.store.tokens(session)
+
+  def access_token(self):
+    return self.store.access_token(self.session)
+
+# Activities (arguments of activity_payload()) of a CSV or JSONL file, with
+# their line numbers. Empty values are dropped (the defaults are used)
+def read_activities(file_name):
+  with open(file_name, newline='') as file_handle:
+    if os.path.splitext(file_name)[1].lower() in ('.jsonl', '.json'):
+      rows = [(line_number, json.loads(line)) for line_number, line in enumerate(file_handle, 1)
+              if line.strip()]
+    else:
+      rows = [(line_number, row) for line_number, row in enumerate(csv.DictReader(file_handle), 2)]
+
+  return [(line_number, dict((key, value) for key, value in row.items() if value not in (None, '')))
+          for line_number, row in rows]
+
+# Key of an activity in the journal (the same for the same activity, even if
+# the rows of the file are reordered)
+def activity_key(payload):
+  return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+# Keys of the activities created so far (from the journal), including those
+# that timed out (they may have been created; remove their lines from the
+# journal to try again)
+def read_journal(file_name_journal):
+  created = set()
+  if os.path.exists(file_name_journal):
+    with open(file_name_journal) as file_handle:
+      for line in file_handle:
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          continue
+        if entry.get('status') in ('created', 'unknown'):
+          created.add(entry['key'])
+
+  return created
+
+# Append entries to the journal (flushed to disk one by one)
+class Journal:
+
+  def __init__(self, file_name_journal):
+    self.file_handle = open(file_name_journal, 'a')
+    self.lock        = threading.Lock()
+
+  def write(self, entry):
+    with self.lock:
+      self.file_handle.write(json.dumps(entry) + '\n')
+      self.file_handle.flush()
+      os.fsync(self.file_handle.fileno())
+
+  def close(self):
+    self.file_handle.close()
+
+# Create one activity, retrying connection errors, 429 and 5xx responses.
+# Return the journal entry and the number of retries. A read timeout is not
+# retried: the activity may have been created
+def create_with_retries(session, limiter, tokens, payload):
+  retries = 0
+  while True:
+    limiter.acquire()
+    try:
+      response = strava.create_activity(tokens.access_token(), payload, session=session, timeout=bulk_timeout)
+    except requests.ConnectionError as e:
+      response, error = None, str(e)
+    except requests.Timeout as e:
+      return {'status': 'unknown', 'error': str(e)}, retries
+    else:
+      limiter.update(response)
+      error = 'HTTP %d: %s' % (response.status_code, response.text[:200])
+      if response.ok:
+        return {'status': 'created', 'id': response.json().get('id')}, retries
+      if response.status_code != 429 and response.status_code < 500:
+        return {'status': 'failed', 'error': error}, retries
+
+    if retries >= bulk_retries:
+      return {'status': 'failed', 'error': error}, retries
+    retries = retries + 1
+
+    # A 429 waits for the window in limiter.acquire() (and for Retry-After)
+    wait = min(bulk_backoff * 2 ** (retries - 1), bulk_backoff_max) * random.uniform(0.5, 1.5)
+    if response is not None and 'Retry-After' in response.headers:
+      try:
+        wait = max(wait, float(response.headers['Retry-After']))
+      except ValueError:
+        pass
+    time.sleep(wait)
+
+# Create every activity of file_name that is not in the journal yet; return
+# the counts of created, skipped (created earlier) and failed activities and
+# the number of retries. session is an optional requests.Session (e.g., with
+# hooks to time the responses)
+def create_activities(file_name, concurrency=bulk_concurrency, verbose=True, session=None):
+  activities = [(line_number, strava.activity_payload(**row)) for line_number, row in read_activities(file_name)]
+  journal    = file_name + '.journal'
+  created    = read_journal(journal)
+  pending    = [(line_number, payload) for line_number, payload in activities
+                if activity_key(payload) not in created]
+  counts     = {'created': 0, 'skipped': len(activities) - len(pending), 'failed': 0, 'unknown': 0, 'retries': 0}
+  if not pending:
+    return counts
+
+  owner   = session is None
+  session = session or requests.Session()
+  adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+  session.mount('https://', adapter)
+  session.mount('http://', adapter)
+  limiter = RateLimiter()
+  tokens  = TokenHolder(session)
+  journal = Journal(journal)
+
+  def worker(line_number, payload):
+    entry, retries = create_with_retries(session, limiter, tokens, payload)
+    entry.update({
+                   'key'       : activity_key(payload),
+                   'line'      : line_number,
+                   'name'      : payload['name'],
+                   'date_time' : datetime.datetime.now().isoformat(timespec='seconds'),
+                 })
+    journal.write(entry)
+    if verbose:
+      print("  %-8s %6d  %-12s %s" % (entry['status'], line_number, entry.get('id') or '', payload['name']))
+    return entry['status'], retries
+
+  try:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+      for status, retries in executor.map(lambda activity: worker(*activity), pending):
+        counts[status]    = counts[status] + 1
+        counts['retries'] = counts['retries'] + retries
+  finally:
+    journal.close()
+    if owner:
+      session.close()
+
+  return counts
+
+# Create the activities from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) not in (2, 3):
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " FILE_NAME [CONCURRENCY]")
+    print("   e.g.: python3 " + sys.argv[0] + " Workouts.csv 4")
+    print("")
+    sys.exit()
+
+  file_name   = sys.argv[1]
+  concurrency = int(sys.argv[2]) if len(sys.argv) == 3 else bulk_concurrency
+  if not os.path.exists(file_name) or os.path.getsize(file_name) == 0:
+    print("")
+    print("  %s does not exist or is empty." % file_name)
+    print("  Exiting the script/workflow.")
+    print("")
+    sys.exit(66)
+
+  time_start = time.time()
+  counts     = create_activities(file_name, concurrency)
+
+  print("")
+  print("  Created : %d" % counts['created'])
+  print("  Skipped : %d (in the journal)" % counts['skipped'])
+  print("  Failed  : %d (retried on the next run)" % counts['failed'])
+  print("  Unknown : %d (timed out; check Strava, not retried)" % counts['unknown'])
+  print("  Retries : %d" % counts['retries'])
+  print("  Time    : %.1f seconds" % (time.time() - time_start))
+  print("")
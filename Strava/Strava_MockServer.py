@@ -0,0 +1,272 @@
+# Strava_MockServer.py
+#
+# Python3 script to run a local stand-in for the parts of the Strava API used
+# by the Strava scripts, to test and measure them without the network and
+# without spending the rate limits:
+#
+#   POST /oauth/token                : New tokens (refresh_token grant)
+#   POST /api/v3/activities          : Create a (manual) activity
+#   GET  /api/v3/athlete/activities  : Activities (after, before, page,
+#                                      per_page), oldest first with after
+#
+# Every API response has the X-RateLimit-Limit and X-RateLimit-Usage headers,
+# and a request over the limits gets a 429. The following options change its
+# behaviour (name=value on the command line, or keyword arguments of
+# MockServer())
+#
+#   latency    : Time to answer a request, in seconds (default: 0.05)
+#   jitter     : Random variation of the latency, in seconds (default: 0)
+#   limits     : Requests per short window and per long window (default:
+#                100,1000, as Strava)
+#   windows    : Lengths of the short and long windows, in seconds (default:
+#                900,86400, as Strava)
+#   errors     : Probability of a 500 response (default: 0)
+#   throttle   : Probability of a 429 response within the limits (default: 0)
+#   expires_in : Lifetime of an access token, in seconds (default: 21600)
+#   activities : Number of activities in the account to start with
+#                (default: 0)
+#
+# The scripts use it when STRAVA_URL points to it (see
+# Strava_CreateManualActivity.py), e.g.,
+#
+#   python3 Strava_MockServer.py 8023 latency=0.1 limits=50,500 windows=10,600
+#   STRAVA_URL='http://127.0.0.1:8023' python3 Strava_SyncActivities.py
+#
+# Usage:
+# python3 Strava_MockServer.py [PORT] [NAME=VALUE ...]
+
+# Necessary libraries
+import http.server
+import itertools
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+import urllib.parse
+
+# Necessary variables
+mock_port    = 8023
+mock_options = {
+                 'latency'    : 0.05,
+                 'jitter'     : 0.0,
+                 'limits'     : (100, 1000),
+                 'windows'    : (900, 86400),
+                 'errors'     : 0.0,
+                 'throttle'   : 0.0,
+                 'expires_in' : 21600,
+                 'activities' : 0,
+               }
+
+# State of the stand-in: tokens, activities, rate limits and counts of the
+# responses
+class MockStrava:
+
+  def __init__(self, **options):
+    unknown = set(options) - set(mock_options)
+    if unknown:
+      raise ValueError("Unknown option(s): %s" % ', '.join(sorted(unknown)))
+
+    self.options  = dict(mock_options, **options)
+    self.lock     = threading.Lock()
+    self.random   = random.Random()
+    self.ids      = itertools.count(1000000)
+    self.tokens   = {}
+    self.usage    = [0, 0]
+    self.windows  = [None, None]
+    self.statuses = {}
+
+    # Activities to start with, one per day until now
+    self.activities = []
+    now = int(time.time())
+    for index in range(self.options['activities']):
+      self.add_activity({
+                          'name'         : 'Activity %d' % (index + 1),
+                          'type'         : ('Run', 'Ride', 'Workout')[index % 3],
+                          'elapsed_time' : 1800 + 60 * (index % 60),
+                          'distance'     : 1000.0 * (index % 20),
+                        }, now - 86400 * (self.options['activities'] - index))
+
+  def add_activity(self, fields, start):
+    activity = {
+                 'id'               : next(self.ids),
+                 'name'             : fields.get('name', ''),
+                 'type'             : fields.get('type', 'Workout'),
+                 'start_date'       : time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(start)),
+                 'start_date_local' : time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(start)),
+                 'distance'         : float(fields.get('distance') or 0),
+                 'moving_time'      : int(fields.get('elapsed_time') or 0),
+                 'elapsed_time'     : int(fields.get('elapsed_time') or 0),
+                 'manual'           : True,
+               }
+    self.activities.append((start, activity))
+
+    return activity
+
+  def new_tokens(self):
+    tokens = {
+               'token_type'    : 'Bearer',
+               'access_token'  : secrets.token_hex(20),
+               'refresh_token' : secrets.token_hex(20),
+               'expires_in'    : self.options['expires_in'],
+               'expires_at'    : int(time.time()) + self.options['expires_in'],
+             }
+    self.tokens[tokens['access_token']] = tokens['expires_at']
+
+    return tokens
+
+  # Count one request in the windows; False if it is over the limits
+  def take(self):
+    now  = time.time()
+    ends = [(now // length + 1) * length for length in self.options['windows']]
+    for index in range(2):
+      if self.windows[index] != ends[index]:
+        self.windows[index] = ends[index]
+        self.usage[index]   = 0
+    self.usage = [usage + 1 for usage in self.usage]
+
+    return all(usage <= limit for usage, limit in zip(self.usage, self.options['limits']))
+
+  # Status and body of a request (and whether to add the rate limit headers)
+  def handle(self, method, path, query, form, authorization):
+    with self.lock:
+      if path == '/oauth/token' and method == 'POST':
+        if form.get('grant_type') != 'refresh_token' or not form.get('refresh_token'):
+          return 400, {'message': 'Bad Request'}, False
+        return 200, self.new_tokens(), False
+
+      if path not in ('/api/v3/activities', '/api/v3/athlete/activities'):
+        return 404, {'message': 'Record Not Found'}, False
+
+      if not self.take() or self.random.random() < self.options['throttle']:
+        return 429, {'message': 'Rate Limit Exceeded'}, True
+      if self.random.random() < self.options['errors']:
+        return 500, {'message': 'Internal Server Error'}, True
+
+      access_token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else ''
+      if self.tokens.get(access_token, 0) < time.time():
+        return 401, {'message': 'Authorization Error'}, True
+
+      if path == '/api/v3/activities' and method == 'POST':
+        if not form.get('name') or not form.get('start_date_local') or not form.get('elapsed_time'):
+          return 400, {'message': 'Bad Request'}, True
+        return 201, self.add_activity(form, int(time.time())), True
+
+      if path == '/api/v3/athlete/activities' and method == 'GET':
+        try:
+          after    = int(query.get('after', 0))
+          before   = int(query.get('before', 2 ** 40))
+          page     = max(int(query.get('page', 1)), 1)
+          per_page = min(max(int(query.get('per_page', 30)), 1), 200)
+        except ValueError:
+          return 400, {'message': 'Bad Request'}, True
+        selected = [activity for start, activity in sorted(self.activities, key=lambda item: item[0])
+                    if after < start < before]
+        if 'after' not in query:
+          selected.reverse()
+        return 200, selected[(page - 1) * per_page:page * per_page], True
+
+      return 405, {'message': 'Method Not Allowed'}, True
+
+  def count(self, status):
+    with self.lock:
+      self.statuses[status] = self.statuses.get(status, 0) + 1
+
+# Handle the requests to the endpoints above (keeping the connections open)
+class MockRequestHandler(http.server.BaseHTTPRequestHandler):
+
+  protocol_version = 'HTTP/1.1'
+
+  def respond(self, method):
+    strava = self.server.strava
+    url    = urllib.parse.urlparse(self.path)
+    query  = dict((key, values[-1]) for key, values in urllib.parse.parse_qs(url.query).items())
+    body   = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0)).decode('utf-8')
+    form   = dict((key, values[-1]) for key, values in urllib.parse.parse_qs(body).items())
+
+    latency = strava.options['latency'] + strava.random.uniform(-strava.options['jitter'], strava.options['jitter'])
+    if latency > 0:
+      time.sleep(latency)
+
+    status, reply, rate_limited = strava.handle(method, url.path, query, form, self.headers.get('Authorization', ''))
+    strava.count(status)
+
+    reply = json.dumps(reply).encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(reply)))
+    if rate_limited:
+      self.send_header('X-RateLimit-Limit', '%d,%d' % tuple(strava.options['limits']))
+      self.send_header('X-RateLimit-Usage', '%d,%d' % tuple(strava.usage))
+    self.end_headers()
+    self.wfile.write(reply)
+
+  def do_GET(self):
+    self.respond('GET')
+
+  def do_POST(self):
+    self.respond('POST')
+
+  # Do not print every request
+  def log_message(self, format, *args):
+    pass
+
+# Serve the stand-in from a background thread
+class MockServer:
+
+  def __init__(self, host='127.0.0.1', port=mock_port, **options):
+    self.strava                = MockStrava(**options)
+    self.server                = http.server.ThreadingHTTPServer((host, port), MockRequestHandler)
+    self.server.strava         = self.strava
+    self.server.daemon_threads = True
+    self.port                  = self.server.server_address[1]
+    self.url                   = 'http://%s:%d' % (host, self.port)
+    self.thread                = threading.Thread(target=self.server.serve_forever, name='mock', daemon=True)
+    self.thread.start()
+
+  def close(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+# Options from the command line (name=value), e.g., limits=50,500
+def parse_options(arguments):
+  options = {}
+  for argument in arguments:
+    name, _, value = argument.partition('=')
+    if name not in mock_options:
+      raise ValueError("Unknown option: %s" % name)
+    if isinstance(mock_options[name], tuple):
+      options[name] = tuple(int(part) for part in value.split(','))
+    else:
+      options[name] = type(mock_options[name])(value)
+
+  return options
+
+# Run the stand-in from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) > 1 and sys.argv[1] in ('-h', '--help'):
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " [PORT] [NAME=VALUE ...]")
+    print("   e.g.: python3 " + sys.argv[0] + " 8023 latency=0.1 limits=50,500 windows=10,600 errors=0.01")
+    print("")
+    sys.exit()
+
+  arguments = sys.argv[1:]
+  port      = int(arguments.pop(0)) if arguments and '=' not in arguments[0] else mock_port
+  server    = MockServer(port=port, **parse_options(arguments))
+
+  print("")
+  print("  Serving a Strava stand-in at %s (Ctrl-C to stop)" % server.url)
+  print("  e.g.: STRAVA_URL='%s' python3 Strava_SyncActivities.py" % server.url)
+  print("")
+  try:
+    while True:
+      time.sleep(60)
+  except KeyboardInterrupt:
+    server.close()
+    print("")
+    print("  Responses: %s" % json.dumps(server.strava.statuses, sort_keys=True))
+    print("")
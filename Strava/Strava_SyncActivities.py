@@ -0,0 +1,214 @@
+# Strava_SyncActivities.py
+#
+# Python3 script to keep a local copy (a SQLite database, Strava_Activities.db)
+# of the activities in Strava, for analyses that would otherwise page through
+# the whole history with the API every time. Only the activities that started
+# after the newest one in the database (the 'after' cursor) are requested, one
+# page (up to sync_per_page activities) at a time; every page is inserted in
+# one transaction, together with the new cursor. So, a sync that is
+# interrupted resumes where it stopped, and a sync with nothing new costs one
+# request.
+#
+# Activities created later with an earlier start date (e.g., backfilled with
+# Strava_CreateManualActivity_Bulk.py), and activities edited or deleted in
+# Strava, are picked up only by a full sync (--full): it requests all the
+# activities again and, with the last page, removes from the local copy the
+# ones that did not come back.
+#
+# The functions below also serve reads of the local copy, e.g.,
+#
+#   connection = open_cache()
+#   runs       = query_activities(connection, start='2020-01-01', type='Run')
+#
+# Review and run Strava_CreateManualActivity_InitialSetup.py before proceeding
+# ahead.
+#
+# Usage:
+# python3 Strava_SyncActivities.py [--full]
+
+# Necessary libraries
+import calendar
+import json
+import requests
+import sqlite3
+import sys
+import time
+
+import Strava_CreateManualActivity as strava
+
+# Necessary variables
+# sync_per_page is the number of activities per request (at most 200)
+sync_file      = 'Strava_Activities.db'
+sync_per_page  = 200
+sync_timeout   = 30
+activities_url = strava.strava_url + '/api/v3/athlete/activities'
+
+# Columns of the activities table (besides id, start_epoch and json, the
+# activity as returned by Strava)
+activity_columns = ('name', 'type', 'start_date', 'start_date_local', 'distance',
+                    'moving_time', 'elapsed_time', 'total_elevation_gain')
+
+# Open (and create, if necessary) the local copy
+def open_cache(file_name=sync_file):
+  connection = sqlite3.connect(file_name)
+  connection.row_factory = sqlite3.Row
+  connection.execute('PRAGMA journal_mode=WAL')
+  connection.executescript('''
+    CREATE TABLE IF NOT EXISTS activities (
+      id                   INTEGER PRIMARY KEY,
+      start_epoch          INTEGER NOT NULL,
+      name                 TEXT,
+      type                 TEXT,
+      start_date           TEXT,
+      start_date_local     TEXT,
+      distance             REAL,
+      moving_time          INTEGER,
+      elapsed_time         INTEGER,
+      total_elevation_gain REAL,
+      json                 TEXT
+    );
+    CREATE INDEX IF NOT EXISTS activities_start_epoch ON activities (start_epoch);
+    CREATE INDEX IF NOT EXISTS activities_type ON activities (type, start_epoch);
+    CREATE TABLE IF NOT EXISTS sync (
+      key   TEXT PRIMARY KEY,
+      value TEXT
+    );
+  ''')
+
+  return connection
+
+# Start of an activity (e.g., '2020-10-17T06:30:00Z'), as epoch
+def start_epoch(start_date):
+  return calendar.timegm(time.strptime(start_date, '%Y-%m-%dT%H:%M:%SZ'))
+
+# The 'after' cursor: start (epoch) of the newest activity synced so far
+def sync_cursor(connection):
+  row = connection.execute("SELECT value FROM sync WHERE key = 'after'").fetchone()
+  return int(row['value']) if row else 0
+
+# Insert (or replace) a page of activities and move the cursor, in one
+# transaction. During a full sync (full=True), the ids of the activities are
+# also kept in the temporary table synced and, with the last page (last=True),
+# the activities whose ids are not in it (deleted in Strava) are removed
+def insert_activities(connection, activities, cursor, full=False, last=False):
+  rows = [(activity['id'], start_epoch(activity['start_date'])) +
+          tuple(activity.get(column) for column in activity_columns) + (json.dumps(activity),)
+          for activity in activities]
+  cursor = max([cursor] + [row[1] for row in rows])
+
+  with connection:
+    connection.executemany('INSERT OR REPLACE INTO activities (id, start_epoch, %s, json) VALUES (%s)' %
+                           (', '.join(activity_columns), ', '.join('?' * (len(activity_columns) + 3))), rows)
+    connection.execute("INSERT OR REPLACE INTO sync (key, value) VALUES ('after', ?)", (str(cursor),))
+    if full:
+      connection.executemany('INSERT OR IGNORE INTO synced (id) VALUES (?)', [(row[0],) for row in rows])
+      if last:
+        connection.execute('DELETE FROM activities WHERE id NOT IN (SELECT id FROM synced)')
+
+  return cursor
+
+# Fetch the activities that started after the cursor (all of them with
+# full=True, removing the ones deleted in Strava) and insert them, page by
+# page. Return the number of requests and of activities fetched
+def sync_activities(connection, session=None, full=False):
+  session       = session or requests.Session()
+  strava_tokens = strava.strava_tokens_get(session)
+  header        = { 'Authorization': 'Bearer ' + strava_tokens['access_token'] }
+  after         = 0 if full else sync_cursor(connection)
+  cursor        = after
+  count         = 0
+
+  if full:
+    with connection:
+      connection.execute('CREATE TEMP TABLE IF NOT EXISTS synced (id INTEGER PRIMARY KEY)')
+      connection.execute('DELETE FROM synced')
+
+  # Pages are numbered from the same 'after' (Strava returns the activities
+  # oldest first); a page shorter than sync_per_page is the last one
+  page = 1
+  while True:
+    response = session.get(activities_url, headers=header, timeout=sync_timeout,
+                           params={'after': after, 'page': page, 'per_page': sync_per_page})
+    response.raise_for_status()
+    activities = response.json()
+
+    last   = len(activities) < sync_per_page
+    cursor = insert_activities(connection, activities, cursor, full, last)
+    count  = count + len(activities)
+    if last:
+      return page, count
+    page = page + 1
+
+# A date or date/time in UTC (e.g., '2020-10-17' or '2020-10-17T06:30:00'), as
+# epoch (numbers are returned as they are)
+def date2epoch(value):
+  if not isinstance(value, str):
+    return value
+  for date_format in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+    try:
+      return calendar.timegm(time.strptime(value.rstrip('Z'), date_format))
+    except ValueError:
+      pass
+  raise ValueError("Unknown date format: %r" % value)
+
+# Activities in the local copy, oldest first, optionally between start and end
+# (dates or date/times in UTC, e.g., '2020-10-17', or epoch) and of one type
+# (e.g., 'Run'). Every activity is a dict of the columns above
+def query_activities(connection, start=None, end=None, type=None):
+  conditions = []
+  parameters = []
+  for value, condition in ((start, 'start_epoch >= ?'), (end, 'start_epoch < ?')):
+    if value is not None:
+      conditions.append(condition)
+      parameters.append(date2epoch(value))
+  if type is not None:
+    conditions.append('type = ?')
+    parameters.append(type)
+
+  rows = connection.execute('SELECT id, start_epoch, %s FROM activities %s ORDER BY start_epoch' %
+                            (', '.join(activity_columns),
+                             'WHERE ' + ' AND '.join(conditions) if conditions else ''), parameters)
+
+  return [dict(row) for row in rows]
+
+# Number of activities, distance (meters) and moving time (seconds) of every
+# type in the local copy
+def activity_totals(connection):
+  rows = connection.execute('''SELECT type, COUNT(*) AS count, SUM(distance) AS distance,
+                                      SUM(moving_time) AS moving_time
+                               FROM activities GROUP BY type ORDER BY count DESC''')
+
+  return [dict(row) for row in rows]
+
+# Sync from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) > 2 or (len(sys.argv) == 2 and sys.argv[1] != '--full'):
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " [--full]")
+    print("   e.g.: python3 " + sys.argv[0])
+    print("")
+    sys.exit()
+
+  connection = open_cache()
+  time_start = time.time()
+  try:
+    requests_count, count = sync_activities(connection, full=(len(sys.argv) == 2))
+  except requests.RequestException as e:
+    print("  Unable to sync the activities.")
+    print("  Detailed error message below.\n")
+    print(str(e))
+    print("")
+    sys.exit(1)
+
+  print("")
+  print("  Requests   : %d" % requests_count)
+  print("  Fetched    : %d activities in %.1f seconds" % (count, time.time() - time_start))
+  print("")
+  print("  %-16s %8s %12s %12s" % ('Type', 'Count', 'Distance km', 'Moving h'))
+  for row in activity_totals(connection):
+    print("  %-16s %8d %12.1f %12.1f" % (row['type'], row['count'], (row['distance'] or 0) / 1000,
+                                         (row['moving_time'] or 0) / 3600))
+  print("")
+  connection.close()
@@ -0,0 +1,149 @@
+# Strava_TokenStore.py
+#
+# Python3 module to share the Strava tokens (Strava_CreateManualActivity.json)
+# between threads and processes (e.g., several Strava jobs running in
+# parallel). The access token is refreshed ahead of its expiry (refresh_margin
+# seconds), by one of them only:
+#
+#   - within a process, the tokens are cached and a lock lets one thread
+#     refresh them while the others wait for the result
+#   - across processes, the refresh happens while holding an exclusive lock
+#     on FILE_NAME.lock; the file is read again after taking the lock, so a
+#     process that waited uses the tokens refreshed by the other one
+#   - the file is replaced atomically (a temporary file in the same folder,
+#     then os.replace()), so a reader never sees a half-written file
+#
+# A failed refresh raises an exception and leaves the file as it was.
+#
+# Usage:
+# from Strava_TokenStore import *
+#
+# store        = token_store('Strava_CreateManualActivity.json', client_id, client_secret)
+# access_token = store.access_token()
+
+# Necessary libraries
+import json
+import os
+import requests
+import tempfile
+import threading
+import time
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+# Necessary variables
+# refresh_margin is how long (seconds) before its expiry the access token is
+# refreshed
+refresh_margin   = 300
+strava_token_url = 'https://www.strava.com/oauth/token'
+
+# Exclusive lock on a file (across processes; a no-op where fcntl is missing)
+class FileLock:
+
+  def __init__(self, file_name):
+    self.file_name = file_name
+
+  def __enter__(self):
+    self.file_handle = open(self.file_name, 'a')
+    if fcntl is not None:
+      fcntl.flock(self.file_handle.fileno(), fcntl.LOCK_EX)
+    return self
+
+  def __exit__(self, *exc_info):
+    if fcntl is not None:
+      fcntl.flock(self.file_handle.fileno(), fcntl.LOCK_UN)
+    self.file_handle.close()
+
+# Tokens of one file
+class TokenStore:
+
+  def __init__(self, file_name, client_id='', client_secret='', token_url=strava_token_url,
+               refresh_margin=refresh_margin):
+    self.file_name      = os.path.abspath(file_name)
+    self.client_id      = client_id
+    self.client_secret  = client_secret
+    self.token_url      = token_url
+    self.refresh_margin = refresh_margin
+    self.lock           = threading.Lock()
+    self.cached         = None
+    self.refreshes      = 0
+
+  def fresh(self, tokens):
+    return tokens is not None and tokens['expires_at'] - self.refresh_margin > time.time()
+
+  def read(self):
+    with open(self.file_name) as json_file:
+      return json.load(json_file)
+
+  # Replace the file atomically (keeping it readable by the owner only)
+  def write(self, tokens):
+    file_handle, file_name = tempfile.mkstemp(dir=os.path.dirname(self.file_name),
+                                              prefix=os.path.basename(self.file_name) + '.')
+    try:
+      with os.fdopen(file_handle, 'w') as outfile:
+        json.dump(tokens, outfile)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+      os.replace(file_name, self.file_name)
+    except BaseException:
+      if os.path.exists(file_name):
+        os.remove(file_name)
+      raise
+
+  # Use the refresh_token to get the new tokens
+  def refresh(self, tokens, session=requests):
+    response = session.post(
+                 url = self.token_url,
+                 data = {
+                          'client_id'     : self.client_id,
+                          'client_secret' : self.client_secret,
+                          'grant_type'    : 'refresh_token',
+                          'refresh_token' : tokens['refresh_token']
+                        }
+               )
+    response.raise_for_status()
+    new_tokens = response.json()
+    if 'access_token' not in new_tokens or 'expires_at' not in new_tokens:
+      raise ValueError("Unexpected response from %s: %s" % (self.token_url, response.text[:200]))
+    self.refreshes = self.refreshes + 1
+
+    return new_tokens
+
+  # Tokens, valid for at least refresh_margin seconds. session is an optional
+  # requests.Session to reuse its connection for a refresh
+  def tokens(self, session=requests):
+    with self.lock:
+      if self.fresh(self.cached):
+        return self.cached
+
+      # Another process may have refreshed the tokens already
+      tokens = self.read()
+      if not self.fresh(tokens):
+        with FileLock(self.file_name + '.lock'):
+          tokens = self.read()
+          if not self.fresh(tokens):
+            tokens = self.refresh(tokens, session)
+            self.write(tokens)
+
+      self.cached = tokens
+      return tokens
+
+  def access_token(self, session=requests):
+    return self.tokens(session)['access_token']
+
+# Token stores, one per file (shared by all threads)
+token_stores = {}
+token_lock   = threading.Lock()
+
+def token_store(file_name, client_id='', client_secret='', token_url=strava_token_url):
+  file_name = os.path.abspath(file_name)
+  with token_lock:
+    if file_name not in token_stores:
+      token_stores[file_name] = TokenStore(file_name)
+    store = token_stores[file_name]
+    store.client_id, store.client_secret, store.token_url = client_id, client_secret, token_url
+
+    return store
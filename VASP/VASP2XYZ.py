@@ -0,0 +1,356 @@
+# VASP2XYZ.py
+#
+# Python3 script to extract the atomic positions (xyz) from POSCAR and OUTCAR
+# files of VASP (Vienna Ab-initio Simulation Program) and write them to an XYZ
+# file - to be used with Jmol, MolDen and such other third-party programs. The
+# output is the same as that of VASP2XYZ.sh, which reads OUTCAR once per frame
+# (and starts a few processes per atom); this script reads OUTCAR once,
+# through a memory map (i.e., without loading it in memory), frame_batch
+# frames at a time. VASP writes the coordinates with a fixed width, so a
+# batch is one NumPy array of characters (a row per atom): the coordinates are
+# parsed and the XYZ lines are built from it with a few array operations. A
+# batch that does not look like that is parsed and formatted frame by frame.
+# The output file will be overwritten, if it exists.
+#
+# An incomplete last frame (e.g., OUTCAR of a simulation that is still
+# running) is left out.
+#
+# Usage:
+# python3 VASP2XYZ.py OUTPUT_FILE [POSCAR OUTCAR]
+#
+# from VASP2XYZ import *
+#
+# counts, labels = atom_types('POSCAR', 'OUTCAR')
+# for frame_number, positions in read_frames('OUTCAR', sum(counts)):
+#   ...
+
+# Necessary libraries
+import mmap
+import numpy as np
+import os
+import re
+import sys
+
+# Necessary variables
+poscar      = 'POSCAR'
+outcar      = 'OUTCAR'
+position    = b'POSITION'
+write_bytes = 2**22
+frame_batch = 4096
+
+# Lookup tables (one entry per character) of digits, and of digits, spaces
+# and minus signs
+digit_table = np.zeros(256, dtype=bool)
+sign_table  = np.zeros(256, dtype=bool)
+digit_table[np.frombuffer(b'0123456789', dtype=np.uint8)]  = True
+sign_table[np.frombuffer(b' -0123456789', dtype=np.uint8)] = True
+
+# Number of atoms of every type (6th line of POSCAR)
+def atom_counts(file_name_poscar):
+  with open(file_name_poscar) as file_handle:
+    for line_number, line in enumerate(file_handle, 1):
+      if line_number == 6:
+        return [int(count) for count in line.split()]
+
+  return []
+
+# Label of every atom type: the 3rd field of the first 'POTCAR:' lines of
+# OUTCAR (one per type), without what follows '_' (e.g., O_h is O)
+def atom_labels(buffer, types):
+  labels = []
+  offset = 0
+  while len(labels) < types:
+    offset = buffer.find(b'POTCAR:', offset)
+    if offset == -1:
+      break
+    end    = buffer.find(b'\n', offset)
+    end    = len(buffer) if end == -1 else end
+    start  = buffer.rfind(b'\n', 0, offset) + 1
+    fields = buffer[start:end].split()
+    labels.append(fields[2].split(b'_')[0].decode('ascii') if len(fields) > 2 else '')
+    offset = end
+
+  return labels
+
+# Counts and labels of the atom types; ValueError if they do not match (i.e.,
+# POSCAR and OUTCAR are not from the same system and simulation)
+def atom_types(file_name_poscar, file_name_outcar):
+  counts = atom_counts(file_name_poscar)
+  with open(file_name_outcar, 'rb') as file_handle:
+    with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+      labels = atom_labels(buffer, len(counts))
+
+  if len(counts) != len(labels):
+    raise ValueError("Atom Type Total (%d) does NOT match Atom Label Count (%d)" % (len(counts), len(labels)))
+
+  return counts, labels
+
+# Offset of the start of the line 'lines' lines after the one at offset (None
+# if the buffer ends before)
+def skip_lines(buffer, offset, lines):
+  for line in range(lines):
+    offset = buffer.find(b'\n', offset)
+    if offset == -1:
+      return None
+    offset = offset + 1
+
+  return offset
+
+# Offsets of the coordinates of every frame: 2 lines after every line with
+# POSITION, starting at offset
+def frame_offsets(buffer, offset=0):
+  while True:
+    offset = buffer.find(position, offset)
+    if offset == -1:
+      return
+    start = skip_lines(buffer, offset, 2)
+    if start is None:
+      return
+    yield start
+    offset = start
+
+# Coordinates (atoms x 3 array) of the frame at offset, and the offset of its
+# end; None if the frame is incomplete
+def parse_frame(buffer, offset, atoms):
+  end = skip_lines(buffer, offset, atoms)
+  if end is None:
+    return None, offset
+
+  try:
+    values = np.array(buffer[offset:end].split(), dtype=float)
+  except ValueError:
+    return None, offset
+  if atoms == 0 or values.size % atoms:
+    return None, offset
+
+  return values.reshape(atoms, -1)[:, :3], end
+
+# VASP writes the coordinates with a fixed width (e.g., 3F13.5), i.e., the
+# decimal points of x, y and z are at the same columns on every line. Return
+# the columns (start, decimal point, end) of x, y and z in line, with the
+# length of the line (None if the line does not look like that)
+def line_layout(line):
+  layout = []
+  for match in re.finditer(rb'\S+', line):
+    dot = match.group().find(b'.')
+    if dot == -1:
+      return None
+    layout.append((match.start(), match.start() + dot, match.end()))
+    if len(layout) == 3:
+      return layout, len(line)
+
+  return None
+
+# Lines (one row per atom, one column per character) of a batch of frames
+# with the fixed-width layout; None if a frame is incomplete or any line does
+# not fit the layout (the batch is then read line by line)
+def frame_matrix(buffer, offsets, atoms, layout):
+  columns, length = layout
+  block           = atoms * length
+  lines           = b''.join(buffer[offset:offset + block] for offset in offsets)
+  if len(lines) != len(offsets) * block:
+    return None
+  matrix = np.frombuffer(lines, dtype=np.uint8).reshape(-1, length)
+
+  if not (matrix[:, -1] == ord('\n')).all() or (matrix[:, :-1] == ord('\n')).any():
+    return None
+  previous = 0
+  for start, dot, end in columns:
+    integer  = matrix[:, dot - 3:dot]
+    decimals = matrix[:, dot + 1:end]
+    if (dot - 3 <= previous or end - dot - 1 > 8 or
+        (matrix[:, previous:dot - 3] != ord(' ')).any() or
+        (matrix[:, dot] != ord('.')).any() or
+        not sign_table[integer].all() or
+        not digit_table[matrix[:, dot - 1]].all() or
+        not digit_table[decimals].all() or
+        (end < length - 1 and (matrix[:, end] != ord(' ')).any())):
+      return None
+    previous = end
+
+  return matrix
+
+# Coordinates (rows x 3 array) of the lines of frame_matrix(). Every value is
+# an integer divided by a power of 10, i.e., the same as parsing its text
+def matrix_positions(matrix, layout):
+  positions = np.empty((len(matrix), 3))
+  for index, (start, dot, end) in enumerate(layout[0]):
+    field    = matrix[:, dot - 3:end].astype(np.int64)
+    digits   = np.where((field >= ord('0')) & (field <= ord('9')), field - ord('0'), 0)
+    digits   = np.delete(digits, 3, axis=1)
+    value    = digits @ (10 ** np.arange(digits.shape[1] - 1, -1, -1, dtype=np.int64))
+    negative = (field[:, :3] == ord('-')).any(axis=1)
+    positions[:, index] = np.where(negative, -value, value) / 10.0 ** (end - dot - 1)
+
+  return positions
+
+# XYZ lines ('%-3s %12.8f %12.8f %12.8f' of every atom) of the lines of
+# frame_matrix(), built from their characters: the sign and integer part
+# (right-aligned in 3 characters), the decimal point and the decimals, padded
+# with zeros to 8 of them. label_rows has the label (padded to 4 characters)
+# of every row
+def matrix_xyz(matrix, layout, label_rows):
+  xyz          = np.full((len(matrix), 43), ord(' '), dtype=np.uint8)
+  xyz[:, :4]   = label_rows
+  xyz[:, -1]   = ord('\n')
+  for index, (start, dot, end) in enumerate(layout[0]):
+    column = 4 + 13 * index
+    xyz[:, column:column + 4]                      = matrix[:, dot - 3:dot + 1]
+    xyz[:, column + 4:column + 3 + end - dot]      = matrix[:, dot + 1:end]
+    xyz[:, column + 3 + end - dot:column + 12]     = ord('0')
+
+  return xyz
+
+# Batches of (up to) size items of iterable
+def batches(iterable, size=frame_batch):
+  batch = []
+  for item in iterable:
+    batch.append(item)
+    if len(batch) == size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+# Coordinates of the frames at offsets, as one (frames x atoms x 3) array,
+# with the fixed-width layout when possible (line by line otherwise). An
+# incomplete frame and those after it are left out
+def batch_positions(buffer, offsets, atoms, layout):
+  matrix = frame_matrix(buffer, offsets, atoms, layout) if layout else None
+  if matrix is not None:
+    return matrix_positions(matrix, layout).reshape(len(offsets), atoms, 3)
+
+  frames = []
+  for offset in offsets:
+    positions, end = parse_frame(buffer, offset, atoms)
+    if positions is None:
+      break
+    frames.append(positions)
+
+  return np.array(frames).reshape(len(frames), atoms, 3)
+
+# Layout of the coordinates of the first frame at or after offset (None if
+# there is no such frame or it is not fixed-width)
+def buffer_layout(buffer, offset=0):
+  for start in frame_offsets(buffer, offset):
+    end = buffer.find(b'\n', start)
+    return line_layout(buffer[start:end + 1]) if end != -1 else None
+
+  return None
+
+# Frame number (from 1) and coordinates of every (complete) frame of OUTCAR
+def read_frames(file_name_outcar, atoms):
+  with open(file_name_outcar, 'rb') as file_handle:
+    if os.fstat(file_handle.fileno()).st_size == 0:
+      return
+    with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+      layout       = buffer_layout(buffer)
+      frame_number = 0
+      for offsets in batches(frame_offsets(buffer)):
+        positions = batch_positions(buffer, offsets, atoms, layout)
+        for frame in positions:
+          frame_number = frame_number + 1
+          yield frame_number, frame
+        if len(positions) < len(offsets):
+          return
+
+# Format of one frame (the labels are fixed; the coordinates are filled in)
+def frame_format(counts, labels):
+  atoms = ''.join(('%-3s %%12.8f %%12.8f %%12.8f\n' % label.replace('%', '%%')) * count
+                  for label, count in zip(labels, counts))
+
+  return '%d\n# Frame Number: %%d\n%s' % (sum(counts), atoms)
+
+# Write the XYZ file; return the number of frames. Batches of frames with the
+# fixed-width layout are written from the characters of OUTCAR (see
+# matrix_xyz()), the others with frame_format()
+def vasp2xyz(file_name_output, file_name_poscar=poscar, file_name_outcar=outcar):
+  counts, labels = atom_types(file_name_poscar, file_name_outcar)
+  atoms          = sum(counts)
+  template       = frame_format(counts, labels).encode('ascii')
+  label_rows     = None
+  if max(len(label) for label in labels) <= 3:
+    label_rows = np.frombuffer(''.join(('%-4s' % label) * count for label, count in zip(labels, counts))
+                               .encode('ascii'), dtype=np.uint8).reshape(atoms, 4)
+
+  frames = 0
+  with open(file_name_output, 'wb', buffering=write_bytes) as output, \
+       open(file_name_outcar, 'rb') as file_handle:
+    if os.fstat(file_handle.fileno()).st_size == 0 or atoms == 0:
+      return frames
+    with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+      layout = buffer_layout(buffer) if label_rows is not None else None
+      for offsets in batches(frame_offsets(buffer)):
+        matrix = frame_matrix(buffer, offsets, atoms, layout) if layout else None
+        if matrix is not None:
+          xyz   = memoryview(matrix_xyz(matrix, layout, np.tile(label_rows, (len(offsets), 1))).tobytes())
+          block = atoms * 43
+          for index in range(len(offsets)):
+            frames = frames + 1
+            output.write(b'%d\n# Frame Number: %d\n' % (atoms, frames))
+            output.write(xyz[index * block:(index + 1) * block])
+          continue
+
+        for offset in offsets:
+          positions, end = parse_frame(buffer, offset, atoms)
+          if positions is None:
+            return frames
+          frames = frames + 1
+          output.write(template % ((frames,) + tuple(positions.ravel().tolist())))
+
+  return frames
+
+# Convert from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) not in (2, 4):
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " OUTPUT_FILE [POSCAR OUTCAR]")
+    print("   e.g.: python3 " + sys.argv[0] + " OUTPUT.xyz")
+    print("")
+    sys.exit(64)
+
+  file_name_output = sys.argv[1]
+  file_name_poscar = sys.argv[2] if len(sys.argv) == 4 else poscar
+  file_name_outcar = sys.argv[3] if len(sys.argv) == 4 else outcar
+
+  # Validate POSCAR, OUTCAR and the output folder
+  for file_name in (file_name_poscar, file_name_outcar):
+    if not os.path.isfile(file_name) or not os.access(file_name, os.R_OK):
+      print("")
+      print("  %s does not exist or is not readable." % file_name)
+      print("  Exiting the script/workflow.")
+      print("")
+      sys.exit(66)
+  if not os.access(os.path.dirname(os.path.abspath(file_name_output)), os.W_OK):
+    print("")
+    print("  %s is not writable." % os.path.dirname(os.path.abspath(file_name_output)))
+    print("  Exiting the script/workflow.")
+    print("")
+    sys.exit(73)
+
+  try:
+    counts, labels = atom_types(file_name_poscar, file_name_outcar)
+  except ValueError as e:
+    print("")
+    print("  ERROR : %s." % e)
+    print("  Please make sure OUTCAR and POSCAR are from the same")
+    print("  system and (successfully completed) simulation.")
+    print("")
+    sys.exit(65)
+
+  # Print initial summary
+  print("")
+  print("  %s and %s found" % (file_name_poscar, file_name_outcar))
+  print("  %s writable in %s" % (file_name_output, os.path.dirname(os.path.abspath(file_name_output))))
+  print("")
+  print("  Number of atom types   : %d" % len(counts))
+  print("  Atom type(s)           : %s" % ' '.join(labels))
+  print("  Atom type count(s)     : %s" % ' '.join(str(count) for count in counts))
+  print("  Total number of atoms  : %d" % sum(counts))
+
+  frames = vasp2xyz(file_name_output, file_name_poscar, file_name_outcar)
+
+  print("  Total number of frames : %d" % frames)
+  print("")
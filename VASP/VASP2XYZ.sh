@@ -6,6 +6,9 @@
 # script needs to be run from the same folder that contains POSCAR and OUTCAR
 # files. The output file will be overwritten, if it exists.
 #
+# VASP2XYZ.py writes the same output, reading OUTCAR once (use it for long
+# molecular dynamics runs; this script reads OUTCAR once per frame).
+#
 # Usage:
 # VASP2XYZ.sh
 
@@ -0,0 +1,217 @@
+# VASP2XYZ_Index.py
+#
+# Python3 module/script for random access to the frames of a (large) OUTCAR
+# of VASP (Vienna Ab-initio Simulation Program): OUTCAR is read once to find
+# the byte offset of every frame's coordinates (2 lines after the POSITION
+# ... TOTAL-FORCE line), and the offsets are saved next to it (e.g.,
+# OUTCAR_Index.npy). Reading frame N, a slice of frames or every k-th frame
+# then seeks directly to them (through a memory map) instead of reading
+# OUTCAR again, or converting all of it with VASP2XYZ.py.
+#
+# The index is checked against the size and modification time of OUTCAR
+# every time it is used. If OUTCAR grew (e.g., a simulation that is still
+# running) and starts with the same bytes, the index is extended from the end
+# of the last indexed frame; otherwise (OUTCAR was replaced) it is built
+# again. An incomplete last frame is not indexed until it is complete.
+#
+# Usage:
+# from VASP2XYZ_Index import *
+#
+# index     = FrameIndex('OUTCAR', atoms)
+# positions = index[39999]        # frame 40000 (atoms x 3 array)
+# positions = index[100:200]      # frames 101 to 200 (frames x atoms x 3)
+# positions = index[::10]         # every 10th frame
+#
+# python3 VASP2XYZ_Index.py [FRAMES] [POSCAR OUTCAR]
+#
+# FRAMES are frame numbers (from 1), as in the XYZ file: N, or
+# START:STOP[:STEP] (STOP included; either may be left out). The selected
+# frames are written to the standard output in the XYZ format.
+
+# Necessary libraries
+import mmap
+import numpy as np
+import os
+import sys
+import time
+import zlib
+
+from VASP2XYZ import (atom_types, batch_positions, batches, frame_format, frame_offsets,
+                      line_layout, outcar, poscar, skip_lines)
+
+# Necessary variables
+# index_signature is how many bytes at the start of OUTCAR are checked to
+# tell a grown OUTCAR from a new one
+index_version   = 1
+index_signature = 2**16
+
+def file_name_index(file_name_outcar):
+  return file_name_outcar + '_Index.npy'
+
+# Offsets of the frames of an OUTCAR with atoms atoms
+class FrameIndex:
+
+  def __init__(self, file_name_outcar, atoms):
+    self.file_name = file_name_outcar
+    self.atoms     = atoms
+    self.reset()
+    self.load()
+    self.update()
+
+  def reset(self):
+    self.offsets   = np.empty(0, dtype=np.int64)
+    self.size      = 0
+    self.mtime     = 0
+    self.checked   = 0
+    self.signature = 0
+    self.scanned   = 0
+
+  # The saved index: version, atoms, size, mtime (ns), checked (bytes) and
+  # signature (CRC-32 of the first checked bytes) of OUTCAR, the offset where
+  # the next scan starts, and the offsets of the frames
+  def load(self):
+    try:
+      saved = np.load(file_name_index(self.file_name))
+    except (OSError, ValueError):
+      return
+    if len(saved) < 7 or saved[0] != index_version or saved[1] != self.atoms:
+      return
+    self.size, self.mtime, self.checked, self.signature, self.scanned = (int(value) for value in saved[2:7])
+    self.offsets = saved[7:]
+
+  def save(self):
+    file_name = file_name_index(self.file_name)
+    saved     = np.concatenate([np.array([index_version, self.atoms, self.size, self.mtime, self.checked,
+                                          self.signature, self.scanned], dtype=np.int64), self.offsets])
+    with open(file_name + '.tmp', 'wb') as file_handle:
+      np.save(file_handle, saved)
+    os.replace(file_name + '.tmp', file_name)
+
+  # Bring the index up to date with OUTCAR; return the number of frames added
+  def update(self):
+    status = os.stat(self.file_name)
+    if status.st_size == self.size and status.st_mtime_ns == self.mtime:
+      return 0
+    if status.st_size == 0:
+      self.reset()
+      self.size, self.mtime = status.st_size, status.st_mtime_ns
+      self.save()
+      return 0
+
+    with open(self.file_name, 'rb') as file_handle:
+      with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        if (status.st_size < self.size or
+            zlib.crc32(buffer[:self.checked]) != self.signature):
+          self.reset()
+
+        # Frames after the last indexed one (complete frames only)
+        added   = []
+        scanned = self.scanned
+        for start in frame_offsets(buffer, scanned):
+          end = skip_lines(buffer, start, self.atoms)
+          if end is None:
+            break
+          added.append(start)
+          scanned = end
+
+        self.checked   = min(status.st_size, index_signature)
+        self.signature = zlib.crc32(buffer[:self.checked])
+
+    self.offsets = np.concatenate([self.offsets, np.array(added, dtype=np.int64)])
+    self.scanned = scanned
+    self.size    = status.st_size
+    self.mtime   = status.st_mtime_ns
+    self.save()
+
+    return len(added)
+
+  def __len__(self):
+    return len(self.offsets)
+
+  # Coordinates of frame key (atoms x 3 array; from 0), or of a slice of
+  # frames (frames x atoms x 3 array)
+  def __getitem__(self, key):
+    if isinstance(key, slice):
+      return self.read(self.offsets[key])
+    if key < -len(self.offsets) or key >= len(self.offsets):
+      raise IndexError("frame index out of range: %d (%d frames)" % (key, len(self.offsets)))
+
+    return self.read(self.offsets[key:key + 1 or None])[0]
+
+  # Coordinates of the frames at offsets
+  def read(self, offsets):
+    if len(offsets) == 0:
+      return np.empty((0, self.atoms, 3))
+
+    with open(self.file_name, 'rb') as file_handle:
+      with mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        layout = line_layout(buffer[offsets[0]:buffer.find(b'\n', offsets[0]) + 1])
+
+        return np.concatenate([batch_positions(buffer, [int(offset) for offset in batch], self.atoms, layout)
+                               for batch in batches(offsets)])
+
+# Frame numbers (from 1) of FRAMES (see above) out of frames frames
+def frame_numbers(selection, frames):
+  if ':' not in selection:
+    return [int(selection)]
+
+  parts = selection.split(':') + ['']
+  start = int(parts[0]) if parts[0] else 1
+  stop  = int(parts[1]) if parts[1] else frames
+  step  = int(parts[2]) if parts[2] else 1
+
+  return list(range(start, min(stop, frames) + 1, step))
+
+# Index OUTCAR (and write frames) from the command line
+if __name__ == '__main__':
+
+  # Argument check
+  if len(sys.argv) not in (1, 2, 3, 4):
+    print("")
+    print("  Usage: python3 " + sys.argv[0] + " [FRAMES] [POSCAR OUTCAR]")
+    print("   e.g.: python3 " + sys.argv[0] + " 40000 > Frame_40000.xyz")
+    print("         python3 " + sys.argv[0] + " 1000:2000:10 > Frames.xyz")
+    print("")
+    sys.exit(64)
+
+  arguments        = sys.argv[1:]
+  selection        = arguments.pop(0) if len(arguments) in (1, 3) else None
+  file_name_poscar = arguments[0] if arguments else poscar
+  file_name_outcar = arguments[1] if arguments else outcar
+  for file_name in (file_name_poscar, file_name_outcar):
+    if not os.path.isfile(file_name) or not os.access(file_name, os.R_OK):
+      print("", file=sys.stderr)
+      print("  %s does not exist or is not readable." % file_name, file=sys.stderr)
+      print("  Exiting the script/workflow.", file=sys.stderr)
+      print("", file=sys.stderr)
+      sys.exit(66)
+
+  counts, labels = atom_types(file_name_poscar, file_name_outcar)
+  time_start     = time.perf_counter()
+  index          = FrameIndex(file_name_outcar, sum(counts))
+  time_index     = time.perf_counter() - time_start
+
+  if selection is None:
+    print("")
+    print("  Index                  : %s" % file_name_index(file_name_outcar))
+    print("  Total number of frames : %d" % len(index))
+    print("  Time                   : %.3f seconds" % time_index)
+    print("")
+    sys.exit()
+
+  numbers = [number for number in frame_numbers(selection, len(index)) if 1 <= number <= len(index)]
+  if not numbers:
+    print("  No such frame(s): %s (%d frames)" % (selection, len(index)), file=sys.stderr)
+    sys.exit(65)
+
+  template  = frame_format(counts, labels)
+  positions = index.read(index.offsets[np.array(numbers) - 1])
+  try:
+    for number, frame in zip(numbers, positions):
+      sys.stdout.write(template % ((number,) + tuple(frame.ravel().tolist())))
+    sys.stdout.flush()
+  except BrokenPipeError:
+    # The reader stopped early (e.g., piped into head); the output still
+    # buffered would fail again at exit, so it goes to /dev/null instead
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    sys.exit(0)